@@ -1,12 +1,29 @@
 from django.contrib import admin
 from .models import *
+from .signals import cosmetics_changed
+
+
+@admin.register(CosmeticComposition)
+class CosmeticCompositionAdmin(admin.ModelAdmin):
+    # compositions are deleted without per-row signals, see signals.py
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        cosmetics_changed.send(sender=CosmeticComposition, barcodes=[obj.cosmetic_id])
+
+    def delete_queryset(self, request, queryset):
+        barcodes = set(queryset.values_list("cosmetic_id", flat=True))
+        super().delete_queryset(request, queryset)
+        cosmetics_changed.send(sender=CosmeticComposition, barcodes=barcodes)
+
 
 admin.site.register(Person)
 admin.site.register(Cosmetic)
 admin.site.register(IngredientINCI)
-admin.site.register(CosmeticComposition)
 admin.site.register(Review)
 admin.site.register(CarePlan)
 admin.site.register(CarePlanContent)
 admin.site.register(CarePlanRating)
 admin.site.register(FavoriteProduct)
+admin.site.register(ImportJob)
+admin.site.register(CatalogVersion)
+admin.site.register(CosmeticSafetySummary)
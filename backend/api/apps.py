@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import create_trigram_indexes
+
+        post_migrate.connect(create_trigram_indexes, sender=self)
@@ -0,0 +1,114 @@
+"""
+In-memory prefix index for ingredient name autocomplete.
+
+Every process keeps sorted arrays of normalized INCI and common names and
+answers prefix queries with a binary search. Writers call `invalidate()`,
+which bumps a generation counter in the Django cache; each process drops its
+index when it sees a new generation and rebuilds it on the next lookup.
+"""
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from .models import IngredientINCI
+
+GENERATION_KEY = "ingredient-autocomplete:generation"
+# fields of every suggestion, enough to add the ingredient to a composition
+FIELDS = ["cosing_ref_no", "inci_name", "common_name", "function", "safety_rating"]
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    """Lowercase ASCII tokens joined by single spaces: 'PEG-40 Oil' -> 'peg 40 oil'."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(t for t in _NON_ALPHANUMERIC.split(text.lower()) if t)
+
+
+class AutocompleteIndex:
+    def __init__(self, rows):
+        """`rows` are tuples of FIELDS."""
+        self.entries = {}
+        names = []  # full names
+        suffixes = []  # names starting at their second, third... token
+        for row in rows:
+            ref_no, inci_name, common_name = row[:3]
+            self.entries[ref_no] = row
+            for name in {inci_name, common_name}:
+                key = normalize(name or "")
+                if not key:
+                    continue
+                names.append((key, ref_no))
+                tokens = key.split(" ")
+                for i in range(1, len(tokens)):
+                    suffixes.append((" ".join(tokens[i:]), ref_no))
+
+        names.sort()
+        suffixes.sort()
+        self._names = ([k for k, _ in names], [r for _, r in names])
+        self._suffixes = ([k for k, _ in suffixes], [r for _, r in suffixes])
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _scan(keys_refs, prefix, limit, found):
+        keys, refs = keys_refs
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            found.setdefault(refs[i], None)
+            i += 1
+
+    def lookup(self, query, limit=10):
+        """
+        Ingredients whose name starts with `query`, then those with a later
+        word starting with it; alphabetical (so exact matches first) within each.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        found = {}  # insertion-ordered set
+        self._scan(self._names, prefix, limit, found)
+        self._scan(self._suffixes, prefix, limit, found)
+
+        return [dict(zip(FIELDS, self.entries[ref_no])) for ref_no in found]
+
+
+_lock = threading.Lock()
+_index = None
+_index_generation = None
+
+
+def get_index():
+    global _index, _index_generation
+
+    generation = cache.get(GENERATION_KEY, 0)
+    index = _index
+    if index is not None and _index_generation == generation:
+        return index
+
+    with _lock:
+        if _index is None or _index_generation != generation:
+            rows = IngredientINCI.objects.values_list(*FIELDS).iterator(
+                chunk_size=5000
+            )
+            _index = AutocompleteIndex(rows)
+            _index_generation = generation
+        return _index
+
+
+def invalidate():
+    """Make every process rebuild its index on the next lookup."""
+    global _index
+
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:  # evicted in between
+        cache.set(GENERATION_KEY, 1, timeout=None)
+    with _lock:
+        _index = None
@@ -0,0 +1,23 @@
+"""
+Benchmark suites, run with `manage.py benchmark <suite>`.
+
+Each suite is a `run(size, seed)` function returning a dict of results.
+"""
+
+from . import (
+    classifier,
+    composition,
+    endpoints,
+    free_from,
+    serialization,
+    similarity,
+)
+
+SUITES = {
+    "classifier": classifier.run,
+    "composition": composition.run,
+    "endpoints": endpoints.run,
+    "free_from": free_from.run,
+    "serialization": serialization.run,
+    "similarity": similarity.run,
+}
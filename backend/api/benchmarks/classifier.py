@@ -0,0 +1,130 @@
+"""
+Calls per second of the ingredient safety classification: the original
+per-call implementation against the memoized SafetyClassifier.
+"""
+
+import random
+import re
+import time
+
+from api.cosing import BENEFICIAL_FUNCTIONS, SafetyClassifier
+
+OTHER_FUNCTIONS = [
+    "PERFUMUJĄCA",
+    "KONSERWUJĄCA",
+    "ANTYSTATYCZNA",
+    "EMULGUJĄCA",
+    "POWIERZCHNIOWO CZYNNA",
+    "BARWIĄCA",
+    "ZAGĘSZCZAJĄCA",
+    "ROZPUSZCZALNIK",
+    "BUFORUJĄCA",
+    "CHELATUJĄCA",
+]
+RESTRICTIONS = ["III/45", "V/12", "II/1377", "VI/4; III/100", "IV/56"]
+
+
+def legacy_parse_restriction_description(restriction_text):
+    if not restriction_text or restriction_text.strip() == "":
+        return ""
+
+    annexes = {
+        "II": "Substancja zakazana w kosmetykach UE",
+        "III": "Dozwolona warunkowo z ograniczeniami stężenia",
+        "IV": "Dozwolony barwnik z określonymi warunkami użycia",
+        "V": "Dozwolony konserwant z limitami stężeń",
+        "VI": "Dozwolony filtr UV z ograniczeniami użycia",
+    }
+
+    roman_numerals = re.findall(r"\b(I{1,3}|IV|V|VI)\b", restriction_text)
+
+    descriptions = []
+    for numeral in set(roman_numerals):
+        if numeral in annexes:
+            descriptions.append(annexes[numeral])
+
+    return "; ".join(descriptions) if descriptions else ""
+
+
+def legacy_evaluate_ingredient_safety(function_text, restrictions):
+    if restrictions and restrictions.strip():
+        return "harmful"
+
+    if not function_text:
+        return "neutral"
+
+    # the vocabulary was rebuilt on every call
+    beneficial_functions = set(BENEFICIAL_FUNCTIONS)
+
+    functions = re.split(r"[,;/\|]", function_text.upper())
+    functions = [f.strip() for f in functions if f.strip()]
+
+    beneficial_count = 0
+    total_count = len(functions)
+
+    for func in functions:
+        if func in beneficial_functions:
+            beneficial_count += 1
+
+    if total_count > 0 and beneficial_count / total_count >= 0.5:
+        return "beneficial"
+
+    return "neutral"
+
+
+def make_rows(size, seed, distinct_functions=3000):
+    """COSING-like (function, restrictions) pairs with a realistic repeat rate."""
+    rng = random.Random(seed)
+    vocabulary = sorted(BENEFICIAL_FUNCTIONS) + OTHER_FUNCTIONS
+    pool = [
+        ", ".join(rng.sample(vocabulary, rng.randint(1, 4)))
+        for _ in range(distinct_functions)
+    ]
+    return [
+        (
+            rng.choice(pool),
+            rng.choice(RESTRICTIONS) if rng.random() < 0.1 else "",
+        )
+        for _ in range(size)
+    ]
+
+
+def _rate(calls, seconds):
+    return round(calls / seconds) if seconds else None
+
+
+def run(size=None, seed=0):
+    size = size or 30000
+    rows = make_rows(size, seed)
+
+    started = time.perf_counter()
+    for function, restrictions in rows:
+        legacy_evaluate_ingredient_safety(function, restrictions)
+        legacy_parse_restriction_description(restrictions)
+    legacy_seconds = time.perf_counter() - started
+
+    classifier = SafetyClassifier()
+    started = time.perf_counter()
+    classifier.classify_many(rows)
+    cold_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    classifier.classify_many(rows)
+    warm_seconds = time.perf_counter() - started
+
+    uncached = SafetyClassifier()
+    started = time.perf_counter()
+    for function, restrictions in rows:
+        uncached._classify(function, restrictions)
+    uncached_seconds = time.perf_counter() - started
+
+    return {
+        "rows": size,
+        "distinct_keys": classifier.cache_info().currsize,
+        "calls_per_second": {
+            "legacy": _rate(size, legacy_seconds),
+            "classifier_uncached": _rate(size, uncached_seconds),
+            "classifier_cold_cache": _rate(size, cold_seconds),
+            "classifier_warm_cache": _rate(size, warm_seconds),
+        },
+    }
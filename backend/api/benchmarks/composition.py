@@ -0,0 +1,83 @@
+"""
+Payload size and serialization time of a product's composition: the nested
+CosmeticCompositionReadSerializer rows against the compact representation.
+"""
+
+import random
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Cosmetic, CosmeticComposition, IngredientINCI
+from api.serializers import CosmeticCompositionReadSerializer, serialize_composition
+
+from .classifier import make_rows
+
+WORDS = (
+    "acid ester glycol extract oil sodium hydroxide polymer salt alcohol "
+    "derivative obtained from leaves seeds reaction product mixture with"
+).split()
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_composition(size, seed):
+    """An unsaved cosmetic with `size` ingredients of COSING-like length."""
+    rng = random.Random(seed)
+    cosmetic = Cosmetic(
+        barcode="5900000000000",
+        product_name="Krem nawilżający do twarzy",
+        manufacturer="Producent",
+        category="face",
+        description=_text(rng, 80),
+        purchase_link="https://www.ceneo.pl/;szukaj-krem+nawilzajacy",
+    )
+    compositions = []
+    for order, (function, restrictions) in enumerate(make_rows(size, seed), start=1):
+        ingredient = IngredientINCI(
+            cosing_ref_no=order,
+            inci_name=_text(rng, 3).upper(),
+            common_name=_text(rng, 2),
+            action_description=_text(rng, 40),
+            function=function,
+            restrictions=restrictions,
+            safety_rating="neutral",
+            restriction_description="",
+        )
+        compositions.append(
+            CosmeticComposition(
+                cosmetic=cosmetic, ingredient=ingredient, order_in_composition=order
+            )
+        )
+    return cosmetic, compositions
+
+
+def _measure(serialize, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = JSONRenderer().render(serialize())
+    return len(payload), (time.perf_counter() - started) / repeat
+
+
+def run(size=None, seed=0):
+    size = size or 40
+    repeat = 200
+    cosmetic, compositions = make_composition(size, seed)
+
+    variants = {
+        "nested_rows": lambda: CosmeticCompositionReadSerializer(
+            compositions, many=True
+        ).data,
+        "compact": lambda: serialize_composition(cosmetic, compositions),
+        "compact_expanded": lambda: serialize_composition(
+            cosmetic, compositions, {"cosmetic", "ingredients"}
+        ),
+    }
+    results = {"ingredients": size, "bytes": {}, "milliseconds": {}}
+    for name, serialize in variants.items():
+        size_bytes, seconds = _measure(serialize, repeat)
+        results["bytes"][name] = size_bytes
+        results["milliseconds"][name] = round(seconds * 1000, 3)
+    return results
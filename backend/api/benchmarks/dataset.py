@@ -0,0 +1,342 @@
+"""
+Synthetic catalog for benchmarks, written with `manage.py generate_catalog`
+or, at a small scale, by the endpoints suite itself.
+
+Ingredients get COSING-like names and function strings, cosmetics get 20-60
+ordered ingredients drawn from a skewed popularity distribution (a few, like
+water, are in most products, popular ones come first) and users get a skin
+profile, reviews, favorites and care plans. Everything is derived from the
+seed, so two runs with the same scale and seed produce the same rows.
+
+Generated rows use keys of their own (REF_NO_OFFSET, BARCODE_PREFIX,
+USERNAME_PREFIX), apart from real data and from the rows other suites insert.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from api import versions
+from api.cosing import classifier, content_hash
+from api.models import (
+    CarePlan,
+    CarePlanContent,
+    CarePlanRating,
+    Cosmetic,
+    CosmeticComposition,
+    FavoriteProduct,
+    IngredientINCI,
+    Person,
+    Review,
+)
+from api.signals import ingredients_changed
+
+from .classifier import make_rows
+
+REF_NO_OFFSET = 800_000_000
+BARCODE_PREFIX = "98"
+USERNAME_PREFIX = "bench-user-"
+BATCH_SIZE = 5000
+
+COMPOSITION_SIZE = (20, 60)
+REVIEWS_PER_USER = (0, 10)
+FAVORITES_PER_USER = (0, 10)
+CARE_PLANS_PER_USER = (0, 2)
+CARE_PLAN_SIZE = (2, 6)
+RATINGS_PER_CARE_PLAN = (0, 5)
+
+INCI_WORDS = (
+    "AQUA GLYCERIN SODIUM POTASSIUM LAURETH LAURYL SULFATE CETEARYL CETYL "
+    "STEARYL ALCOHOL PEG PPG METHYL ETHYL PROPYL BUTYL HEXYL PARABEN ACID "
+    "EXTRACT OIL SEED LEAF ROOT FLOWER FRUIT BUTTER TOCOPHERYL ACETATE CITRATE "
+    "GLYCOL STEARATE DIMETHICONE POLYSORBATE HYDROLYZED PROTEIN BENZOATE "
+    "CHLORIDE HYDROXIDE OXIDE GLUCOSIDE CAPRYLIC CAPRIC TRIGLYCERIDE SQUALANE "
+    "PANTHENOL ALLANTOIN NIACINAMIDE RETINYL PALMITATE ASCORBYL PHOSPHATE"
+).split()
+LATIN_WORDS = (
+    "ALOE BARBADENSIS CAMELLIA SINENSIS ROSA CANINA HELIANTHUS ANNUUS OLEA "
+    "EUROPAEA PRUNUS AMYGDALUS DULCIS BUTYROSPERMUM PARKII CENTELLA ASIATICA "
+    "CALENDULA OFFICINALIS CHAMOMILLA RECUTITA"
+).split()
+DESCRIPTION_WORDS = (
+    "krem serum lekka formuła nawilża łagodzi wygładza skóra cera sucha "
+    "tłusta wrażliwa codzienna pielęgnacja składniki aktywne ekstrakt olej "
+    "witamina delikatnie regeneruje chroni przed wysuszeniem"
+).split()
+BRAND_SYLLABLES = "bi eli la ro sa ne va to mi ka de lu po ra zi".split()
+
+# as chosen in the frontend
+CATEGORIES = [
+    "Oczyszczanie i demakijaż twarzy",
+    "Kremy do twarzy",
+    "Kremy z filtrem UV",
+    "Kremy pod oczy",
+    "Serum, maście i olejki do twarzy",
+    "Peelingi do twarzy",
+    "Maseczki na twarz",
+    "Balsamy do ust",
+    "Wody termalne i mgiełki",
+    "Kosmetyki do rzęs i brwi",
+    "Żele do ciała i produkty do kąpieli",
+    "Balsamy i kremy do ciała",
+    "Dezodoranty i antyperspiranty",
+    "Pielęgnacja dłoni i stóp",
+    "Peelingi do ciała",
+    "Kosmetyki do depilacji",
+    "Higiena intymna",
+    "Samoopalacze i produkty do opalania",
+    "Szampony",
+    "Odżywki, olejki i maski do włosów",
+    "Wcierki i peelingi do włosów",
+    "Kosmetyki do golenia",
+    "Stylizacja włosów",
+    "Koloryzacja włosów",
+]
+SKIN_TYPES = ["Sucha", "Tłusta", "Mieszana", "Normalna", "Wrażliwa"]
+SKIN_PROBLEMS = [
+    "Trądzik",
+    "Zaskórniki",
+    "Rozszerzone pory",
+    "Przebarwienia",
+    "Zmarszczki",
+    "Podrażnienia/rumień",
+    "Cera naczynkowa",
+]
+FREQUENCIES = ["Codziennie", "Co drugi dzień", "Raz w tygodniu"]
+TIMES_OF_DAY = ["Rano", "Wieczór", "Rano i wieczór"]
+
+
+@dataclass
+class Scale:
+    ingredients: int = 30_000
+    cosmetics: int = 100_000
+    users: int = 1_000
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _insert(model, objects, batch_size):
+    count = 0
+    for chunk in _chunks(objects, batch_size):
+        model.objects.bulk_create(chunk)
+        count += len(chunk)
+    return count
+
+
+def _between(rng, bounds):
+    return rng.randint(*bounds)
+
+
+def _text(rng, words, count):
+    return " ".join(rng.choice(words) for _ in range(count))
+
+
+def barcode(n):
+    return f"{BARCODE_PREFIX}{n:011d}"
+
+
+def exists():
+    return Cosmetic.objects.filter(barcode__startswith=BARCODE_PREFIX).exists()
+
+
+def _ingredients(scale, seed):
+    rng = random.Random(seed)
+    rows = make_rows(scale.ingredients, seed)
+    ratings = classifier.classify_many(rows)
+    for n, ((function, restrictions), (rating, description)) in enumerate(
+        zip(rows, ratings)
+    ):
+        words = LATIN_WORDS if rng.random() < 0.2 else INCI_WORDS
+        fields = {
+            "inci_name": f"{_text(rng, words, rng.randint(1, 4))} {n}",
+            "common_name": "",
+            "action_description": _text(rng, DESCRIPTION_WORDS, 12),
+            "function": function,
+            "restrictions": restrictions,
+            "update_date": "01/01/2025",
+        }
+        yield IngredientINCI(
+            cosing_ref_no=REF_NO_OFFSET + n,
+            safety_rating=rating,
+            restriction_description=description,
+            content_hash=content_hash(fields),
+            **fields,
+        )
+
+
+def _cosmetics(scale, seed):
+    rng = random.Random(seed + 1)
+    brands = [
+        "".join(rng.choice(BRAND_SYLLABLES) for _ in range(3)).capitalize()
+        for _ in range(max(1, scale.cosmetics // 200))
+    ]
+    for n in range(scale.cosmetics):
+        category = rng.choice(CATEGORIES)
+        name = f"{category.split(',')[0]} {_text(rng, DESCRIPTION_WORDS, 2)}"
+        yield Cosmetic(
+            barcode=barcode(n),
+            product_name=f"{name} {n}",
+            manufacturer=rng.choice(brands),
+            category=category,
+            description=_text(rng, DESCRIPTION_WORDS, rng.randint(10, 40)),
+            is_verified=rng.random() < 0.9,
+        )
+
+
+def _compositions(scale, seed):
+    rng = random.Random(seed + 2)
+    cum_weights = list(accumulate(1 / (n + 1) ** 0.8 for n in range(scale.ingredients)))
+    ranks = range(scale.ingredients)
+    for n in range(scale.cosmetics):
+        size = min(_between(rng, COMPOSITION_SIZE), scale.ingredients)
+        chosen = set()
+        while len(chosen) < size:
+            chosen.update(
+                rng.choices(ranks, cum_weights=cum_weights, k=size - len(chosen))
+            )
+        # the most common ingredients (water, glycerin) usually lead the list
+        for order, rank in enumerate(sorted(chosen), start=1):
+            yield CosmeticComposition(
+                cosmetic_id=barcode(n),
+                ingredient_id=REF_NO_OFFSET + rank,
+                order_in_composition=order,
+            )
+
+
+def _users(scale, seed):
+    password = make_password(None)
+    for n in range(scale.users):
+        yield User(
+            username=f"{USERNAME_PREFIX}{n}",
+            email=f"{USERNAME_PREFIX}{n}@example.com",
+            password=password,
+        )
+
+
+def _people(scale, seed, user_ids):
+    rng = random.Random(seed + 3)
+    for user_id in user_ids:
+        problems = rng.sample(SKIN_PROBLEMS, rng.randint(0, 3))
+        yield Person(
+            user_id=user_id,
+            skin_type=" - ".join(rng.sample(SKIN_TYPES, rng.randint(1, 2))),
+            skin_problems=", ".join(problems) or "Brak",
+        )
+
+
+def _activity(scale, seed, user_ids):
+    """(reviews, favorites, care plans with their contents) of every user."""
+    rng = random.Random(seed + 4)
+    today = date(2025, 1, 1)
+    reviews, favorites, plans = [], [], []
+    for user_id in user_ids:
+        for _ in range(_between(rng, REVIEWS_PER_USER)):
+            reviews.append(
+                Review(
+                    cosmetic_id=barcode(rng.randrange(scale.cosmetics)),
+                    user_id=user_id,
+                    title=_text(rng, DESCRIPTION_WORDS, 3),
+                    content=_text(rng, DESCRIPTION_WORDS, rng.randint(10, 60)),
+                    rating=rng.randint(1, 5),
+                    review_date=today - timedelta(days=rng.randrange(730)),
+                )
+            )
+        count = min(_between(rng, FAVORITES_PER_USER), scale.cosmetics)
+        for n in rng.sample(range(scale.cosmetics), count):
+            favorites.append(FavoriteProduct(user_id=user_id, cosmetic_id=barcode(n)))
+        for _ in range(_between(rng, CARE_PLANS_PER_USER)):
+            start_date = today - timedelta(days=rng.randrange(365))
+            plan = CarePlan(
+                user_id=user_id,
+                plan_name=f"Plan {_text(rng, DESCRIPTION_WORDS, 2)}",
+                description=_text(rng, DESCRIPTION_WORDS, 15),
+                start_date=start_date,
+                end_date=start_date + timedelta(days=rng.randint(14, 120)),
+            )
+            contents = [
+                CarePlanContent(
+                    cosmetic_id=barcode(rng.randrange(scale.cosmetics)),
+                    frequency=rng.choice(FREQUENCIES),
+                    time_of_day=rng.choice(TIMES_OF_DAY),
+                )
+                for _ in range(_between(rng, CARE_PLAN_SIZE))
+            ]
+            raters = rng.sample(
+                user_ids, min(_between(rng, RATINGS_PER_CARE_PLAN), len(user_ids))
+            )
+            plans.append((plan, contents, raters))
+    return reviews, favorites, plans
+
+
+def _insert_plans(plans, rng, batch_size):
+    # bulk_create sets the primary keys on SQLite and PostgreSQL alike
+    counts = {"care_plans": 0, "care_plan_contents": 0, "care_plan_ratings": 0}
+    for chunk in _chunks(plans, batch_size):
+        CarePlan.objects.bulk_create([plan for plan, _, _ in chunk])
+        contents = []
+        ratings = []
+        for plan, plan_contents, raters in chunk:
+            for content in plan_contents:
+                content.plan_id = plan.pk
+                contents.append(content)
+            ratings += [
+                CarePlanRating(
+                    plan_id=plan.pk, user_id=user_id, rating=rng.random() < 0.8
+                )
+                for user_id in raters
+            ]
+        counts["care_plans"] += len(chunk)
+        counts["care_plan_contents"] += _insert(CarePlanContent, contents, batch_size)
+        counts["care_plan_ratings"] += _insert(CarePlanRating, ratings, batch_size)
+    return counts
+
+
+def generate(scale=None, seed=0, batch_size=BATCH_SIZE, progress=None):
+    """
+    Insert a synthetic catalog of the given Scale; returns the number of rows
+    of every kind. `progress`, if given, is called with a message after each
+    step. Rows are written with bulk_create, so the derived data (safety
+    summaries, catalog versions, caches) is refreshed once at the end.
+    """
+    scale = scale or Scale()
+    progress = progress or (lambda message: None)
+    counts = {}
+    with transaction.atomic():
+        counts["ingredients"] = _insert(
+            IngredientINCI, _ingredients(scale, seed), batch_size
+        )
+        progress(f"{counts['ingredients']} ingredients")
+        counts["cosmetics"] = _insert(Cosmetic, _cosmetics(scale, seed), batch_size)
+        progress(f"{counts['cosmetics']} cosmetics")
+        counts["compositions"] = _insert(
+            CosmeticComposition, _compositions(scale, seed), batch_size
+        )
+        progress(f"{counts['compositions']} composition rows")
+
+        counts["users"] = _insert(User, _users(scale, seed), batch_size)
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        _insert(Person, _people(scale, seed, user_ids), batch_size)
+        reviews, favorites, plans = _activity(scale, seed, user_ids)
+        counts["reviews"] = _insert(Review, reviews, batch_size)
+        counts["favorites"] = _insert(FavoriteProduct, favorites, batch_size)
+        counts.update(_insert_plans(plans, random.Random(seed + 5), batch_size))
+        progress(f"{counts['users']} users with their reviews and care plans")
+
+        # rebuilds every safety summary and invalidates the caches on commit
+        ingredients_changed.send(sender=IngredientINCI)
+        versions.bump(versions.COSMETICS)
+        progress("safety summaries rebuilt")
+    return counts
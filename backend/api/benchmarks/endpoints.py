@@ -0,0 +1,192 @@
+"""
+Latency, queries per request and throughput of the main API endpoints,
+called through the whole Django stack (middleware, authentication,
+rendering) with the test client, one request at a time.
+
+The COSING import is measured on catalog.import_cosing, the work of an
+import job, since the endpoint only queues the job.
+
+Runs against the catalog written by `manage.py generate_catalog` when the
+database has one, else generates a small one first (see dataset). Either
+way everything runs in a transaction that is rolled back, so the database
+is left as it was; `size` is the number of requests per endpoint.
+"""
+
+import csv
+import io
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.catalog import import_cosing
+from api.models import Cosmetic, IngredientINCI
+
+from . import dataset
+
+SMALL_SCALE = dataset.Scale(ingredients=3000, cosmetics=2000, users=50)
+IMPORT_ROWS = 2000
+# the import and the recalculation process the whole batch or catalog per
+# call, so they run fewer times
+BULK_REQUESTS = 5
+COSING_COLUMNS = [
+    "COSING Ref No",
+    "INCI name",
+    "INN name",
+    "Ph. Eur. Name",
+    "Chem/IUPAC Name / Description",
+    "Restriction",
+    "Function",
+    "Update Date",
+]
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def _measure(calls):
+    """Stats of running every callable once, each returning a status code."""
+    latencies = []
+    queries = []
+    statuses = set()
+    started = time.perf_counter()
+    for call in calls:
+        with CaptureQueriesContext(connection) as captured:
+            call_started = time.perf_counter()
+            statuses.add(call())
+            latencies.append(time.perf_counter() - call_started)
+        queries.append(len(captured))
+    total_seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "statuses": sorted(statuses),
+        "milliseconds": {
+            "p50": round(_percentile(latencies, 0.5) * 1000, 2),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "queries_per_request": round(sum(queries) / len(queries), 1),
+        "requests_per_second": round(len(latencies) / total_seconds, 1),
+    }
+
+
+def _words(values, rng, count):
+    """`count` search terms drawn from the words of `values`."""
+    words = sorted(
+        {
+            word
+            for value in values
+            for word in value.split()
+            if len(word) > 2 and not word.isdigit()
+        }
+    )
+    return [rng.choice(words) for _ in range(count)]
+
+
+def _cosing_lines(ref_nos, update_date):
+    """The given ingredients as raw COSING export lines, with a new update date."""
+    rows = IngredientINCI.objects.filter(cosing_ref_no__in=ref_nos).values_list(
+        "cosing_ref_no",
+        "inci_name",
+        "common_name",
+        "action_description",
+        "restrictions",
+        "function",
+    )
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(COSING_COLUMNS)
+    for ref_no, inci_name, common_name, description, restrictions, function in rows:
+        writer.writerow(
+            [ref_no, inci_name, common_name, "", description]
+            + [restrictions or "", function or "", update_date]
+        )
+    return [line.encode("utf-8") for line in output.getvalue().splitlines(True)]
+
+
+def _benchmark(size, seed):
+    rng = random.Random(seed)
+    client = APIClient()
+    staff, _ = User.objects.get_or_create(
+        username="bench-staff", defaults={"is_staff": True}
+    )
+    client.force_authenticate(staff)
+
+    barcodes = list(
+        Cosmetic.objects.filter(barcode__startswith=dataset.BARCODE_PREFIX)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    ref_nos = list(
+        IngredientINCI.objects.filter(cosing_ref_no__gte=dataset.REF_NO_OFFSET)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    sample = rng.sample(barcodes, min(len(barcodes), 500))
+    names = Cosmetic.objects.filter(pk__in=sample).values_list(
+        "product_name", flat=True
+    )
+    sample = rng.sample(ref_nos, min(len(ref_nos), 500))
+    inci_names = IngredientINCI.objects.filter(pk__in=sample).values_list(
+        "inci_name", flat=True
+    )
+
+    def get(url, params=None):
+        return lambda: client.get(url, params).status_code
+
+    def import_batch(run):
+        # existing ingredients with a newer update date, so every row is written
+        lines = _cosing_lines(
+            rng.sample(ref_nos, min(len(ref_nos), IMPORT_ROWS)),
+            f"{run + 1:02d}/01/2026",
+        )
+        return lambda: 400 if import_cosing(lines).rejected else 200
+
+    endpoints = {
+        "ingredient_search": [
+            get("/api/ingredients/", {"search": word})
+            for word in _words(inci_names, rng, size)
+        ],
+        "cosmetic_search": [
+            get("/api/cosmetics/", {"query": word}) for word in _words(names, rng, size)
+        ],
+        "composition": [
+            get(f"/api/cosmetics/{rng.choice(barcodes)}/composition/")
+            for _ in range(size)
+        ],
+        "cosing_import": [import_batch(run) for run in range(BULK_REQUESTS)],
+        "recalculate_safety": [
+            lambda: client.post("/api/ingredients/recalculate_safety/").status_code
+            for _ in range(BULK_REQUESTS)
+        ],
+    }
+    results = {}
+    for name, calls in endpoints.items():
+        cache.clear()
+        results[name] = _measure(calls)
+    results["cosing_import"]["rows_per_request"] = min(len(ref_nos), IMPORT_ROWS)
+    return results
+
+
+def run(size=None, seed=0):
+    size = size or 200
+    results = {}
+    with transaction.atomic():
+        generated = dataset.exists()
+        if not generated:
+            dataset.generate(SMALL_SCALE, seed)
+        results["catalog"] = {
+            "generated_by_suite": not generated,
+            "cosmetics": Cosmetic.objects.count(),
+            "ingredients": IngredientINCI.objects.count(),
+        }
+        results["endpoints"] = _benchmark(size, seed)
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,115 @@
+"""
+Milliseconds per "contains / free from" cosmetic filter: the ORM's joins and
+anti-joins over CosmeticComposition against the in-memory composition index.
+
+The rows are inserted inside a transaction that is rolled back afterwards,
+so the suite can run against any database.
+"""
+
+import random
+import time
+
+from django.db import transaction
+
+from api.composition_index import CompositionIndex
+from api.models import Cosmetic, CosmeticComposition, IngredientINCI
+
+from .serialization import BARCODE_PREFIX, REF_NO_OFFSET
+
+INGREDIENTS = 2000
+COMPOSITION_SIZE = 30
+REPEAT = 20
+
+
+def _populate(size, seed):
+    rng = random.Random(seed)
+    IngredientINCI.objects.bulk_create(
+        IngredientINCI(
+            cosing_ref_no=REF_NO_OFFSET + n, inci_name=f"BENCHMARK INGREDIENT {n}"
+        )
+        for n in range(INGREDIENTS)
+    )
+    barcodes = [f"{BARCODE_PREFIX}{n:011d}" for n in range(size)]
+    Cosmetic.objects.bulk_create(
+        Cosmetic(
+            barcode=barcode,
+            product_name=f"Benchmark cosmetic {n}",
+            manufacturer="Benchmark",
+            category="face",
+        )
+        for n, barcode in enumerate(barcodes)
+    )
+    # a few ingredients are in most products, like water or glycerin
+    weights = [1 / (n + 1) for n in range(INGREDIENTS)]
+    rows = []
+    for barcode in barcodes:
+        ref_nos = set(rng.choices(range(INGREDIENTS), weights, k=COMPOSITION_SIZE))
+        rows += [(barcode, REF_NO_OFFSET + n) for n in ref_nos]
+    CosmeticComposition.objects.bulk_create(
+        (
+            CosmeticComposition(cosmetic_id=barcode, ingredient_id=ref_no)
+            for barcode, ref_no in rows
+        ),
+        batch_size=5000,
+    )
+    return barcodes, rows
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn()
+    return (time.perf_counter() - started) / REPEAT, result
+
+
+def _orm(contains, excludes):
+    queryset = Cosmetic.objects.filter(barcode__startswith=BARCODE_PREFIX)
+    for ref_no in contains:
+        queryset = queryset.filter(ingredients__ingredient=ref_no)
+    if excludes:
+        queryset = queryset.exclude(ingredients__ingredient__in=excludes)
+    return set(queryset.values_list("pk", flat=True))
+
+
+def _indexed(index, contains, excludes):
+    queryset = Cosmetic.objects.filter(barcode__startswith=BARCODE_PREFIX)
+    queryset = index.filter_queryset(queryset, contains, excludes)
+    return set(queryset.values_list("pk", flat=True))
+
+
+def run(size=None, seed=0):
+    size = size or 10000
+    common = REF_NO_OFFSET
+    rare = REF_NO_OFFSET + 500
+    queries = {
+        "contains_common": ([common], []),
+        "contains_rare": ([rare], []),
+        "contains_both": ([common, rare], []),
+        "excludes_common": ([], [common, common + 1]),
+        "contains_and_excludes": ([common + 2], [common, rare]),
+    }
+    results = {"cosmetics": size}
+    with transaction.atomic():
+        barcodes, rows = _populate(size, seed)
+        started = time.perf_counter()
+        index = CompositionIndex(barcodes, rows)
+        results["index_build_milliseconds"] = round(
+            (time.perf_counter() - started) * 1000, 1
+        )
+
+        for name, (contains, excludes) in queries.items():
+            orm_seconds, expected = _timed(lambda: _orm(contains, excludes))
+            match_seconds, _ = _timed(lambda: index.match(contains, excludes))
+            indexed_seconds, found = _timed(lambda: _indexed(index, contains, excludes))
+            assert found == expected, name
+            results[name] = {
+                "matches": len(found),
+                "milliseconds": {
+                    "orm": round(orm_seconds * 1000, 2),
+                    "index_match": round(match_seconds * 1000, 2),
+                    "index_query": round(indexed_seconds * 1000, 2),
+                },
+                "speedup": round(orm_seconds / indexed_seconds, 2),
+            }
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,123 @@
+"""
+Rows per second of the read endpoints' two serialization paths: DRF model
+serializers over model instances against dicts built from .values() rows.
+
+The rows are inserted inside a transaction that is rolled back afterwards,
+so the suite can run against any database.
+"""
+
+import time
+
+from django.db import transaction
+
+from api import fastpath
+from api.models import Cosmetic, CosmeticComposition, IngredientINCI
+from api.serializers import (
+    CosmeticSerializer,
+    IngredientINCISerializer,
+    serialize_composition,
+)
+
+from .classifier import make_rows
+
+# keys well outside the ranges used by real data
+REF_NO_OFFSET = 900_000_000
+BARCODE_PREFIX = "99"
+COMPOSITION_SIZE = 40
+
+
+def _populate(size, seed):
+    IngredientINCI.objects.bulk_create(
+        IngredientINCI(
+            cosing_ref_no=REF_NO_OFFSET + n,
+            inci_name=f"BENCHMARK INGREDIENT {n}",
+            common_name=f"ingredient {n}",
+            action_description="benchmark " * 30,
+            function=function,
+            restrictions=restrictions,
+            safety_rating="harmful" if restrictions else "neutral",
+        )
+        for n, (function, restrictions) in enumerate(make_rows(size, seed))
+    )
+    Cosmetic.objects.bulk_create(
+        Cosmetic(
+            barcode=f"{BARCODE_PREFIX}{n:011d}",
+            product_name=f"Benchmark cosmetic {n}",
+            manufacturer="Benchmark",
+            category="face",
+            description="benchmark " * 30,
+        )
+        for n in range(size)
+    )
+    cosmetic = Cosmetic.objects.get(barcode=f"{BARCODE_PREFIX}{0:011d}")
+    CosmeticComposition.objects.bulk_create(
+        CosmeticComposition(
+            cosmetic=cosmetic,
+            ingredient_id=REF_NO_OFFSET + n,
+            order_in_composition=n + 1,
+        )
+        for n in range(min(COMPOSITION_SIZE, size))
+    )
+    return cosmetic
+
+
+def _timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def _compare(queryset, serializer_class):
+    fields = fastpath.plain_fields(serializer_class(), queryset.model)
+    count = queryset.count()
+    serializer_seconds = _timed(
+        lambda: serializer_class(list(queryset), many=True).data
+    )
+    values_seconds = _timed(lambda: list(queryset.values(*fields)))
+    return {
+        "rows": count,
+        "rows_per_second": {
+            "serializer": round(count / serializer_seconds),
+            "values": round(count / values_seconds),
+        },
+        "speedup": round(serializer_seconds / values_seconds, 2),
+    }
+
+
+def run(size=None, seed=0):
+    size = size or 10000
+    results = {}
+    with transaction.atomic():
+        cosmetic = _populate(size, seed)
+        results["cosmetics"] = _compare(
+            Cosmetic.objects.filter(barcode__startswith=BARCODE_PREFIX),
+            CosmeticSerializer,
+        )
+        results["ingredients"] = _compare(
+            IngredientINCI.objects.filter(cosing_ref_no__gte=REF_NO_OFFSET),
+            IngredientINCISerializer,
+        )
+
+        def serializer_path():
+            compositions = (
+                CosmeticComposition.objects.filter(cosmetic=cosmetic)
+                .select_related("ingredient")
+                .order_by("order_in_composition")
+            )
+            return serialize_composition(cosmetic, compositions)
+
+        serializer_seconds = _timed(serializer_path, repeat=100)
+        values_seconds = _timed(
+            lambda: fastpath.serialize_composition(cosmetic), repeat=100
+        )
+        results["composition"] = {
+            "ingredients": min(COMPOSITION_SIZE, size),
+            "milliseconds": {
+                "serializer": round(serializer_seconds * 1000, 3),
+                "values": round(values_seconds * 1000, 3),
+            },
+            "speedup": round(serializer_seconds / values_seconds, 2),
+        }
+        transaction.set_rollback(True)
+    return results
@@ -0,0 +1,136 @@
+"""
+Recall and latency of the similar-products lookup: the MinHash/LSH index
+against comparing a product with every other one.
+
+The catalog is synthetic and kept in memory (no database rows): products
+draw their ingredients from a skewed popularity distribution and a share of
+them are near copies ("dupes") of another product, which the lookup should
+find. Half of the queries are dupes. Recall is measured on the true top
+neighbours with a Jaccard similarity of at least each of RECALL_SIMILARITY.
+"""
+
+import heapq
+import random
+import time
+from itertools import accumulate
+
+from api.composition_index import CompositionIndex
+from api.similarity import SimilarityIndex, jaccard
+
+INGREDIENTS = 5000
+COMPOSITION_SIZE = 25
+DUPE_SHARE = 0.2
+# share of a dupe's ingredients replaced with others
+DUPE_CHANGES = 0.15
+RECALL_SIMILARITY = [0.3, 0.5, 0.7]
+QUERIES = 100
+TOP = 10
+
+
+def make_catalog(size, seed):
+    """
+    ({barcode: [ref no, ...]}, dupe barcodes), DUPE_SHARE of the products
+    being dupes.
+    """
+    rng = random.Random(seed)
+    cum_weights = list(accumulate(1 / (n + 1) ** 0.8 for n in range(INGREDIENTS)))
+    catalog = {}
+    originals = []
+    dupes = []
+    for n in range(size):
+        barcode = f"{n:013d}"
+        if originals and rng.random() < DUPE_SHARE:
+            ref_nos = list(catalog[rng.choice(originals)])
+            for i in range(len(ref_nos)):
+                if rng.random() < DUPE_CHANGES:
+                    ref_nos[i] = rng.randrange(INGREDIENTS)
+            dupes.append(barcode)
+        else:
+            ref_nos = rng.choices(
+                range(INGREDIENTS), cum_weights=cum_weights, k=COMPOSITION_SIZE
+            )
+            originals.append(barcode)
+        catalog[barcode] = sorted(set(ref_nos))
+    return catalog, dupes
+
+
+def _brute_force(index, rowid):
+    ref_nos = index.contents[rowid]
+    scored = (
+        (jaccard(ref_nos, other_ref_nos), index.barcodes[other])
+        for other, other_ref_nos in index.contents.items()
+        if other != rowid
+    )
+    return [
+        (barcode, similarity)
+        for similarity, barcode in heapq.nlargest(TOP, scored)
+        if similarity > 0
+    ]
+
+
+def run(size=None, seed=0):
+    size = size or 100_000
+    catalog, dupes = make_catalog(size, seed)
+    rows = [
+        (barcode, ref_no) for barcode, ref_nos in catalog.items() for ref_no in ref_nos
+    ]
+
+    started = time.perf_counter()
+    index = CompositionIndex(catalog, rows)
+    similar = SimilarityIndex(index)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    queries = rng.sample(dupes, min(QUERIES // 2, len(dupes)))
+    queries += rng.sample(sorted(catalog), min(QUERIES - len(queries), size))
+    lsh_seconds = brute_seconds = 0.0
+    candidates = 0
+    relevant = dict.fromkeys(RECALL_SIMILARITY, 0)
+    found = dict.fromkeys(RECALL_SIMILARITY, 0)
+    for barcode in queries:
+        rowid = index.rowids[barcode]
+        started = time.perf_counter()
+        results = similar.similar(barcode, TOP)
+        lsh_seconds += time.perf_counter() - started
+        candidates += len(similar.candidates(rowid))
+
+        started = time.perf_counter()
+        expected = _brute_force(index, rowid)
+        brute_seconds += time.perf_counter() - started
+
+        returned = {b for b, _ in results}
+        for threshold in RECALL_SIMILARITY:
+            wanted = {b for b, similarity in expected if similarity >= threshold}
+            relevant[threshold] += len(wanted)
+            found[threshold] += len(wanted & returned)
+
+    # one incremental change, as after a composition edit
+    barcode = queries[0]
+    started = time.perf_counter()
+    index.update(barcode, catalog[barcode][:-1])
+    similar.catch_up()
+    update_seconds = time.perf_counter() - started
+
+    return {
+        "products": size,
+        "build_seconds": round(build_seconds, 2),
+        "update_milliseconds": round(update_seconds * 1000, 3),
+        "queries": len(queries),
+        "recall": {
+            f"similarity>={threshold}": {
+                "neighbours": relevant[threshold],
+                "recall": (
+                    round(found[threshold] / relevant[threshold], 3)
+                    if relevant[threshold]
+                    else None
+                ),
+            }
+            for threshold in RECALL_SIMILARITY
+        },
+        "mean_candidates": round(candidates / len(queries), 1),
+        "milliseconds_per_query": {
+            "lsh": round(lsh_seconds / len(queries) * 1000, 3),
+            "brute_force": round(brute_seconds / len(queries) * 1000, 3),
+        },
+        "speedup": round(brute_seconds / lsh_seconds, 1),
+    }
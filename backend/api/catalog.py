@@ -0,0 +1,394 @@
+"""
+Bulk maintenance of the ingredient catalog: COSING import and recalculation
+of the derived safety fields.
+"""
+
+import codecs
+import csv
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.db import transaction
+
+from .cosing import (
+    SOURCE_FIELDS,
+    classifier,
+    parse_range,
+    parse_rows,
+    split_ranges,
+)
+from .models import IngredientINCI
+from .signals import ingredients_changed
+
+COSING_BATCH_SIZE = 1000
+# bytes of the file parsed by a worker process at a time
+PARSE_CHUNK_BYTES = 1 << 20
+RECALCULATE_CHUNK_SIZE = 2000
+ERROR_SAMPLE_LIMIT = 20
+DIFF_SAMPLE_LIMIT = 1000
+
+SAFETY_FIELDS = ["safety_rating", "restriction_description"]
+
+# every column except the primary key is overwritten on re-import
+INGREDIENT_IMPORT_FIELDS = SOURCE_FIELDS + SAFETY_FIELDS + ["content_hash"]
+
+
+@dataclass
+class ImportDiff:
+    new: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    field_changes: Counter = field(default_factory=Counter)
+
+    def as_dict(self):
+        def ref_nos(values):
+            return {
+                "count": len(values),
+                "cosing_ref_nos": sorted(values)[:DIFF_SAMPLE_LIMIT],
+            }
+
+        return {
+            "new": ref_nos(self.new),
+            "changed": ref_nos(self.changed),
+            "removed": ref_nos(self.removed),
+            "field_changes": dict(self.field_changes),
+        }
+
+
+@dataclass
+class ImportStats:
+    bytes_read: int = 0
+    rows_read: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    parse_seconds: float = 0.0
+    classify_seconds: float = 0.0
+    write_seconds: float = 0.0
+    total_seconds: float = 0.0
+    error_samples: list = field(default_factory=list)
+    diff: ImportDiff = field(default_factory=ImportDiff)
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.error_samples) < ERROR_SAMPLE_LIMIT:
+            self.error_samples.append({"line": line, "error": error})
+
+    def as_dict(self):
+        return {
+            "rows_read": self.rows_read,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "rejected": self.rejected,
+            "timings": {
+                "parse": round(self.parse_seconds, 3),
+                "classify": round(self.classify_seconds, 3),
+                "write": round(self.write_seconds, 3),
+                "total": round(self.total_seconds, 3),
+            },
+            "error_samples": self.error_samples,
+            "diff": self.diff.as_dict(),
+        }
+
+
+def _count_bytes(lines, stats):
+    for line in lines:
+        stats.bytes_read += len(line)
+        yield line
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _write_batch(batch, stats):
+    """
+    Upsert the rows of `batch` (ref no -> parsed fields) that are new or whose
+    content hash differs from the stored one. Unchanged rows are not written
+    and not classified again.
+    """
+    started = time.perf_counter()
+    changed = []
+    with transaction.atomic():
+        stored_hashes = dict(
+            IngredientINCI.objects.filter(pk__in=batch.keys()).values_list(
+                "pk", "content_hash"
+            )
+        )
+        new = [ref_no for ref_no in batch if ref_no not in stored_hashes]
+        modified = [
+            ref_no
+            for ref_no, stored_hash in stored_hashes.items()
+            if stored_hash != batch[ref_no]["content_hash"]
+        ]
+
+        # old values are only read for the rows that are about to change
+        if modified:
+            stored_rows = IngredientINCI.objects.filter(pk__in=modified).values(
+                "cosing_ref_no", *SOURCE_FIELDS
+            )
+            for stored in stored_rows:
+                fields = batch[stored["cosing_ref_no"]]
+                changed_fields = [
+                    name
+                    for name in SOURCE_FIELDS
+                    if (stored[name] or "") != fields[name]
+                ]
+                # rows imported before hashes existed only get their hash stored
+                if changed_fields:
+                    changed.append(stored["cosing_ref_no"])
+                    stats.diff.field_changes.update(changed_fields)
+
+        to_write = new + modified
+        # rows parsed by worker processes come classified already
+        to_classify = [
+            ref_no for ref_no in to_write if "safety_rating" not in batch[ref_no]
+        ]
+        classify_started = time.perf_counter()
+        results = classifier.classify_many(
+            (batch[ref_no]["function"], batch[ref_no]["restrictions"])
+            for ref_no in to_classify
+        )
+        for ref_no, (rating, description) in zip(to_classify, results):
+            batch[ref_no]["safety_rating"] = rating
+            batch[ref_no]["restriction_description"] = description
+        stats.classify_seconds += time.perf_counter() - classify_started
+
+        if to_write:
+            IngredientINCI.objects.bulk_create(
+                [IngredientINCI(**batch[ref_no]) for ref_no in to_write],
+                update_conflicts=True,
+                unique_fields=["cosing_ref_no"],
+                update_fields=INGREDIENT_IMPORT_FIELDS,
+            )
+
+    stats.inserted += len(new)
+    stats.updated += len(changed)
+    stats.unchanged += len(batch) - len(new) - len(changed)
+    stats.diff.new.extend(new)
+    stats.diff.changed.extend(changed)
+    stats.write_seconds += time.perf_counter() - started
+
+
+def _find_removed(seen, stats):
+    stored = IngredientINCI.objects.values_list("pk", flat=True).iterator(
+        chunk_size=5000
+    )
+    stats.diff.removed = [ref_no for ref_no in stored if ref_no not in seen]
+
+
+def _import_parsed(parsed, stats, batch_size, progress):
+    """
+    Upsert parse_rows() results in batches of `batch_size` rows, in order,
+    each batch in its own transaction. Returns the ref nos seen.
+    """
+    batch = {}
+    seen = set()
+    for line, fields, error in parsed:
+        stats.rows_read += 1
+        if fields is None:
+            if error is None:
+                stats.skipped += 1
+            else:
+                stats.reject(line, error)
+            continue
+
+        # a ref no repeated within one batch would make the upsert touch the
+        # same row twice, so the last occurrence wins like with update_or_create
+        ref_no = fields["cosing_ref_no"]
+        if ref_no in seen:
+            stats.duplicates += 1
+        seen.add(ref_no)
+        batch[ref_no] = fields
+
+        if len(batch) >= batch_size:
+            _write_batch(batch, stats)
+            batch = {}
+            if progress:
+                progress(stats)
+
+    if batch:
+        _write_batch(batch, stats)
+    return seen
+
+
+def _finish(stats, seen, started):
+    _find_removed(seen, stats)
+    if stats.inserted or stats.updated:
+        # new ingredients are in no composition yet
+        ingredients_changed.send(
+            sender=IngredientINCI, cosing_ref_nos=stats.diff.changed
+        )
+
+    stats.total_seconds = time.perf_counter() - started
+    stats.parse_seconds = (
+        stats.total_seconds - stats.classify_seconds - stats.write_seconds
+    )
+    return stats
+
+
+def import_cosing(lines, batch_size=COSING_BATCH_SIZE, progress=None):
+    """
+    Upsert ingredients from an iterable of raw (bytes) CSV lines, e.g. an
+    uploaded file. The input is decoded and parsed lazily and written in
+    batches of `batch_size` rows, each batch in its own transaction.
+    `progress`, if given, is called with the running stats after every batch.
+
+    Ingredients missing from the file are reported in the diff but kept,
+    since compositions still reference them.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    reader = csv.DictReader(codecs.iterdecode(_count_bytes(lines, stats), "utf-8"))
+    seen = _import_parsed(parse_rows(reader), stats, batch_size, progress)
+    return _finish(stats, seen, started)
+
+
+def _parse_in_parallel(executor, path, ranges, fieldnames, in_flight, stats):
+    """
+    parse_range() results of every range, in file order, keeping up to
+    `in_flight` ranges submitted ahead of the one being written.
+    """
+    ranges = iter(ranges)
+    pending = deque()
+
+    def submit():
+        for start, end, first_line in islice(ranges, 1):
+            future = executor.submit(
+                parse_range, path, start, end, first_line, fieldnames
+            )
+            pending.append((end - start, future))
+
+    for _ in range(in_flight):
+        submit()
+    while pending:
+        size, future = pending.popleft()
+        parsed = future.result()
+        submit()
+        stats.bytes_read += size
+        yield from parsed
+
+
+def import_cosing_file(
+    path,
+    workers=None,
+    batch_size=COSING_BATCH_SIZE,
+    progress=None,
+    chunk_bytes=PARSE_CHUNK_BYTES,
+):
+    """
+    import_cosing() for a file on disk, with the CPU-bound part spread over
+    `workers` processes (default: one per CPU).
+
+    The file is cut into byte ranges of about `chunk_bytes` at record
+    boundaries; worker processes decode, parse and classify the ranges while
+    this thread, the only writer, upserts the results in file order, so rows
+    are committed in the order they appear in the file. Small files, or one
+    worker, take the sequential path.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or os.path.getsize(path) <= chunk_bytes:
+        with open(path, "rb") as f:
+            return import_cosing(f, batch_size, progress)
+
+    stats = ImportStats()
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        header = f.readline()
+        stats.bytes_read += len(header)
+        fieldnames = next(csv.reader([header.decode("utf-8")]))
+        ranges = split_ranges(f, len(header), chunk_bytes, first_line=2)
+        # spawned, not forked: imports run in a thread of the web server
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            parsed = _parse_in_parallel(
+                executor, path, ranges, fieldnames, workers * 2, stats
+            )
+            seen = _import_parsed(parsed, stats, batch_size, progress)
+    return _finish(stats, seen, started)
+
+
+@dataclass
+class RecalculationResult:
+    total: int = 0
+    updated: int = 0
+    seconds: float = 0.0
+    changes: list = field(default_factory=list)
+
+
+def recalculate_safety_ratings(dry_run=False, chunk_size=RECALCULATE_CHUNK_SIZE):
+    """
+    Re-evaluate safety_rating and restriction_description for the whole
+    catalog. Only the columns the classifier needs are streamed from the
+    database and only changed rows are written back, `chunk_size` at a time.
+    With `dry_run` nothing is written and the changes are returned instead.
+    """
+    started = time.perf_counter()
+    result = RecalculationResult()
+    rating_changed = []
+    rows = (
+        IngredientINCI.objects.order_by()
+        .values_list(
+            "cosing_ref_no",
+            "function",
+            "restrictions",
+            "safety_rating",
+            "restriction_description",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+    with transaction.atomic():
+        for chunk in _chunks(rows, chunk_size):
+            result.total += len(chunk)
+            results = classifier.classify_many((row[1], row[2]) for row in chunk)
+            pending = []
+
+            for row, (new_rating, new_description) in zip(chunk, results):
+                ref_no, _, _, old_rating, old_description = row
+                if old_rating == new_rating and old_description == new_description:
+                    continue
+
+                result.updated += 1
+                if old_rating != new_rating:
+                    rating_changed.append(ref_no)
+                if not dry_run:
+                    pending.append(
+                        IngredientINCI(
+                            cosing_ref_no=ref_no,
+                            safety_rating=new_rating,
+                            restriction_description=new_description,
+                        )
+                    )
+                elif len(result.changes) < DIFF_SAMPLE_LIMIT:
+                    result.changes.append(
+                        {
+                            "cosing_ref_no": ref_no,
+                            "safety_rating": [old_rating, new_rating],
+                            "restriction_description": [
+                                old_description,
+                                new_description,
+                            ],
+                        }
+                    )
+
+            if pending:
+                IngredientINCI.objects.bulk_update(pending, SAFETY_FIELDS)
+
+    if result.updated and not dry_run:
+        ingredients_changed.send(sender=IngredientINCI, cosing_ref_nos=rating_changed)
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,205 @@
+"""
+Compatibility of cosmetics with a user's skin profile (Person.skin_type and
+skin_problems, as stored by the skin survey).
+
+Every ingredient function (COSING wording) gets a weight from the rules of
+the user's skin types and problems; an ingredient scores the sum of its
+functions' weights plus a bonus or penalty for its safety rating, clamped to
++-INGREDIENT_LIMIT. The cosmetic's compatibility is the mean ingredient
+score mapped to 0-100, 50 being neutral.
+
+Parsed profiles are cached per process, and every profile memoizes the
+scores of the (function, safety rating) pairs it has seen.
+"""
+
+import functools
+from collections import defaultdict
+
+from .cosing import classifier
+from .models import CosmeticComposition
+
+INGREDIENT_LIMIT = 3
+PROFILE_CACHE_SIZE = 256
+INGREDIENT_CACHE_SIZE = 4096
+
+RATING_WEIGHTS = {"harmful": -3, "neutral": 0, "beneficial": 1}
+
+# skin type -> {function: weight}
+SKIN_TYPE_RULES = {
+    "Sucha": {
+        "NAWILŻAJĄCA": 2,
+        "HUMEKTANT": 2,
+        "EMOLIENT": 2,
+        "ZMIĘKCZAJĄCA": 1,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": 1,
+        "ŚCIĄGAJĄCA": -2,
+        "POWIERZCHNIOWO CZYNNA": -1,
+    },
+    "Tłusta": {
+        "REGULUJĄCA WYDZIELANIE SEBUM": 2,
+        "PRZECIWŁOJOTOKOWA": 2,
+        "ŚCIĄGAJĄCA": 1,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": -2,
+        "EMOLIENT": -1,
+    },
+    "Mieszana": {
+        "REGULUJĄCA WYDZIELANIE SEBUM": 1,
+        "NAWILŻAJĄCA": 1,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": -1,
+    },
+    "Normalna": {
+        "NAWILŻAJĄCA": 1,
+        "PRZECIWUTLENIAJĄCA": 1,
+    },
+    "Wrażliwa": {
+        "ŁAGODZĄCA": 2,
+        "CHRONIĄCA SKÓRĘ": 1,
+        "PERFUMUJĄCA": -2,
+        "ZŁUSZCZAJĄCA": -2,
+        "BARWIĄCA": -1,
+        "KONSERWUJĄCA": -1,
+    },
+}
+
+# skin problem (survey name) -> {function: weight}
+SKIN_PROBLEM_RULES = {
+    "Trądzik": {
+        "PRZECIWDROBNOUSTROJOWA": 2,
+        "KERATOLITYCZNA": 1,
+        "REGULUJĄCA WYDZIELANIE SEBUM": 1,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": -2,
+    },
+    "Zaskórniki": {
+        "ZŁUSZCZAJĄCA": 2,
+        "KERATOLITYCZNA": 2,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": -1,
+    },
+    "Rozszerzone pory": {
+        "ŚCIĄGAJĄCA": 2,
+        "ZŁUSZCZAJĄCA": 1,
+    },
+    "Przebarwienia": {
+        "WYBIELAJĄCA": 2,
+        "ROZJAŚNIAJĄCA": 2,
+        "FILTR UV": 1,
+        "ABSORBUJĄCA UV": 1,
+    },
+    "Utrata jędrności": {
+        "PRZECIWUTLENIAJĄCA": 1,
+        "ANTYOKSYDANT": 1,
+        "TONIZUJĄCA": 1,
+    },
+    "Zmarszczki": {
+        "PRZECIWUTLENIAJĄCA": 2,
+        "ANTYOKSYDANT": 2,
+        "WYGŁADZAJĄCA": 1,
+        "FILTR UV": 1,
+    },
+    "Podrażnienia/rumień": {
+        "ŁAGODZĄCA": 2,
+        "PERFUMUJĄCA": -2,
+        "ZŁUSZCZAJĄCA": -1,
+    },
+    "AZS/egzema/łuszczyca": {
+        "EMOLIENT": 2,
+        "ŁAGODZĄCA": 1,
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA": 1,
+        "PERFUMUJĄCA": -2,
+        "POWIERZCHNIOWO CZYNNA": -1,
+    },
+    "Cera naczynkowa": {
+        "ŁAGODZĄCA": 1,
+        "PRZECIWUTLENIAJĄCA": 1,
+        "ZŁUSZCZAJĄCA": -2,
+        "PERFUMUJĄCA": -1,
+    },
+    "Cienie/opuchnięcia pod oczami": {
+        "ODŚWIEŻAJĄCA": 1,
+        "TONIZUJĄCA": 1,
+    },
+}
+
+# values stored by registration instead of the survey's names
+SKIN_TYPE_ALIASES = {
+    "dry": "Sucha",
+    "oily": "Tłusta",
+    "combination": "Mieszana",
+    "normal": "Normalna",
+    "sensitive": "Wrażliwa",
+}
+NO_PROBLEMS = {"", "brak", "none"}
+
+
+class Profile:
+    def __init__(self, skin_types, skin_problems):
+        self.skin_types = skin_types
+        self.skin_problems = skin_problems
+        self.weights = defaultdict(int)
+        for rules in [SKIN_TYPE_RULES[name] for name in skin_types] + [
+            SKIN_PROBLEM_RULES[name] for name in skin_problems
+        ]:
+            for function, weight in rules.items():
+                self.weights[function] += weight
+        self.ingredient_score = functools.lru_cache(maxsize=INGREDIENT_CACHE_SIZE)(
+            self._ingredient_score
+        )
+
+    def _ingredient_score(self, function_text, safety_rating):
+        score = RATING_WEIGHTS.get(safety_rating, 0)
+        for function in classifier.split_functions(function_text):
+            score += self.weights.get(function, 0)
+        return max(-INGREDIENT_LIMIT, min(INGREDIENT_LIMIT, score))
+
+    def score(self, ingredients):
+        """0-100 for (function, safety_rating) pairs; None without ingredients."""
+        if not ingredients:
+            return None
+        total = sum(self.ingredient_score(*ingredient) for ingredient in ingredients)
+        mean = total / len(ingredients)
+        return round(50 + 50 * mean / INGREDIENT_LIMIT)
+
+
+@functools.lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def parse_profile(skin_type, skin_problems):
+    """
+    Profile for the stored strings, e.g. ("Tłusta - Wrażliwa",
+    "Trądzik, Zaskórniki"). Unknown names are ignored.
+    """
+    skin_types = []
+    for name in (skin_type or "").split(" - "):
+        name = name.strip()
+        name = SKIN_TYPE_ALIASES.get(name.lower(), name)
+        if name in SKIN_TYPE_RULES and name not in skin_types:
+            skin_types.append(name)
+
+    problems = []
+    for name in (skin_problems or "").split(","):
+        name = name.strip()
+        if name.lower() in NO_PROBLEMS:
+            continue
+        if name in SKIN_PROBLEM_RULES and name not in problems:
+            problems.append(name)
+    return Profile(tuple(skin_types), tuple(problems))
+
+
+def get_profile(user):
+    """The parsed profile of `user`, or None for anonymous users and users without one."""
+    if not user.is_authenticated:
+        return None
+    person = getattr(user, "person", None)
+    if person is None:
+        return None
+    return parse_profile(person.skin_type, person.skin_problems)
+
+
+def score_cosmetics(profile, barcodes):
+    """{barcode: compatibility} for a page of cosmetics, in one query."""
+    ingredients = defaultdict(list)
+    rows = (
+        CosmeticComposition.objects.filter(cosmetic_id__in=barcodes)
+        .order_by()
+        .values_list("cosmetic_id", "ingredient__function", "ingredient__safety_rating")
+    )
+    for barcode, function, safety_rating in rows:
+        ingredients[barcode].append((function, safety_rating))
+    return {barcode: profile.score(ingredients.get(barcode)) for barcode in barcodes}
@@ -0,0 +1,226 @@
+"""
+In-memory inverted index of compositions for "contains" / "free from"
+filtering of cosmetics.
+
+Cosmetics are numbered with dense row ids and every ingredient maps to the
+sorted array of row ids of the cosmetics containing it, so a filter is a few
+set intersections and differences instead of anti-joins over
+CosmeticComposition. Only a short list of matches is handed to the database
+as barcodes, larger ones are filtered there with EXISTS subqueries, which
+beat an IN list of thousands of barcodes.
+
+Every process keeps its own index and catches up before each lookup with the
+cosmetics whose safety summary was refreshed since its last check; summaries
+are refreshed whenever a composition changes (see safety_summary). Deleted
+cosmetics keep their row id, the database filters them out anyway.
+"""
+
+import threading
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Cosmetic, CosmeticComposition, CosmeticSafetySummary
+
+# how far back each catch-up looks, to also see changes committed by
+# transactions that started before the previous one
+SYNC_MARGIN = timedelta(minutes=1)
+# the most barcodes filter_queryset() puts in an IN list
+MAX_BARCODES = 500
+
+_EMPTY = array("I")
+
+
+class CompositionIndex:
+    def __init__(self, barcodes=(), rows=()):
+        """
+        `barcodes` are all cosmetics, `rows` are (barcode, cosing_ref_no)
+        composition rows.
+        """
+        self.barcodes = []  # row id -> barcode
+        self.rowids = {}
+        self.contents = {}  # row id -> ref nos of its ingredients
+        self.postings = {}  # ref no -> sorted row ids
+        # row ids update() changed since the last take_changes(), for the
+        # derived index (see similarity) to catch up from
+        self.changes = set()
+        for barcode in barcodes:
+            self._rowid(barcode)
+
+        contents = {}
+        for barcode, ref_no in rows:
+            contents.setdefault(self._rowid(barcode), []).append(ref_no)
+        postings = {}
+        for rowid in sorted(contents):
+            self.contents[rowid] = frozenset(contents[rowid])
+            for ref_no in self.contents[rowid]:
+                postings.setdefault(ref_no, array("I")).append(rowid)
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.barcodes)
+
+    def _rowid(self, barcode):
+        rowid = self.rowids.get(barcode)
+        if rowid is None:
+            rowid = self.rowids[barcode] = len(self.barcodes)
+            self.barcodes.append(barcode)
+        return rowid
+
+    def update(self, barcode, ref_nos):
+        """Replace the ingredients of a cosmetic."""
+        rowid = self._rowid(barcode)
+        old = self.contents.get(rowid, frozenset())
+        new = frozenset(ref_nos)
+        if old == new:
+            return
+        for ref_no in old - new:
+            posting = self.postings[ref_no]
+            del posting[bisect_left(posting, rowid)]
+        for ref_no in new - old:
+            insort(self.postings.setdefault(ref_no, array("I")), rowid)
+        self.contents[rowid] = new
+        self.changes.add(rowid)
+
+    def take_changes(self):
+        """The row ids changed since the last call, clearing them."""
+        changes, self.changes = self.changes, set()
+        return changes
+
+    def match(self, contains=(), excludes=()):
+        """
+        Row ids of the cosmetics containing every ingredient of `contains`
+        and none of `excludes`, as (rowids, negated): when `negated` the
+        matches are all cosmetics except `rowids`. Whichever of the two sets
+        is smaller is returned.
+        """
+        if contains:
+            postings = sorted(
+                (self.postings.get(ref_no, _EMPTY) for ref_no in set(contains)),
+                key=len,
+            )
+            rowids = set(postings[0])
+            for posting in postings[1:]:
+                rowids.intersection_update(posting)
+            for ref_no in set(excludes):
+                rowids.difference_update(self.postings.get(ref_no, _EMPTY))
+            negated = False
+        else:
+            rowids = set()
+            for ref_no in set(excludes):
+                rowids.update(self.postings.get(ref_no, _EMPTY))
+            negated = True
+
+        if len(rowids) > len(self) // 2:
+            rowids = set(range(len(self))) - rowids
+            negated = not negated
+        return rowids, negated
+
+    def filter_queryset(self, queryset, contains=(), excludes=()):
+        """
+        Narrow a Cosmetic queryset to the matches of match(), as a list of
+        barcodes when there are at most MAX_BARCODES of them and with EXISTS
+        subqueries otherwise.
+        """
+        rowids, negated = self.match(contains, excludes)
+        if len(rowids) > MAX_BARCODES:
+            return _filter_in_sql(queryset, contains, excludes)
+        barcodes = [self.barcodes[rowid] for rowid in rowids]
+        if negated:
+            return queryset.exclude(pk__in=barcodes) if barcodes else queryset
+        return queryset.filter(pk__in=barcodes)
+
+
+def _filter_in_sql(queryset, contains, excludes):
+    def has(ref_no):
+        return Exists(
+            CosmeticComposition.objects.filter(
+                cosmetic_id=OuterRef("pk"), ingredient_id=ref_no
+            )
+        )
+
+    for ref_no in set(contains):
+        queryset = queryset.filter(has(ref_no))
+    if excludes:
+        queryset = queryset.filter(
+            ~Exists(
+                CosmeticComposition.objects.filter(
+                    cosmetic_id=OuterRef("pk"), ingredient_id__in=set(excludes)
+                )
+            )
+        )
+    return queryset
+
+
+_lock = threading.Lock()
+_index = None
+_synced_at = None
+_seen = {}  # barcode -> summary updated_at applied within the sync margin
+
+
+def _build():
+    global _index, _synced_at, _seen
+
+    started = timezone.now()
+    barcodes = Cosmetic.objects.order_by("pk").values_list("pk", flat=True)
+    rows = (
+        CosmeticComposition.objects.order_by("cosmetic_id")
+        .values_list("cosmetic_id", "ingredient_id")
+        .iterator(chunk_size=5000)
+    )
+    _index = CompositionIndex(barcodes.iterator(chunk_size=5000), rows)
+    _synced_at = started
+    _seen = {}
+
+
+def _sync():
+    global _synced_at, _seen
+
+    started = timezone.now()
+    changed = dict(
+        CosmeticSafetySummary.objects.filter(
+            updated_at__gte=_synced_at - SYNC_MARGIN
+        ).values_list("cosmetic_id", "updated_at")
+    )
+    pending = [
+        barcode
+        for barcode, updated_at in changed.items()
+        if _seen.get(barcode) != updated_at
+    ]
+    if pending:
+        contents = {barcode: [] for barcode in pending}
+        for barcode, ref_no in CosmeticComposition.objects.filter(
+            cosmetic_id__in=pending
+        ).values_list("cosmetic_id", "ingredient_id"):
+            contents[barcode].append(ref_no)
+        for barcode, ref_nos in contents.items():
+            _index.update(barcode, ref_nos)
+
+    _synced_at = started
+    _seen = changed
+
+
+@contextmanager
+def locked_index():
+    """
+    The process's index, brought up to date with the database, with the
+    lock held so that no other thread updates it while it is read.
+    """
+    with _lock:
+        if _index is None:
+            _build()
+        else:
+            _sync()
+        yield _index
+
+
+def invalidate():
+    """Drop this process's index (e.g. in tests); it is rebuilt on next use."""
+    global _index
+
+    with _lock:
+        _index = None
@@ -0,0 +1,110 @@
+"""
+Replacing the composition (INCI list) of a cosmetic in one request.
+"""
+
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .models import CosmeticComposition, IngredientINCI
+from .signals import cosmetics_changed
+
+
+class InvalidComposition(ValueError):
+    """Raised when the submitted ingredient list cannot be saved."""
+
+    def __init__(self, message, cosing_ref_nos=()):
+        super().__init__(message)
+        self.cosing_ref_nos = sorted(cosing_ref_nos)
+
+
+@dataclass
+class CompositionChange:
+    added: int = 0
+    removed: int = 0
+    reordered: int = 0
+    unchanged: int = 0
+
+
+def parse_ref_nos(values):
+    """
+    Coerce the submitted list to ints, rejecting repeats and anything but
+    integers and strings of digits (booleans, floats, padded strings, ...).
+    """
+    if not isinstance(values, list):
+        raise InvalidComposition("Expected a list of COSING Ref Nos.")
+
+    ref_nos = []
+    invalid = []
+    for value in values:
+        if isinstance(value, int) and not isinstance(value, bool):
+            ref_nos.append(value)
+        elif isinstance(value, str) and value.isascii() and value.isdigit():
+            ref_nos.append(int(value))
+        else:
+            invalid.append(str(value))
+    if invalid:
+        raise InvalidComposition("Invalid COSING Ref Nos.", invalid)
+
+    seen = set()
+    duplicates = {ref_no for ref_no in ref_nos if ref_no in seen or seen.add(ref_no)}
+    if duplicates:
+        raise InvalidComposition("Duplicate ingredients in composition.", duplicates)
+    return ref_nos
+
+
+def replace_composition(cosmetic, ref_nos):
+    """
+    Make `ref_nos` (in INCI order) the composition of `cosmetic`. All ingredients
+    are checked in one query, then only the difference to the stored list is
+    written: one delete, one bulk update of moved rows and one bulk insert.
+    """
+    known = set(
+        IngredientINCI.objects.filter(pk__in=ref_nos).values_list("pk", flat=True)
+    )
+    missing = set(ref_nos) - known
+    if missing:
+        raise InvalidComposition("Unknown ingredients.", missing)
+
+    wanted = {ref_no: order for order, ref_no in enumerate(ref_nos, start=1)}
+    change = CompositionChange()
+
+    with transaction.atomic():
+        stored = CosmeticComposition.objects.select_for_update().filter(
+            cosmetic=cosmetic
+        )
+        removed = []
+        moved = []
+        for row_id, ref_no, stored_order in stored.values_list(
+            "id", "ingredient_id", "order_in_composition"
+        ):
+            # whatever is left in `wanted` afterwards has to be inserted
+            order = wanted.pop(ref_no, None)
+            if order is None:
+                removed.append(row_id)
+            elif order != stored_order:
+                moved.append(CosmeticComposition(id=row_id, order_in_composition=order))
+            else:
+                change.unchanged += 1
+
+        if removed:
+            CosmeticComposition.objects.filter(id__in=removed).delete()
+        if moved:
+            CosmeticComposition.objects.bulk_update(moved, ["order_in_composition"])
+        # orders are explicit, so save() and its Max() lookup are not needed
+        if wanted:
+            CosmeticComposition.objects.bulk_create(
+                CosmeticComposition(
+                    cosmetic=cosmetic, ingredient_id=ref_no, order_in_composition=order
+                )
+                for ref_no, order in wanted.items()
+            )
+        if removed or moved or wanted:
+            cosmetics_changed.send(
+                sender=CosmeticComposition, barcodes=[cosmetic.barcode]
+            )
+
+    change.added = len(wanted)
+    change.removed = len(removed)
+    change.reordered = len(moved)
+    return change
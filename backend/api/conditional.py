@@ -0,0 +1,104 @@
+"""
+Conditional GET for viewsets, driven by the catalog version counters.
+
+The ETag is derived from the versions of the catalog parts a response
+depends on, the request URL and the negotiated media type, so it is checked
+right after authentication, before any queryset is built. A matching
+If-None-Match (or a fresh If-Modified-Since) answers 304 straight away.
+"""
+
+import datetime
+import hashlib
+
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from . import versions
+
+
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # a weak validator matches a strong one for GET (RFC 9110 8.8.3.2)
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def _http_timestamp(modified_at):
+    """
+    `modified_at` truncated to whole seconds, the precision of HTTP dates, as
+    django.views.decorators.http.condition does; otherwise a change within
+    the second of an If-Modified-Since would never be fresh.
+    """
+    if timezone.is_naive(modified_at):
+        modified_at = timezone.make_aware(modified_at, datetime.timezone.utc)
+    return int(modified_at.timestamp())
+
+
+class ConditionalGetMixin:
+    """
+    Viewsets implement `get_version_keys()`, returning the CatalogVersion keys
+    the current action's response depends on, or None to skip validation.
+    """
+
+    def get_version_keys(self):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        keys = self.get_version_keys()
+        if not keys:
+            return
+
+        current = versions.get(*keys)
+        seed = "|".join(
+            [
+                *(f"{key}={current.get(key, (0, None))[0]}" for key in keys),
+                request.get_full_path(),
+                request.accepted_media_type or "",
+            ]
+        )
+        etag = '"%s"' % hashlib.sha1(seed.encode()).hexdigest()
+        modified = [modified_at for _, modified_at in current.values()]
+        last_modified = _http_timestamp(max(modified)) if modified else None
+        self._validators = (etag, last_modified)
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            if _etag_matches(if_none_match, etag):
+                raise NotModified()
+        elif last_modified is not None:
+            since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+            if since is not None and last_modified <= since:
+                raise NotModified()
+
+    def _set_validators(self, response):
+        etag, last_modified = self._validators
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # cached copies must be revalidated, they are cheap to check
+        response["Cache-Control"] = "no-cache"
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            self._set_validators(response)
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_validators", None) and response.status_code == 200:
+            self._set_validators(response)
+        return response
@@ -0,0 +1,278 @@
+"""
+Parsing and safety classification of rows from the COSING CSV export.
+
+Nothing in this module touches the database, so it can be used from
+management commands and worker processes without a configured Django app.
+"""
+
+import csv
+import functools
+import hashlib
+import io
+import re
+
+# columns taken from the file; safety_rating and restriction_description
+# are derived from them
+SOURCE_FIELDS = [
+    "inci_name",
+    "common_name",
+    "action_description",
+    "function",
+    "restrictions",
+    "update_date",
+]
+
+# max_length of the CharField source fields of IngredientINCI; longer values
+# would fail the whole batch they are written in
+MAX_LENGTHS = {
+    "inci_name": 200,
+    "common_name": 200,
+    "function": 200,
+    "update_date": 20,
+}
+
+
+BENEFICIAL_FUNCTIONS = frozenset(
+    {
+        "ŚCIERAJĄCA",
+        "ZŁUSZCZAJĄCA",
+        "ANTI-DANDRUFF",
+        "PRZECIWŁOJOTOKOWA",
+        "REGULUJĄCA WYDZIELANIE SEBUM",
+        "PRZECIWDROBNOUSTROJOWA",
+        "PRZECIWUTLENIAJĄCA",
+        "ANTYOKSYDANT",
+        "ŚCIĄGAJĄCA",
+        "WYBIELAJĄCA",
+        "ROZJAŚNIAJĄCA",
+        "ZMIĘKCZAJĄCA",
+        "WYGŁADZAJĄCA",
+        "EMOLIENT",
+        "KONDYCJONUJĄCA WŁOSY",
+        "DO SKRĘCANIA LUB PROSTOWANIA WŁOSÓW",
+        "NAWILŻAJĄCA",
+        "HUMEKTANT",
+        "KERATOLITYCZNA",
+        "ODŻYWIAJĄCA PAZNOKCIE",
+        "DO PIELĘGNACJI JAMY USTNEJ",
+        "UTLENIAJĄCA",
+        "REDUKUJĄCA",
+        "ODŚWIEŻAJĄCA",
+        "KONDYCJONUJĄCA SKÓRĘ",
+        "KONDYCJONUJĄCA SKÓRĘ - ZMIĘKCZAJĄCA",
+        "KONDYCJONUJĄCA SKÓRĘ - NAWILŻAJĄCA",
+        "KONDYCJONUJĄCA SKÓRĘ - HUMEKTANT",
+        "KONDYCJONUJĄCA SKÓRĘ - OGÓLNE",
+        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA",
+        "CHRONIĄCA SKÓRĘ",
+        "ŁAGODZĄCA",
+        "OPALAJĄCA",
+        "TONIZUJĄCA",
+        "ABSORBUJĄCA UV",
+        "FILTR UV",
+    }
+)
+
+# annex of the EU cosmetics regulation -> description, in annex order
+ANNEX_DESCRIPTIONS = {
+    "II": "Substancja zakazana w kosmetykach UE",
+    "III": "Dozwolona warunkowo z ograniczeniami stężenia",
+    "IV": "Dozwolony barwnik z określonymi warunkami użycia",
+    "V": "Dozwolony konserwant z limitami stężeń",
+    "VI": "Dozwolony filtr UV z ograniczeniami użycia",
+}
+
+FUNCTION_SEPARATORS = re.compile(r"[,;/\|]")
+ANNEX_NUMERALS = re.compile(r"\b(I{1,3}|IV|V|VI)\b")
+
+
+class SafetyClassifier:
+    """
+    Derives safety_rating and restriction_description for an ingredient.
+
+    Built once per process: the function vocabulary is frozen, the patterns
+    are precompiled and results are memoized on (function, restrictions),
+    since COSING repeats a few thousand distinct function strings.
+    """
+
+    def __init__(self, beneficial_functions=BENEFICIAL_FUNCTIONS, cache_size=16384):
+        self.beneficial_functions = frozenset(beneficial_functions)
+        self.classify = functools.lru_cache(maxsize=cache_size)(self._classify)
+
+    def split_functions(self, function_text):
+        if not function_text:
+            return []
+        functions = FUNCTION_SEPARATORS.split(function_text.upper())
+        return [f.strip() for f in functions if f.strip()]
+
+    def rating(self, function_text, restrictions):
+        if restrictions and restrictions.strip():
+            return "harmful"
+
+        functions = self.split_functions(function_text)
+        if not functions:
+            return "neutral"
+
+        beneficial_count = sum(1 for f in functions if f in self.beneficial_functions)
+
+        # if >= 50% of functions are beneficial, mark as beneficial
+        if beneficial_count / len(functions) >= 0.5:
+            return "beneficial"
+
+        return "neutral"
+
+    def restriction_description(self, restriction_text):
+        if not restriction_text or restriction_text.strip() == "":
+            return ""
+
+        numerals = set(ANNEX_NUMERALS.findall(restriction_text))
+        return "; ".join(
+            description
+            for numeral, description in ANNEX_DESCRIPTIONS.items()
+            if numeral in numerals
+        )
+
+    def _classify(self, function_text, restrictions):
+        return (
+            self.rating(function_text, restrictions),
+            self.restriction_description(restrictions),
+        )
+
+    def classify_many(self, rows):
+        """(function, restrictions) pairs -> list of (rating, description)."""
+        classify = self.classify
+        return [classify(function, restrictions) for function, restrictions in rows]
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+
+classifier = SafetyClassifier()
+
+
+def parse_restriction_description(restriction_text):
+    return classifier.restriction_description(restriction_text)
+
+
+def evaluate_ingredient_safety(function_text, restrictions):
+    return classifier.rating(function_text, restrictions)
+
+
+class SkippedRow(Exception):
+    """Raised for rows that carry no ingredient (e.g. an empty COSING Ref No)."""
+
+
+def _column(row, name):
+    # DictReader fills missing trailing columns with None
+    return (row.get(name) or "").strip()
+
+
+def parse_cosing_row(row):
+    """
+    Map one csv.DictReader row of the COSING export onto the source fields of
+    IngredientINCI (without the derived safety fields). Raises SkippedRow
+    for blank rows and ValueError/KeyError for malformed ones, including
+    values longer than their column (see MAX_LENGTHS).
+    """
+    ref_no = _column(row, "COSING Ref No")
+    if not ref_no:
+        raise SkippedRow()
+    if row.get("INCI name") is None:
+        raise KeyError("INCI name")
+
+    fields = {
+        "cosing_ref_no": int(ref_no),
+        "inci_name": _column(row, "INCI name"),
+        "common_name": _column(row, "INN name") or _column(row, "Ph. Eur. Name"),
+        "action_description": _column(row, "Chem/IUPAC Name / Description"),
+        "function": _column(row, "Function"),
+        "restrictions": _column(row, "Restriction"),
+        "update_date": _column(row, "Update Date"),
+    }
+    for name, max_length in MAX_LENGTHS.items():
+        if len(fields[name]) > max_length:
+            raise ValueError(f"{name} longer than {max_length} characters")
+    return fields
+
+
+def content_hash(fields):
+    """Fingerprint of the source fields, used to skip unchanged rows on re-import."""
+    payload = "\x1f".join(fields[name] or "" for name in SOURCE_FIELDS)
+    return hashlib.md5(payload.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+def parse_rows(reader, line_offset=0):
+    """
+    Parse the rows of a csv.DictReader over the COSING export, yielding
+    (line, fields, error) per row: the fields with their content hash for
+    good rows, None and the error message for malformed ones, None and None
+    for skipped ones. `line_offset` is added to the reader's line numbers.
+    """
+    for row in reader:
+        line = reader.line_num + line_offset
+        try:
+            fields = parse_cosing_row(row)
+        except SkippedRow:
+            yield line, None, None
+            continue
+        except KeyError as e:
+            yield line, None, f"Missing column {e}"
+            continue
+        except ValueError as e:
+            yield line, None, str(e)
+            continue
+        fields["content_hash"] = content_hash(fields)
+        yield line, fields, None
+
+
+def split_ranges(file, start, chunk_bytes, first_line):
+    """
+    Cut a binary file from offset `start` to its end into (start, end,
+    first_line) byte ranges of about `chunk_bytes`, each ending at a record
+    boundary: a newline outside of quoted fields, i.e. one preceded by an
+    even number of quote characters (quotes in fields are doubled).
+    `first_line` is the line number the first range starts at.
+    """
+    file.seek(start)
+    offset = range_start = start
+    line = first_line
+    quotes = newlines = 0  # since range_start, up to offset
+    while block := file.read(chunk_bytes):
+        end = len(block)
+        while (end := block.rfind(b"\n", 0, end)) >= 0:
+            if (quotes + block.count(b'"', 0, end)) % 2 == 0:
+                break
+        if end < 0:
+            # a quoted field longer than the block, the range grows
+            quotes += block.count(b'"')
+            newlines += block.count(b"\n")
+        else:
+            yield range_start, offset + end + 1, line
+            line += newlines + block.count(b"\n", 0, end + 1)
+            range_start = offset + end + 1
+            quotes = block.count(b'"', end + 1)
+            newlines = block.count(b"\n", end + 1)
+        offset += len(block)
+    if range_start < offset:
+        yield range_start, offset, line
+
+
+def parse_range(path, start, end, first_line, fieldnames):
+    """
+    parse_rows() over bytes [start, end) of the file at `path`, with the
+    safety fields of the good rows classified as well. Run by the worker
+    processes of catalog.import_cosing_file, so returns a list.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames)
+    parsed = list(parse_rows(reader, line_offset=first_line - 1))
+    rows = [fields for _, fields, _ in parsed if fields is not None]
+    results = classifier.classify_many(
+        (fields["function"], fields["restrictions"]) for fields in rows
+    )
+    for fields, (rating, description) in zip(rows, results):
+        fields["safety_rating"] = rating
+        fields["restriction_description"] = description
+    return parsed
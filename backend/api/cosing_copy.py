@@ -0,0 +1,225 @@
+"""
+COSING import through PostgreSQL COPY, used by `manage.py load_cosing`.
+
+The file is parsed by the same code as catalog.import_cosing (parse_rows),
+so blank, ragged and malformed rows are skipped or rejected the same way,
+with the same line numbers, and values are trimmed and hashed the same way.
+The good rows are streamed with COPY into a staging table. It is a
+temporary table: those are not WAL-logged, like unlogged ones, and are
+dropped with the transaction. Everything after that is set-based:
+
+- rows are deduplicated (the last occurrence of a ref no wins, as in
+  catalog.import_cosing) into a second temporary table;
+- safety ratings are computed once per distinct (function, restrictions)
+  pair by the SafetyClassifier used everywhere else, COPYed back and joined
+  in, so the rules live in one place;
+- a single INSERT ... ON CONFLICT merges the rows into IngredientINCI,
+  writing only those whose content hash differs.
+
+Returns the same ImportStats as catalog.import_cosing.
+"""
+
+import codecs
+import csv
+import io
+import time
+
+from django.db import connection, transaction
+
+from .catalog import ImportStats
+from .cosing import SOURCE_FIELDS, classifier, parse_rows
+from .models import IngredientINCI
+from .signals import ingredients_changed
+
+REQUIRED_COLUMNS = ["COSING Ref No", "INCI name"]
+STAGED_COLUMNS = ["line", "ref_no", *SOURCE_FIELDS, "content_hash"]
+TEMPORARY_TABLES = ["cosing_staging", "cosing_rows", "cosing_ratings"]
+# rows written to the COPY stream at a time
+COPY_CHUNK_ROWS = 1000
+
+
+class InvalidCosingFile(ValueError):
+    pass
+
+
+class _ChunkReader:
+    """Read-only file object over an iterable of strings, for copy_expert."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = io.StringIO()
+
+    def read(self, size=-1):
+        # copy_expert reads until it gets an empty string
+        while not (data := self._current.read(size)):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return ""
+            self._current = io.StringIO(chunk)
+        return data
+
+
+def _staged_rows(parsed, stats):
+    """
+    The good rows of parse_rows() results as CSV for COPY, COPY_CHUNK_ROWS
+    at a time, counting the others into `stats` like catalog._import_parsed.
+    """
+    buffer = io.StringIO()
+    # quoted, so that empty strings are not read back as NULLs
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    rows = 0
+    for line, fields, error in parsed:
+        stats.rows_read += 1
+        if fields is None:
+            if error is None:
+                stats.skipped += 1
+            else:
+                stats.reject(line, error)
+            continue
+
+        writer.writerow(
+            [line, fields["cosing_ref_no"]]
+            + [fields[name] for name in SOURCE_FIELDS]
+            + [fields["content_hash"]]
+        )
+        rows += 1
+        if rows % COPY_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _stage(cursor, reader, stats):
+    """COPY the good rows of `reader` into cosing_staging; returns how many."""
+    header = reader.fieldnames or []
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise InvalidCosingFile(f"Missing columns: {', '.join(missing)}")
+    cursor.execute(
+        "CREATE TEMPORARY TABLE cosing_staging (line bigint, ref_no bigint, "
+        f"{', '.join(f'{name} text' for name in SOURCE_FIELDS)}, content_hash text) "
+        "ON COMMIT DROP"
+    )
+    cursor.copy_expert(
+        f"COPY cosing_staging ({', '.join(STAGED_COLUMNS)}) FROM STDIN "
+        "WITH (FORMAT csv)",
+        _ChunkReader(_staged_rows(parse_rows(reader), stats)),
+    )
+    cursor.execute("SELECT count(*) FROM cosing_staging")
+    return cursor.fetchone()[0]
+
+
+def _deduplicate(cursor, staged, stats):
+    """Fill cosing_rows with the last occurrence of every ref no."""
+    columns = ["ref_no", *SOURCE_FIELDS, "content_hash"]
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE cosing_rows ON COMMIT DROP AS
+        SELECT DISTINCT ON (ref_no) {', '.join(columns)}
+        FROM cosing_staging
+        ORDER BY ref_no, line DESC
+        """)
+    cursor.execute("ANALYZE cosing_rows")
+    cursor.execute("SELECT count(*) FROM cosing_rows")
+    distinct = cursor.fetchone()[0]
+    stats.duplicates = staged - distinct
+    return distinct
+
+
+def _classify(cursor):
+    """cosing_ratings: the safety fields of every distinct (function, restrictions)."""
+    cursor.execute("SELECT DISTINCT function, restrictions FROM cosing_rows")
+    pairs = cursor.fetchall()
+    results = classifier.classify_many(pairs)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    for (function, restrictions), (rating, description) in zip(pairs, results):
+        writer.writerow([function, restrictions, rating, description])
+    buffer.seek(0)
+    cursor.execute(
+        "CREATE TEMPORARY TABLE cosing_ratings (function text, restrictions text, "
+        "safety_rating text, restriction_description text) ON COMMIT DROP"
+    )
+    cursor.copy_expert("COPY cosing_ratings FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _merge(cursor, stats):
+    table = connection.ops.quote_name(IngredientINCI._meta.db_table)
+
+    # which source fields change, for the diff, before they are overwritten
+    differs = ", ".join(f"coalesce(t.{name}, '') <> r.{name}" for name in SOURCE_FIELDS)
+    cursor.execute(f"""
+        SELECT r.ref_no, {differs}
+        FROM cosing_rows r JOIN {table} t ON t.cosing_ref_no = r.ref_no
+        WHERE t.content_hash IS DISTINCT FROM r.content_hash
+        """)
+    for ref_no, *flags in cursor.fetchall():
+        changed_fields = [name for name, flag in zip(SOURCE_FIELDS, flags) if flag]
+        # rows imported with another hash only get the new one stored
+        if changed_fields:
+            stats.diff.changed.append(ref_no)
+            stats.diff.field_changes.update(changed_fields)
+
+    columns = ["cosing_ref_no", *SOURCE_FIELDS, "safety_rating"]
+    columns += ["restriction_description", "content_hash"]
+    values = ", ".join(f"r.{name}" for name in SOURCE_FIELDS)
+    updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in columns[1:])
+    cursor.execute(f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        SELECT r.ref_no, {values}, c.safety_rating, c.restriction_description,
+               r.content_hash
+        FROM cosing_rows r
+        JOIN cosing_ratings c
+          ON c.function = r.function AND c.restrictions = r.restrictions
+        ON CONFLICT (cosing_ref_no) DO UPDATE SET {updates}
+        WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING cosing_ref_no, xmax = 0
+        """)
+    # xmax is 0 for freshly inserted row versions
+    stats.diff.new = [ref_no for ref_no, inserted in cursor.fetchall() if inserted]
+
+
+def _removed(cursor):
+    """Ref nos of the stored ingredients missing from the file."""
+    table = connection.ops.quote_name(IngredientINCI._meta.db_table)
+    cursor.execute(f"""
+        SELECT t.cosing_ref_no FROM {table} t
+        WHERE NOT EXISTS (SELECT 1 FROM cosing_rows r WHERE r.ref_no = t.cosing_ref_no)
+        """)
+    return [ref_no for ref_no, in cursor.fetchall()]
+
+
+def load(file):
+    """Import the COSING export in `file`, a binary file object, with COPY."""
+    stats = ImportStats()
+    started = time.perf_counter()
+    # decoded line by line as in catalog.import_cosing
+    reader = csv.DictReader(codecs.iterdecode(file, "utf-8"))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        staged = _stage(cursor, reader, stats)
+        stats.bytes_read = file.tell()
+        distinct = _deduplicate(cursor, staged, stats)
+        stats.parse_seconds = time.perf_counter() - started
+
+        classify_started = time.perf_counter()
+        _classify(cursor)
+        stats.classify_seconds = time.perf_counter() - classify_started
+
+        write_started = time.perf_counter()
+        _merge(cursor, stats)
+        stats.inserted = len(stats.diff.new)
+        stats.updated = len(stats.diff.changed)
+        stats.unchanged = distinct - stats.inserted - stats.updated
+        stats.diff.removed = _removed(cursor)
+        if stats.inserted or stats.updated:
+            ingredients_changed.send(
+                sender=IngredientINCI, cosing_ref_nos=stats.diff.changed
+            )
+        # ON COMMIT DROP only runs at the end of the outermost transaction
+        cursor.execute(f"DROP TABLE {', '.join(TEMPORARY_TABLES)}")
+        stats.write_seconds = time.perf_counter() - write_started
+
+    stats.total_seconds = time.perf_counter() - started
+    return stats
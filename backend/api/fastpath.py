@@ -0,0 +1,141 @@
+"""
+Read-only serialization straight from `.values()` rows.
+
+For serializers whose readable fields are all plain model columns, building
+model instances and running every field's to_representation is pure overhead:
+the database already returns the values in their JSON types. The helpers here
+produce the same output as the serializer from value dicts; anything with
+computed or nested fields keeps using the serializer.
+"""
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import INCI_ORDER, CosmeticComposition
+from .serializers import composition_serializers
+
+# serializer fields whose representation is the column value itself
+PLAIN_FIELD_TYPES = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.JSONField,
+)
+
+
+def plain_fields(serializer, model, annotations=()):
+    """
+    Names of the readable fields of `serializer` if each one is a plain
+    column of `model` or one of the queryset `annotations`, in output order;
+    None otherwise.
+    """
+    columns = {f.name for f in model._meta.concrete_fields if not f.is_relation}
+    columns.update(annotations)
+    names = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if (
+            not isinstance(field, PLAIN_FIELD_TYPES)
+            or field.source != name
+            or name not in columns
+        ):
+            return None
+        names.append(name)
+    return names
+
+
+class ValuesSerializationMixin:
+    """
+    Viewset mixin serving list and retrieve from `.values()` when the
+    serializer allows it (see plain_fields). Set `fast_serialization = False`
+    on a view, or API_FAST_SERIALIZATION = False in settings, to opt out.
+    Fields read from annotations of the view's queryset are listed in
+    `values_annotations`.
+    """
+
+    fast_serialization = True
+    values_annotations = ()
+
+    def fast_serialization_enabled(self):
+        return self.fast_serialization and getattr(
+            settings, "API_FAST_SERIALIZATION", True
+        )
+
+    def get_plain_fields(self):
+        if not self.fast_serialization_enabled():
+            return None
+        fields = plain_fields(
+            self.get_serializer(), self.queryset.model, self.values_annotations
+        )
+        # e.g. ?fields= with only unknown names: .values() without names
+        # would select every column, the serializer returns empty objects
+        return fields or None
+
+    def list(self, request, *args, **kwargs):
+        fields = self.get_plain_fields()
+        if fields is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # the paginator reads its position from the ordering columns
+        extra = []
+        if self.paginator is not None:
+            ordering = self.paginator.get_ordering(request, queryset, self)
+            extra = [name.lstrip("-") for name in ordering]
+            extra = [name for name in extra if name not in fields]
+
+        rows = queryset.values(*fields, *extra)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(list(rows))
+
+        # the cursor links are built from the full rows
+        response = self.get_paginated_response(page)
+        for row in page:
+            for name in extra:
+                del row[name]
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        fields = self.get_plain_fields()
+        if fields is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.filter_queryset(self.get_queryset()).values(*fields),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, row)
+        return Response(row)
+
+
+def serialize_composition(cosmetic, expand=()):
+    """serializers.serialize_composition, with the ingredients read as values."""
+    cosmetic_serializer, ingredient_serializer = composition_serializers(expand)
+    return {
+        "cosmetic": cosmetic_serializer(cosmetic).data,
+        "ingredients": composition_rows(cosmetic, ingredient_serializer.Meta.fields),
+    }
+
+
+def composition_rows(cosmetic, ingredient_fields):
+    """
+    Ingredients of `cosmetic` in INCI order as dicts of `ingredient_fields`
+    followed by their `order`, read in one query without model instances.
+    """
+    rows = (
+        CosmeticComposition.objects.filter(cosmetic=cosmetic)
+        .order_by(INCI_ORDER)
+        .values_list(
+            *(f"ingredient__{name}" for name in ingredient_fields),
+            "order_in_composition",
+        )
+    )
+    keys = [*ingredient_fields, "order"]
+    return [dict(zip(keys, row)) for row in rows]
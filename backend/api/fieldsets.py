@@ -0,0 +1,234 @@
+"""
+Sparse fieldsets: `?fields=` and `?omit=` on GET requests.
+
+Both take comma separated field names, with dotted paths reaching into nested
+serializers, e.g. `?fields=id,ingredient.inci_name` or
+`?omit=cosmetic.description`. Serializers using DynamicFieldsMixin drop the
+fields that were not asked for, and viewsets using FieldsetQuerysetMixin load
+only the columns those fields read.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def parse_fieldset(value):
+    """
+    "a,b.c,b.d" -> {"a": None, "b": {"c": None, "d": None}}. None marks a
+    field that is taken (or omitted) as a whole.
+    """
+    tree = {}
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".") if name.strip()]
+        node = tree
+        for i, name in enumerate(names):
+            if i == len(names) - 1:
+                node[name] = None
+            elif node.get(name, {}) is None:
+                # the whole field was already requested
+                break
+            else:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def get_fieldsets(request):
+    """The parsed (fields, omit) trees of a request, None where not given."""
+    if request is None or request.method != "GET":
+        return None, None
+    cached = getattr(request, "_fieldsets", None)
+    if cached is None:
+        params = request.query_params
+        cached = tuple(
+            parse_fieldset(params[name]) if params.get(name) else None
+            for name in (FIELDS_PARAM, OMIT_PARAM)
+        )
+        request._fieldsets = cached
+    return cached
+
+
+def require_field(request, name):
+    """
+    Make the request's fieldsets keep the top-level field `name`, e.g. one a
+    view needs to post-process the rows. Returns whether the client left it
+    out, i.e. whether it has to be dropped from the output again.
+    """
+    only, omit = get_fieldsets(request)
+    left_out = False
+    if only is not None and name not in only:
+        only = {**only, name: None}
+        left_out = True
+    if omit is not None and name in omit and omit[name] is None:
+        omit = {key: value for key, value in omit.items() if key != name}
+        left_out = True
+    if left_out:
+        request._fieldsets = (only, omit)
+    return left_out
+
+
+def _subtree(tree, path):
+    for name in path:
+        if tree is None:
+            return None
+        tree = tree.get(name)
+    return tree
+
+
+def _path(serializer):
+    """Field names leading from the root serializer to `serializer`."""
+    names = []
+    node = serializer
+    while node.parent is not None:
+        # children of a ListSerializer are bound with an empty name
+        if node.field_name:
+            names.append(node.field_name)
+        node = node.parent
+    return names[::-1]
+
+
+def prune_fields(fields, only, omit):
+    """Drop from `fields` whatever the `only`/`omit` trees exclude."""
+    if only is not None:
+        for name in list(fields):
+            if name not in only:
+                fields.pop(name)
+    if omit is not None:
+        for name, subtree in omit.items():
+            # a dotted path only omits inside the nested serializer
+            if subtree is None:
+                fields.pop(name, None)
+    return fields
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin applying the request's sparse fieldsets. Nested
+    serializers using the mixin pick their part of the dotted paths.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, omit = get_fieldsets(self.context.get("request"))
+        if only is None and omit is None:
+            return fields
+
+        path = _path(self)
+        return prune_fields(fields, _subtree(only, path), _subtree(omit, path))
+
+
+def _nested(field):
+    if isinstance(field, serializers.ListSerializer):
+        return None
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def _columns(serializer, model, prefix=""):
+    """
+    Paths to pass to QuerySet.only() for what `serializer` renders from
+    `model`, or None if a field is not a plain model field (a method or a
+    property may read any column) and the model has to be loaded whole.
+    """
+    concrete = {}
+    for f in model._meta.concrete_fields:
+        concrete[f.name] = f
+        concrete[f.attname] = f
+
+    columns = [prefix + model._meta.pk.name]
+    for field in serializer.fields.values():
+        # computed values may read any column
+        if field.source == "*" or "." in field.source:
+            return None
+        source = field.source
+
+        nested = _nested(field)
+        if nested is not None:
+            try:
+                relation = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                return None
+            if relation.many_to_many or relation.one_to_many:
+                continue
+            related = _columns(nested, relation.related_model, f"{prefix}{source}__")
+            if related is None:
+                related = [
+                    f"{prefix}{source}__{f.name}"
+                    for f in relation.related_model._meta.concrete_fields
+                ]
+            columns += related
+            if relation.concrete:
+                columns.append(prefix + relation.name)
+        elif source in concrete:
+            columns.append(prefix + concrete[source].name)
+        elif isinstance(field, serializers.ManyRelatedField):
+            continue
+        else:
+            return None
+    return columns
+
+
+class FieldsetQuerysetMixin:
+    """
+    Viewset mixin narrowing list and retrieve querysets with `.only()` to the
+    columns the requested fields need.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+
+        only, omit = get_fieldsets(self.request)
+        if only is None and omit is None:
+            return queryset
+
+        columns = _columns(self.get_serializer(), queryset.model)
+        if columns is None:
+            return queryset
+
+        # the paginator reads the ordering fields of every row
+        ordering = getattr(self, "ordering", None) or ()
+        if hasattr(self, "get_ordering"):
+            ordering = self.get_ordering()
+        # orderings may name a foreign key by its attname (e.g. "cosmetic_id")
+        model_fields = {}
+        for f in queryset.model._meta.concrete_fields:
+            model_fields[f.name] = model_fields[f.attname] = f.name
+        columns += [
+            model_fields[name.lstrip("-")]
+            for name in ordering
+            if name.lstrip("-") in model_fields
+        ]
+        return _only(queryset, columns)
+
+
+def _only(queryset, columns):
+    """
+    Apply .only(); select_related joins whose fields were all dropped are
+    removed too, since Django refuses to defer a relation it follows.
+    """
+    selected = queryset.query.select_related
+    if isinstance(selected, dict):
+        wanted = _related_paths(selected)
+        kept = [
+            path
+            for path in wanted
+            if any(column.startswith(path + "__") for column in columns)
+        ]
+        queryset = queryset.select_related(None)
+        if kept:
+            queryset = queryset.select_related(*kept)
+    return queryset.only(*dict.fromkeys(columns))
+
+
+def _related_paths(tree, prefix=""):
+    paths = []
+    for name, children in tree.items():
+        path = prefix + name
+        paths.append(path)
+        paths += _related_paths(children, path + "__")
+    return paths
@@ -0,0 +1,128 @@
+"""
+Background execution of COSING imports.
+
+Uploads are stored on disk and processed by a single in-process worker
+thread, so the HTTP request returns as soon as the file is saved. Jobs left
+queued by a restart can be picked up with `manage.py run_import_jobs`.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .catalog import import_cosing_file
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cosing-import")
+
+
+def _store_upload(upload):
+    """
+    Write the upload to a new file in COSING_IMPORT_DIR, returning its path
+    and SHA-256. Every job has its own copy, which it removes once it has run.
+    """
+    os.makedirs(settings.COSING_IMPORT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=settings.COSING_IMPORT_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as out:
+        for chunk in upload.chunks():
+            digest.update(chunk)
+            out.write(chunk)
+    path = tmp_path.removesuffix(".part") + ".csv"
+    os.replace(tmp_path, path)
+    return path, digest.hexdigest()
+
+
+def _active_job(file_hash):
+    return ImportJob.objects.filter(
+        file_hash=file_hash, status__in=[ImportJob.QUEUED, ImportJob.RUNNING]
+    ).first()
+
+
+def submit_cosing_import(upload, user=None):
+    """
+    Queue an import of the uploaded COSING file. Returns (job, created); a file
+    whose hash matches a queued or running job is not imported twice. Once
+    that job has finished the same file can be imported again, e.g. to restore
+    the official data after ingredients were edited.
+    """
+    path, file_hash = _store_upload(upload)
+
+    while True:
+        job = _active_job(file_hash)
+        if job is not None:
+            os.remove(path)
+            return job, False
+        try:
+            with transaction.atomic():
+                job = ImportJob.objects.create(
+                    created_by=user,
+                    file_name=upload.name,
+                    file_path=path,
+                    file_hash=file_hash,
+                    file_size=upload.size,
+                )
+        except IntegrityError:
+            # an upload of the same file created its job in between
+            continue
+        transaction.on_commit(lambda: _executor.submit(run_import_job, job.pk))
+        return job, True
+
+
+def run_import_job(job_id):
+    """Run a queued job to completion, recording progress after every batch."""
+    try:
+        claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.QUEUED).update(
+            status=ImportJob.RUNNING, started_at=timezone.now()
+        )
+        if not claimed:
+            return
+
+        job = ImportJob.objects.get(pk=job_id)
+
+        def report(stats):
+            ImportJob.objects.filter(pk=job_id).update(
+                bytes_read=stats.bytes_read,
+                rows_read=stats.rows_read,
+                inserted=stats.inserted,
+                updated=stats.updated,
+                unchanged=stats.unchanged,
+                skipped=stats.skipped,
+                rejected=stats.rejected,
+                error_samples=stats.error_samples,
+            )
+
+        try:
+            stats = import_cosing_file(
+                job.file_path,
+                workers=settings.COSING_IMPORT_WORKERS,
+                progress=report,
+            )
+        except Exception as e:
+            logger.exception("COSING import job %s failed", job_id)
+            ImportJob.objects.filter(pk=job_id).update(
+                status=ImportJob.FAILED, error=str(e), finished_at=timezone.now()
+            )
+            return
+        finally:
+            # a failed file is not retried, a new upload makes a new job
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+        report(stats)
+        ImportJob.objects.filter(pk=job_id).update(
+            status=ImportJob.SUCCEEDED,
+            result=stats.as_dict(),
+            finished_at=timezone.now(),
+        )
+    finally:
+        # the worker thread owns its own connection
+        connection.close()
@@ -0,0 +1,48 @@
+import json
+import platform
+import sys
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark suite and print its results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES))
+        parser.add_argument(
+            "--size", type=int, help="Workload size (suite specific default)."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            help="Also save the results, with the run's settings, to this JSON file.",
+        )
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        results = SUITES[options["suite"]](size=options["size"], seed=options["seed"])
+        self.stdout.write(json.dumps(results, indent=2))
+
+        if options["output"]:
+            # what is needed to tell whether two runs are comparable
+            run = {
+                "suite": options["suite"],
+                "size": options["size"],
+                "seed": options["seed"],
+                "started_at": started_at.isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "argv": sys.argv[1:],
+                "results": results,
+            }
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(run, f, indent=2)
+            self.stderr.write(f"Saved to {options['output']}")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert a synthetic catalog (ingredients, cosmetics with compositions, "
+        "users with reviews, favorites and care plans) for benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        defaults = dataset.Scale()
+        parser.add_argument("--ingredients", type=int, default=defaults.ingredients)
+        parser.add_argument("--cosmetics", type=int, default=defaults.cosmetics)
+        parser.add_argument("--users", type=int, default=defaults.users)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=dataset.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if dataset.exists():
+            raise CommandError(
+                "The database already has a generated catalog; "
+                "use a fresh database (or manage.py flush) to generate another."
+            )
+        scale = dataset.Scale(
+            ingredients=options["ingredients"],
+            cosmetics=options["cosmetics"],
+            users=options["users"],
+        )
+        counts = dataset.generate(
+            scale,
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            progress=self.stdout.write,
+        )
+        summary = ", ".join(
+            f"{count} {name.replace('_', ' ')}" for name, count in counts.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
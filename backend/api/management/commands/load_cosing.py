@@ -0,0 +1,69 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, connection
+
+from api import cosing_copy
+from api.catalog import COSING_BATCH_SIZE, import_cosing_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a COSING CSV export from a file, without the upload limits of "
+        "the web import. PostgreSQL loads it with COPY, other databases with "
+        "batched upserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--batched",
+            action="store_true",
+            help="Use batched upserts on PostgreSQL as well.",
+        )
+        parser.add_argument("--batch-size", type=int, default=COSING_BATCH_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.COSING_IMPORT_WORKERS,
+            help="Processes parsing the file on the batched path (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the full import stats."
+        )
+
+    def handle(self, *args, **options):
+        use_copy = connection.vendor == "postgresql" and not options["batched"]
+        try:
+            if use_copy:
+                with open(options["path"], "rb") as f:
+                    stats = cosing_copy.load(f)
+            else:
+                stats = import_cosing_file(
+                    options["path"],
+                    workers=options["workers"],
+                    batch_size=options["batch_size"],
+                    progress=lambda stats: self.stderr.write(
+                        f"{stats.rows_read} rows read"
+                    ),
+                )
+        except OSError as e:
+            raise CommandError(e)
+        except (cosing_copy.InvalidCosingFile, DataError) as e:
+            raise CommandError(e)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats.as_dict(), indent=2))
+        for sample in stats.error_samples:
+            self.stderr.write(f"Line {sample['line']}: {sample['error']}")
+        rate = stats.rows_read / stats.total_seconds if stats.total_seconds else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stats.rows_read} rows in {stats.total_seconds:.1f} s "
+                f"({rate:.0f} rows/s, {'COPY' if use_copy else 'batched'}): "
+                f"{stats.inserted} inserted, {stats.updated} updated, "
+                f"{stats.unchanged} unchanged, {stats.skipped} skipped, "
+                f"{stats.rejected} rejected."
+            )
+        )
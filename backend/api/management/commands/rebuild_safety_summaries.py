@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import safety_summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the safety summary of every cosmetic "
+        "(e.g. after adding the table or after bulk edits made without signals)."
+    )
+
+    def handle(self, *args, **options):
+        count = safety_summary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} safety summaries."))
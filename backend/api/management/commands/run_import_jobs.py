@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_import_job
+from api.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Process COSING import jobs left in the queue (e.g. after a restart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requeue-running",
+            action="store_true",
+            help="Also restart jobs stuck as running after the worker died.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_running"]:
+            ImportJob.objects.filter(status=ImportJob.RUNNING).update(
+                status=ImportJob.QUEUED
+            )
+
+        job_ids = list(
+            ImportJob.objects.filter(status=ImportJob.QUEUED)
+            .order_by("created_at")
+            .values_list("pk", flat=True)
+        )
+        for job_id in job_ids:
+            run_import_job(job_id)
+            job = ImportJob.objects.get(pk=job_id)
+            self.stdout.write(
+                f"Job {job_id} ({job.file_name}): {job.status}, "
+                f"{job.rows_read} rows, {job.rows_per_second:.0f} rows/s"
+            )
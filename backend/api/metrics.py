@@ -0,0 +1,232 @@
+"""
+Request metrics for the API, exported in the Prometheus text format on
+/api/metrics/.
+
+MetricsMiddleware times every request under /api/ and records, per route
+(URL name) and viewset action: latency, number and time of database
+queries, time spent in serializers and response size. Metrics are kept in
+the memory of each server process; with several processes every one of
+them exports its own (scrape each, or sum them in Prometheus).
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from rest_framework import serializers
+
+API_PREFIX = "/api/"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_LABELS = ("route", "method", "action")
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # labels -> [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(s)) for labels, s in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = _labels(self.labels + ("le",), labels + (_number(bound),))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _labels(self.labels + ("le",), labels + ("+Inf",))
+            yield f"{self.name}_bucket{le} {values[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(values[-2])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {values[-1]}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = (
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+REQUESTS = Counter(
+    "api_requests_total",
+    "API requests by route, method, action and status code.",
+    REQUEST_LABELS + ("status",),
+)
+LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "Time to produce the response.",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "api_request_db_queries",
+    "Database queries per request.",
+    REQUEST_LABELS,
+    QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    "api_request_db_seconds",
+    "Time spent in database queries per request.",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+SERIALIZER_TIME = Histogram(
+    "api_request_serializer_seconds",
+    "Time spent in serializers' to_representation per request.",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "api_response_size_bytes",
+    "Size of the response body.",
+    REQUEST_LABELS,
+    SIZE_BUCKETS,
+)
+METRICS = [REQUESTS, LATENCY, DB_QUERIES, DB_TIME, SERIALIZER_TIME, RESPONSE_SIZE]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+_current = contextvars.ContextVar("api_request_stats", default=None)
+
+
+def current_stats():
+    """RequestStats of the request being handled, None outside of one."""
+    return _current.get()
+
+
+def _is_root(serializer):
+    """Whether `serializer` renders a response on its own (or as a list item)."""
+    parent = serializer.parent
+    if parent is None:
+        return True
+    return isinstance(parent, serializers.ListSerializer) and parent.parent is None
+
+
+class TimedSerializerMixin:
+    """Serializer mixin adding the time of top-level to_representation calls
+    to the current request's stats."""
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or not _is_root(self):
+            return super().to_representation(instance)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - started
+
+
+def _request_labels(request):
+    match = request.resolver_match
+    if match is None:
+        return ("unresolved", request.method, "")
+    # viewsets map the HTTP method to an action, e.g. {"get": "list"}
+    actions = getattr(match.func, "actions", None) or {}
+    action = actions.get(request.method.lower(), match.func.__name__)
+    return (match.view_name or match.route, request.method, action)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(API_PREFIX):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        labels = _request_labels(request)
+        REQUESTS.inc(labels + (str(response.status_code),))
+        LATENCY.observe(labels, duration)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_TIME.observe(labels, stats.db_seconds)
+        SERIALIZER_TIME.observe(labels, stats.serializer_seconds)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(labels, len(response.content))
+        return response
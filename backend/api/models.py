@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .cosing import MAX_LENGTHS, SOURCE_FIELDS, content_hash
 
 
 class Person(models.Model):  # Osoba
@@ -60,20 +64,31 @@ class IngredientINCI(models.Model):  # Składnik_INCI
 
     cosing_ref_no = models.IntegerField(primary_key=True, verbose_name="COSING Ref No")
     inci_name = models.CharField(
-        max_length=200, verbose_name="INCI Name", db_index=True
+        max_length=MAX_LENGTHS["inci_name"], verbose_name="INCI Name", db_index=True
     )
     common_name = models.CharField(
-        max_length=200, verbose_name="Common Name", blank=True, null=True, db_index=True
+        max_length=MAX_LENGTHS["common_name"],
+        verbose_name="Common Name",
+        blank=True,
+        null=True,
+        db_index=True,
     )
     action_description = models.TextField(
         verbose_name="Action Description", blank=True, null=True
     )
     function = models.CharField(
-        max_length=200, verbose_name="Function", blank=True, null=True, db_index=True
+        max_length=MAX_LENGTHS["function"],
+        verbose_name="Function",
+        blank=True,
+        null=True,
+        db_index=True,
     )
     restrictions = models.TextField(verbose_name="Restrictions", blank=True, null=True)
     update_date = models.CharField(
-        max_length=20, verbose_name="Update Date", blank=True, null=True
+        max_length=MAX_LENGTHS["update_date"],
+        verbose_name="Update Date",
+        blank=True,
+        null=True,
     )
     safety_rating = models.CharField(
         max_length=20,
@@ -85,6 +100,13 @@ class IngredientINCI(models.Model):  # Składnik_INCI
     restriction_description = models.TextField(
         verbose_name="Restriction Description", blank=True, null=True
     )
+    content_hash = models.CharField(
+        max_length=32,
+        verbose_name="Content Hash",
+        blank=True,
+        default="",
+        editable=False,
+    )  # hash of the COSING source columns, see api.cosing.content_hash
 
     class Meta:
         indexes = [
@@ -96,10 +118,27 @@ class IngredientINCI(models.Model):  # Składnik_INCI
         verbose_name = "INCI Ingredient"
         verbose_name_plural = "INCI Ingredients"
 
+    def save(self, *args, **kwargs):
+        # a re-import skips rows whose hash matches the file, so edits made
+        # through the API or the admin must change it (QuerySet.update() on
+        # the source columns leaves it stale)
+        self.content_hash = content_hash(
+            {name: getattr(self, name) for name in SOURCE_FIELDS}
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.inci_name
 
 
+# order_in_composition with the rows lacking one last, never NULL, so that
+# it can be a keyset pagination field
+INCI_ORDER = Coalesce("order_in_composition", models.Value(2**31 - 1))
+
+
 class CosmeticComposition(models.Model):  # Skład_kosmetyku
     cosmetic = models.ForeignKey(
         Cosmetic,
@@ -124,6 +163,12 @@ class CosmeticComposition(models.Model):  # Skład_kosmetyku
             models.Index(fields=["cosmetic"]),
             models.Index(fields=["ingredient"]),
             models.Index(fields=["cosmetic", "order_in_composition"]),
+            models.Index(
+                models.F("cosmetic"),
+                INCI_ORDER,
+                models.F("id"),
+                name="composition_inci_order_idx",
+            ),
         ]
         verbose_name = "Cosmetic Composition"
         verbose_name_plural = "Cosmetic Compositions"
@@ -141,6 +186,50 @@ class CosmeticComposition(models.Model):  # Skład_kosmetyku
         return f"{self.cosmetic.product_name} - {self.ingredient.inci_name} (#{self.order_in_composition})"
 
 
+class CosmeticSafetySummary(models.Model):  # Podsumowanie_bezpieczeństwa
+    """
+    Counts of the cosmetic's ingredients per safety rating, its harmful
+    ingredients and the clean score, kept up to date by api.safety_summary.
+    """
+
+    cosmetic = models.OneToOneField(
+        Cosmetic,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="safety_summary",
+    )
+    harmful_count = models.PositiveIntegerField(
+        verbose_name="Harmful Ingredients", default=0, db_index=True
+    )
+    neutral_count = models.PositiveIntegerField(
+        verbose_name="Neutral Ingredients", default=0
+    )
+    beneficial_count = models.PositiveIntegerField(
+        verbose_name="Beneficial Ingredients", default=0, db_index=True
+    )
+    ingredient_count = models.PositiveIntegerField(
+        verbose_name="Ingredients", default=0
+    )
+    safety_score = models.PositiveSmallIntegerField(
+        verbose_name="Clean Score", default=0, db_index=True
+    )
+    # [{"cosing_ref_no": ..., "inci_name": ...}] in INCI order
+    harmful_ingredients = models.JSONField(
+        verbose_name="Harmful Ingredients List", default=list
+    )
+    # read by the composition index to catch up with composition changes
+    updated_at = models.DateTimeField(
+        verbose_name="Updated At", auto_now=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = "Cosmetic Safety Summary"
+        verbose_name_plural = "Cosmetic Safety Summaries"
+
+    def __str__(self):
+        return f"{self.cosmetic_id}: {self.safety_score}%"
+
+
 class Review(models.Model):  # Recenzja
     cosmetic = models.ForeignKey(Cosmetic, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -181,3 +270,110 @@ class CarePlanRating(models.Model):  # Ocena_planu_pielęgnacji
 class FavoriteProduct(models.Model):  # Ulubione_produkty
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     cosmetic = models.ForeignKey(Cosmetic, on_delete=models.CASCADE)
+
+
+class ImportJob(models.Model):  # Zadanie_importu_COSING
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "W kolejce"),
+        (RUNNING, "W trakcie"),
+        (SUCCEEDED, "Zakończony"),
+        (FAILED, "Nieudany"),
+    ]
+
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    file_name = models.CharField(max_length=255, verbose_name="File Name")
+    file_path = models.CharField(max_length=500, verbose_name="File Path")
+    file_hash = models.CharField(
+        max_length=64, verbose_name="File SHA-256", db_index=True
+    )
+    file_size = models.BigIntegerField(verbose_name="File Size", default=0)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        verbose_name="Status",
+        db_index=True,
+    )
+    bytes_read = models.BigIntegerField(verbose_name="Bytes Read", default=0)
+    rows_read = models.PositiveIntegerField(verbose_name="Rows Read", default=0)
+    inserted = models.PositiveIntegerField(verbose_name="Inserted", default=0)
+    updated = models.PositiveIntegerField(verbose_name="Updated", default=0)
+    unchanged = models.PositiveIntegerField(verbose_name="Unchanged", default=0)
+    skipped = models.PositiveIntegerField(verbose_name="Skipped", default=0)
+    rejected = models.PositiveIntegerField(verbose_name="Rejected", default=0)
+    error_samples = models.JSONField(
+        verbose_name="Error Samples", default=list, blank=True
+    )
+    result = models.JSONField(verbose_name="Result", blank=True, null=True)
+    error = models.TextField(verbose_name="Error", blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            # one queued or running import per file, see jobs.submit_cosing_import
+            models.UniqueConstraint(
+                fields=["file_hash"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="unique_active_import_per_file",
+            )
+        ]
+        verbose_name = "COSING Import Job"
+        verbose_name_plural = "COSING Import Jobs"
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return max((end - self.started_at).total_seconds(), 0.0)
+
+    @property
+    def progress(self):
+        if self.status == self.SUCCEEDED:
+            return 1.0
+        if not self.file_size:
+            return 0.0
+        return min(self.bytes_read / self.file_size, 1.0)
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed_seconds
+        return self.rows_read / elapsed if elapsed else 0.0
+
+    @property
+    def eta_seconds(self):
+        if self.status != self.RUNNING or not self.bytes_read:
+            return None
+        bytes_per_second = self.bytes_read / (self.elapsed_seconds or 1)
+        return (self.file_size - self.bytes_read) / bytes_per_second
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class CatalogVersion(models.Model):  # Wersja_katalogu
+    """
+    Change counter of a part of the catalog ("catalog" for ingredients,
+    "cosmetics" for the cosmetic list, "cosmetic:<barcode>" per product),
+    used for ETags and Last-Modified.
+    """
+
+    key = models.CharField(primary_key=True, max_length=64, verbose_name="Key")
+    version = models.PositiveBigIntegerField(verbose_name="Version", default=0)
+    modified_at = models.DateTimeField(verbose_name="Modified At", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Catalog Version"
+        verbose_name_plural = "Catalog Versions"
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
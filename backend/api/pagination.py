@@ -0,0 +1,129 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination used by every list endpoint. Pages are fetched
+    with `WHERE (k1, k2, ...) > (last k1, last k2, ...) ORDER BY k1, k2, ...
+    LIMIT n` on the view's ordering, so the cost of a page does not grow with
+    the table or the page number.
+
+    Unlike DRF's CursorPagination, which seeks on the first ordering field
+    only and pages through rows sharing its value by OFFSET (capped at
+    offset_cutoff), the cursor holds the values of every ordering field.
+    Views declare a stable, indexed `ordering` ending with a unique field, or
+    implement `get_ordering()` when it depends on the request (e.g. relevance
+    order for searches). Ordering fields must not be NULL.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = ("pk",)
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, "get_ordering"):
+            ordering = view.get_ordering()
+        else:
+            ordering = getattr(view, "ordering", self.ordering)
+
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset, seeking on all ordering fields
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._seek(current_position, reverse))
+
+        # one extra row tells whether there is a following page
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _seek(self, position, reverse):
+        """
+        Rows after `position` in the page direction: the lexicographic
+        comparison of the ordering fields, each in its own direction.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        after = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            after |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        # the bound on the first field alone lets an index range scan start
+        first = self.ordering[0]
+        lookup = "lte" if first.startswith("-") != reverse else "gte"
+        return Q(**{f"{first.lstrip('-')}__{lookup}": values[0]}) & after
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(instance[name])
+            else:
+                values.append(getattr(instance, name))
+        return json.dumps(values, cls=DjangoJSONEncoder)
@@ -0,0 +1,93 @@
+"""
+Cache of the serialized product page data (cosmetic detail and composition),
+per barcode.
+
+Entries are keyed on two version counters kept in the cache: one per barcode,
+bumped when the cosmetic or its composition changes, and a global one, bumped
+when ingredients change (an ingredient can appear in any composition).
+Invalidating is a counter bump; stale entries are never read again and
+expire on their own.
+"""
+
+import time
+
+from django.core.cache import cache
+
+ENTRY_TIMEOUT = 60 * 60
+GLOBAL_VERSION_KEY = "product-cache:version"
+HITS_KEY = "product-cache:hits"
+MISSES_KEY = "product-cache:misses"
+
+
+def _version_key(barcode):
+    return f"product-cache:version:{barcode}"
+
+
+def _fresh_version():
+    # a counter that was evicted must not restart at a value used before
+    return time.time_ns()
+
+
+def _versions(barcode):
+    keys = [GLOBAL_VERSION_KEY, _version_key(barcode)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return versions[GLOBAL_VERSION_KEY], versions[_version_key(barcode)]
+
+
+def _count(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted in between
+            cache.add(key, 1, timeout=None)
+
+
+def get_or_build(barcode, kind, build):
+    """
+    Cached `kind` data ("detail", "composition:...") of the cosmetic, built
+    with `build()` on a miss.
+    """
+    global_version, version = _versions(barcode)
+    key = f"product-cache:{barcode}:{kind}:{global_version}:{version}"
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+
+    _count(MISSES_KEY)
+    data = build()
+    cache.set(key, data, ENTRY_TIMEOUT)
+    return data
+
+
+def _bump(key):
+    cache.add(key, _fresh_version(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted in between
+        cache.set(key, _fresh_version(), timeout=None)
+
+
+def invalidate(barcodes):
+    for barcode in set(barcodes):
+        _bump(_version_key(barcode))
+
+
+def invalidate_all():
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 3) if lookups else None,
+    }
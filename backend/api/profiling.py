@@ -0,0 +1,197 @@
+"""
+On-demand profiling of single API requests, for staff users.
+
+Adding ?_profile=1 (or an X-Profile: 1 header) to any /api/ request runs it
+under cProfile while recording every SQL statement, and returns the view's
+data wrapped as {"profile": <report>, "response": <data>}, rendered the way
+the response would have been (JSON, or the browsable API page). The report
+has the top PROFILE_TOP functions by cumulative time, the SQL statements
+with their timing, statements repeated with the same parameters
+(duplicates) and statements run more than once with any parameters, which
+is what an N+1 in a nested serializer looks like, and the serializer and
+render times.
+
+Requests from anyone but staff users are served as if the flag were not
+there. Without the flag the middleware does nothing but check for it.
+Responses that are not DRF responses (and 304s) are returned unchanged.
+Profiled responses are sent without validators and with no-store.
+"""
+
+import cProfile
+import pstats
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import metrics
+
+PARAM = "_profile"
+HEADER = "X-Profile"
+PROFILE_TOP = 30
+FLAG_VALUES = {"1", "true", "yes"}
+
+
+def _requested(request):
+    value = request.GET.get(PARAM) or request.headers.get(HEADER)
+    return value is not None and value.lower() in FLAG_VALUES
+
+
+def _is_staff(request):
+    # the session user of the browsable API, else the API's authentication
+    # (JWT), which otherwise only runs inside the view
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        authenticators = [cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+    return user.is_staff
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.statements = []  # (sql, params, many, seconds)
+        self.render_seconds = None
+        self._render_started = None
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, params, many, time.perf_counter() - started))
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+
+    def render_finished(self, response):
+        if self._render_started is not None and self.render_seconds is None:
+            self.render_seconds = time.perf_counter() - self._render_started
+
+    def functions(self):
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": pstats.func_std_string(function),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "own_ms": _milliseconds(own_time),
+                "cumulative_ms": _milliseconds(cumulative_time),
+            }
+            for function, (
+                primitive_calls,
+                calls,
+                own_time,
+                cumulative_time,
+                _,
+            ) in top[:PROFILE_TOP]
+        ]
+
+    def sql(self):
+        exact = Counter()
+        repeated = defaultdict(lambda: [0, 0.0])
+        statements = []
+        for sql, params, many, seconds in self.statements:
+            if many:
+                shown = f"{len(params)} parameter sets"
+            else:
+                shown = [str(param) for param in params or ()]
+            key = (sql, repr(shown))
+            exact[key] += 1
+            repeated[sql][0] += 1
+            repeated[sql][1] += seconds
+            statements.append(
+                {
+                    "sql": sql,
+                    "params": shown,
+                    "ms": _milliseconds(seconds),
+                    # 2 for the first repeat of the same statement, and so on
+                    "occurrence": exact[key],
+                }
+            )
+        return {
+            "count": len(statements),
+            "ms": _milliseconds(sum(s[3] for s in self.statements)),
+            "duplicates": sum(count - 1 for count in exact.values()),
+            "repeated": [
+                {"sql": sql, "count": count, "ms": _milliseconds(seconds)}
+                for sql, (count, seconds) in sorted(
+                    repeated.items(), key=lambda item: item[1][0], reverse=True
+                )
+                if count > 1
+            ],
+            "statements": statements,
+        }
+
+    def report(self, total_seconds):
+        stats = metrics.current_stats()
+        return {
+            "total_ms": _milliseconds(total_seconds),
+            "serializer_ms": (
+                _milliseconds(stats.serializer_seconds) if stats is not None else None
+            ),
+            "render_ms": (
+                _milliseconds(self.render_seconds)
+                if self.render_seconds is not None
+                else None
+            ),
+            "sql": self.sql(),
+            "functions": self.functions(),
+        }
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(metrics.API_PREFIX) or not _requested(request):
+            return self.get_response(request)
+        if not _is_staff(request):
+            return self.get_response(request)
+
+        profile = request.api_profile = RequestProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.sql_wrapper))
+            profile.profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.profiler.disable()
+        total_seconds = time.perf_counter() - started
+
+        if not hasattr(response, "data") or response.status_code == 304:
+            return response
+        response.data = {
+            "profile": profile.report(total_seconds),
+            "response": response.data,
+        }
+        response.content = response.rendered_content
+        # the validators are those of the unprofiled body: a client revalidating
+        # the URL later would get a 304 and keep this one
+        del response["ETag"]
+        del response["Last-Modified"]
+        response["Cache-Control"] = "no-store"
+        return response
+
+    def process_template_response(self, request, response):
+        # called right before the response is rendered
+        profile = getattr(request, "api_profile", None)
+        if profile is not None:
+            profile.render_started()
+            response.add_post_render_callback(profile.render_finished)
+        return response
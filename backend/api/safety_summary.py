@@ -0,0 +1,134 @@
+"""
+Per-cosmetic safety summaries (CosmeticSafetySummary rows): ingredient counts
+per safety rating, the harmful ingredients and the clean score.
+
+A cosmetic's summary is recomputed from its composition whenever the
+composition changes (see signals), in the writer's transaction. When ratings
+change in bulk (COSING import, safety recalculation) only the cosmetics
+containing the changed ingredients are recomputed, in chunks.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+
+from .models import (
+    INCI_ORDER,
+    Cosmetic,
+    CosmeticComposition,
+    CosmeticSafetySummary,
+)
+
+REFRESH_CHUNK_SIZE = 500
+
+COUNT_FIELDS = [
+    "harmful_count",
+    "neutral_count",
+    "beneficial_count",
+    "ingredient_count",
+]
+# fields the cosmetic list can be filtered and ordered by
+ORDERING_FIELDS = COUNT_FIELDS + ["safety_score"]
+SUMMARY_FIELDS = ORDERING_FIELDS + ["harmful_ingredients"]
+
+
+def clean_score(neutral, beneficial, total):
+    """
+    Neutral ingredients score 1 point, beneficial 2, harmful 0; the clean
+    score is the percentage of the maximum, rounded half up.
+    """
+    if not total:
+        return 0
+    return (100 * (neutral + 2 * beneficial) + total) // (2 * total)
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _refresh_chunk(barcodes):
+    rating = "ingredients__ingredient__safety_rating"
+    counts = (
+        Cosmetic.objects.filter(pk__in=barcodes)
+        .order_by()
+        .values_list("pk")
+        .annotate(
+            total=Count("ingredients"),
+            harmful=Count("ingredients", filter=Q(**{rating: "harmful"})),
+            beneficial=Count("ingredients", filter=Q(**{rating: "beneficial"})),
+        )
+    )
+    harmful_rows = (
+        CosmeticComposition.objects.filter(
+            cosmetic_id__in=barcodes, ingredient__safety_rating="harmful"
+        )
+        .order_by("cosmetic_id", INCI_ORDER)
+        .values_list("cosmetic_id", "ingredient_id", "ingredient__inci_name")
+    )
+    harmful_ingredients = {}
+    for barcode, ref_no, inci_name in harmful_rows:
+        harmful_ingredients.setdefault(barcode, []).append(
+            {"cosing_ref_no": ref_no, "inci_name": inci_name}
+        )
+
+    summaries = []
+    for barcode, total, harmful, beneficial in counts:
+        # anything not rated harmful or beneficial counts as neutral
+        neutral = total - harmful - beneficial
+        summaries.append(
+            CosmeticSafetySummary(
+                cosmetic_id=barcode,
+                harmful_count=harmful,
+                neutral_count=neutral,
+                beneficial_count=beneficial,
+                ingredient_count=total,
+                safety_score=clean_score(neutral, beneficial, total),
+                harmful_ingredients=harmful_ingredients.get(barcode, []),
+            )
+        )
+    CosmeticSafetySummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["cosmetic"],
+        update_fields=SUMMARY_FIELDS + ["updated_at"],
+    )
+
+
+def refresh(barcodes, chunk_size=REFRESH_CHUNK_SIZE):
+    """Recompute the summaries of the given cosmetics; unknown barcodes are skipped."""
+    for chunk in _chunks(sorted(set(barcodes)), chunk_size):
+        with transaction.atomic():
+            _refresh_chunk(chunk)
+
+
+def refresh_for_ingredients(cosing_ref_nos, chunk_size=REFRESH_CHUNK_SIZE):
+    """Recompute the summaries of the cosmetics containing any of the ingredients."""
+    barcodes = set()
+    for chunk in _chunks(cosing_ref_nos, chunk_size):
+        barcodes.update(
+            CosmeticComposition.objects.filter(ingredient_id__in=chunk)
+            .order_by()
+            .values_list("cosmetic_id", flat=True)
+            .distinct()
+        )
+    refresh(barcodes, chunk_size)
+
+
+def rebuild(chunk_size=REFRESH_CHUNK_SIZE):
+    """Recompute the summaries of every cosmetic; returns how many there are."""
+    barcodes = Cosmetic.objects.order_by().values_list("pk", flat=True)
+    refresh(barcodes.iterator(chunk_size=chunk_size), chunk_size)
+    return CosmeticSafetySummary.objects.count()
+
+
+def annotate(queryset):
+    """
+    Annotate a Cosmetic queryset with the summary fields, under the same
+    names. Counts of cosmetics without a summary row read as 0.
+    """
+    return queryset.annotate(
+        **{name: Coalesce(F(f"safety_summary__{name}"), 0) for name in ORDERING_FIELDS},
+        harmful_ingredients=F("safety_summary__harmful_ingredients"),
+    )
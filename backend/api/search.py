@@ -0,0 +1,158 @@
+"""
+Ranked text search over the catalog.
+
+On PostgreSQL matching is backed by pg_trgm: GIN trigram indexes serve the
+ILIKE '%query%' filters as well as fuzzy (similarity) matches, and results
+are ordered by match kind and trigram similarity. Other databases (SQLite in
+local tests) fall back to plain icontains with the same match-kind ranking.
+"""
+
+import json
+import logging
+
+from django.db import connections
+from django.db.models import Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Greatest, Length
+
+logger = logging.getLogger(__name__)
+
+# match kinds, best first
+EXACT, PREFIX, CONTAINS, SIMILAR = 3, 2, 1, 0
+
+# hit counts above this are estimated from the query plan
+COUNT_EXACT_THRESHOLD = 1000
+
+# GIN trigram indexes: Django's icontains compiles to UPPER(col::text) LIKE,
+# which needs the expression index, the similarity operator (%) the plain one
+TRIGRAM_INDEXES = [
+    ("api_ingredientinci", "inci_name", "inci_name"),
+    ("api_ingredientinci", "inci_name_upper", 'UPPER("inci_name"::text)'),
+    ("api_ingredientinci", "common_name", "common_name"),
+    ("api_ingredientinci", "common_name_upper", 'UPPER("common_name"::text)'),
+    ("api_ingredientinci", "function_upper", 'UPPER("function"::text)'),
+    ("api_cosmetic", "product_name", "product_name"),
+    ("api_cosmetic", "product_name_upper", 'UPPER("product_name"::text)'),
+    ("api_cosmetic", "manufacturer", "manufacturer"),
+    ("api_cosmetic", "manufacturer_upper", 'UPPER("manufacturer"::text)'),
+]
+
+
+def uses_trigrams(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def match_rank(fields, query):
+    """Annotation ranking exact over prefix over substring matches on `fields`."""
+    whens = []
+    for lookup, rank in (("iexact", EXACT), ("istartswith", PREFIX)):
+        whens += [When(**{f"{f}__{lookup}": query}, then=Value(rank)) for f in fields]
+    whens += [When(**{f"{f}__icontains": query}, then=Value(CONTAINS)) for f in fields]
+    return Case(*whens, default=Value(SIMILAR), output_field=IntegerField())
+
+
+def ranked_search(queryset, fields, query, tiebreak):
+    """
+    Filter `queryset` to rows where any of `fields` matches `query` and order
+    them by relevance, then by `tiebreak` fields.
+
+    Relevance is annotated as `search_rank` (match kind) and `search_score`
+    (trigram similarity, or the negated name length without trigrams) so that
+    paginators can order and seek on plain columns.
+    """
+    match = Q()
+    for f in fields:
+        match |= Q(**{f"{f}__icontains": query})
+    queryset = queryset.annotate(search_rank=match_rank(fields, query))
+
+    if uses_trigrams(queryset):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        for f in fields:
+            match |= Q(**{f"{f}__trigram_similar": query})
+        similarities = [TrigramSimilarity(f, query) for f in fields]
+        score = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        # similarity() is a real; as a double precision the value read back
+        # into a cursor compares equal to the column when it is sent again
+        score = Cast(score, FloatField())
+    else:
+        # without trigrams the shortest name is the closest substring match
+        score = Cast(-Length(fields[0]), FloatField())
+
+    return (
+        queryset.annotate(search_score=score)
+        .filter(match)
+        .order_by("-search_rank", "-search_score", *tiebreak)
+    )
+
+
+def search_ingredients(queryset, query):
+    return ranked_search(
+        queryset, ["inci_name", "common_name"], query, ["inci_name", "cosing_ref_no"]
+    )
+
+
+def search_cosmetics(queryset, query):
+    """
+    All-digit queries are barcodes: exact or prefix match on the primary key
+    (served by its B-tree/pattern index). Anything else is a ranked match on
+    product name and manufacturer.
+    """
+    query = query.strip()
+    if query.isdigit():
+        return (
+            queryset.filter(barcode__startswith=query)
+            .annotate(
+                search_rank=Case(
+                    When(barcode=query, then=Value(EXACT)),
+                    default=Value(PREFIX),
+                    output_field=IntegerField(),
+                ),
+                search_score=Value(0.0, output_field=FloatField()),
+            )
+            .order_by("-search_rank", "barcode")
+        )
+
+    return ranked_search(
+        queryset, ["product_name", "manufacturer"], query, ["product_name", "barcode"]
+    )
+
+
+def count_hits(queryset, threshold=COUNT_EXACT_THRESHOLD):
+    """
+    Returns (count, exact). Counting stops after `threshold` rows; beyond that
+    PostgreSQL's row estimate for the query is used instead of a full count.
+    """
+    queryset = queryset.order_by()
+    count = queryset[: threshold + 1].count()
+    if count <= threshold:
+        return count, True
+
+    if uses_trigrams(queryset):
+        plan = json.loads(queryset.explain(format="json"))
+        count = max(count, int(plan[0]["Plan"]["Plan Rows"]))
+    return count, False
+
+
+def create_trigram_indexes(using="default", **kwargs):
+    """
+    post_migrate hook creating pg_trgm and the GIN trigram indexes. Migrations
+    are generated locally, so the extension is not part of them.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for table, name, expression in TRIGRAM_INDEXES:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{name}_trgm "
+                    f"ON {table} USING gin (({expression}) gin_trgm_ops)"
+                )
+    except Exception:
+        logger.warning(
+            "Could not create pg_trgm trigram indexes, search will fall back "
+            "to sequential scans.",
+            exc_info=True,
+        )
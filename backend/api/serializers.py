@@ -10,17 +10,30 @@ from .models import (
     CarePlanContent,
     CarePlanRating,
     FavoriteProduct,
+    ImportJob,
 )
+import logging
 import re
 
+from .fieldsets import DynamicFieldsMixin
+from .metrics import TimedSerializerMixin
 
-class PersonSerializer(serializers.ModelSerializer):
+logger = logging.getLogger(__name__)
+
+
+class BaseModelSerializer(
+    TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer
+):
+    """Model serializer with the `fields` query parameter and timings."""
+
+
+class PersonSerializer(BaseModelSerializer):
     class Meta:
         model = Person
         fields = ["id", "skin_type", "skin_problems", "specialization"]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(BaseModelSerializer):
     person = PersonSerializer()
 
     class Meta:
@@ -51,7 +64,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class CosmeticSerializer(serializers.ModelSerializer):
+class CosmeticSerializer(BaseModelSerializer):
     class Meta:
         model = Cosmetic
         fields = [
@@ -73,12 +86,8 @@ class CosmeticSerializer(serializers.ModelSerializer):
                 )
         return value
 
-    def validate(self, data):
-        print(f"CosmeticSerializer - Received data: {data}")
-        return data
-
     def create(self, validated_data):
-        print(f"CosmeticSerializer - Creating cosmetic with data: {validated_data}")
+        logger.debug("Creating cosmetic with data: %s", validated_data)
 
         # generate automatic purchase link based on product name
         product_name = validated_data.get("product_name", "")
@@ -91,12 +100,38 @@ class CosmeticSerializer(serializers.ModelSerializer):
 
         try:
             return super().create(validated_data)
-        except Exception as e:
-            print(f"CosmeticSerializer - Error creating cosmetic: {e}")
+        except Exception:
+            logger.exception(
+                "Error creating cosmetic %s", validated_data.get("barcode")
+            )
             raise
 
 
-class IngredientINCISerializer(serializers.ModelSerializer):
+class CosmeticSummarySerializer(CosmeticSerializer):
+    """
+    Cosmetic with its safety summary, read from the annotations added by
+    safety_summary.annotate().
+    """
+
+    harmful_count = serializers.IntegerField(read_only=True)
+    neutral_count = serializers.IntegerField(read_only=True)
+    beneficial_count = serializers.IntegerField(read_only=True)
+    ingredient_count = serializers.IntegerField(read_only=True)
+    safety_score = serializers.IntegerField(read_only=True)
+    harmful_ingredients = serializers.JSONField(read_only=True)
+
+    class Meta(CosmeticSerializer.Meta):
+        fields = CosmeticSerializer.Meta.fields + [
+            "harmful_count",
+            "neutral_count",
+            "beneficial_count",
+            "ingredient_count",
+            "safety_score",
+            "harmful_ingredients",
+        ]
+
+
+class IngredientINCISerializer(BaseModelSerializer):
     class Meta:
         model = IngredientINCI
         fields = [
@@ -111,7 +146,7 @@ class IngredientINCISerializer(serializers.ModelSerializer):
         ]
 
 
-class CosmeticCompositionSerializer(serializers.ModelSerializer):
+class CosmeticCompositionSerializer(BaseModelSerializer):
     # For creating/updating, we use SlugRelatedField to reference by barcode and cosing_ref_no
     cosmetic = serializers.SlugRelatedField(
         slug_field="barcode", queryset=Cosmetic.objects.all()
@@ -125,7 +160,7 @@ class CosmeticCompositionSerializer(serializers.ModelSerializer):
         fields = ["id", "cosmetic", "ingredient", "order_in_composition"]
 
 
-class CosmeticCompositionReadSerializer(serializers.ModelSerializer):
+class CosmeticCompositionReadSerializer(BaseModelSerializer):
     # For read operations, we return full details of cosmetic and ingredient
     cosmetic = CosmeticSerializer(read_only=True)
     ingredient = IngredientINCISerializer(read_only=True)
@@ -135,7 +170,72 @@ class CosmeticCompositionReadSerializer(serializers.ModelSerializer):
         fields = ["id", "cosmetic", "ingredient", "order_in_composition"]
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+# what the product page shows for each ingredient; ?expand= adds the rest
+COMPOSITION_EXPAND = ["cosmetic", "ingredients"]
+
+
+class CompositionIngredientSerializer(BaseModelSerializer):
+    class Meta:
+        model = IngredientINCI
+        fields = [
+            "cosing_ref_no",
+            "inci_name",
+            "common_name",
+            "function",
+            "safety_rating",
+            "restriction_description",
+        ]
+
+
+class CosmeticHeaderSerializer(BaseModelSerializer):
+    class Meta:
+        model = Cosmetic
+        fields = ["barcode", "product_name", "manufacturer", "category", "is_verified"]
+
+
+class CosmeticCompositionCompactSerializer(BaseModelSerializer):
+    # For listing, the cosmetic is only referenced by its barcode
+    cosmetic = serializers.CharField(source="cosmetic_id", read_only=True)
+    ingredient = CompositionIngredientSerializer(read_only=True)
+
+    class Meta:
+        model = CosmeticComposition
+        fields = ["id", "cosmetic", "ingredient", "order_in_composition"]
+
+
+def composition_serializers(expand=()):
+    """(cosmetic, ingredient) serializer classes for a composition."""
+    cosmetic_serializer = (
+        CosmeticSerializer if "cosmetic" in expand else CosmeticHeaderSerializer
+    )
+    ingredient_serializer = (
+        IngredientINCISerializer
+        if "ingredients" in expand
+        else CompositionIngredientSerializer
+    )
+    return cosmetic_serializer, ingredient_serializer
+
+
+def serialize_composition(cosmetic, compositions, expand=()):
+    """
+    Composition of one cosmetic: the cosmetic header once, then its ingredients
+    in INCI order, each with its `order`. `expand` may contain "cosmetic"
+    and/or "ingredients" to return all of their fields.
+    """
+    cosmetic_serializer, ingredient_serializer = composition_serializers(expand)
+    ingredients = ingredient_serializer(
+        [composition.ingredient for composition in compositions], many=True
+    ).data
+    for entry, composition in zip(ingredients, compositions):
+        entry["order"] = composition.order_in_composition
+
+    return {
+        "cosmetic": cosmetic_serializer(cosmetic).data,
+        "ingredients": ingredients,
+    }
+
+
+class ReviewSerializer(BaseModelSerializer):
     cosmetic = CosmeticSerializer()
     user = UserSerializer()
 
@@ -144,7 +244,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ["id", "cosmetic", "user", "title", "content", "rating", "review_date"]
 
 
-class CarePlanSerializer(serializers.ModelSerializer):
+class CarePlanSerializer(BaseModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -152,7 +252,7 @@ class CarePlanSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "plan_name", "description", "start_date", "end_date"]
 
 
-class CarePlanContentSerializer(serializers.ModelSerializer):
+class CarePlanContentSerializer(BaseModelSerializer):
     plan = CarePlanSerializer()
     cosmetic = CosmeticSerializer()
 
@@ -161,7 +261,7 @@ class CarePlanContentSerializer(serializers.ModelSerializer):
         fields = ["id", "plan", "cosmetic", "frequency", "time_of_day", "notes"]
 
 
-class CarePlanRatingSerializer(serializers.ModelSerializer):
+class CarePlanRatingSerializer(BaseModelSerializer):
     plan = CarePlanSerializer()
     user = UserSerializer()
 
@@ -170,10 +270,42 @@ class CarePlanRatingSerializer(serializers.ModelSerializer):
         fields = ["id", "plan", "user", "rating"]
 
 
-class FavoriteProductSerializer(serializers.ModelSerializer):
+class FavoriteProductSerializer(BaseModelSerializer):
     user = UserSerializer()
     cosmetic = CosmeticSerializer()
 
     class Meta:
         model = FavoriteProduct
         fields = ["id", "user", "cosmetic"]
+
+
+class ImportJobSerializer(BaseModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    rows_per_second = serializers.FloatField(read_only=True)
+    eta_seconds = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "file_name",
+            "file_size",
+            "bytes_read",
+            "rows_read",
+            "inserted",
+            "updated",
+            "unchanged",
+            "skipped",
+            "rejected",
+            "progress",
+            "rows_per_second",
+            "eta_seconds",
+            "error_samples",
+            "error",
+            "result",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
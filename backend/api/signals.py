@@ -0,0 +1,114 @@
+"""
+Invalidation of derived data (product cache, autocomplete index, safety
+summaries) when the catalog changes.
+
+post_save/post_delete cover changes made through model instances. Bulk
+writes (bulk_create, bulk_update, QuerySet.update) send no model signals, so
+the code doing them sends `cosmetics_changed` or `ingredients_changed`.
+Catalog versions are bumped in the writer's transaction; caches are
+invalidated after it commits, so that a concurrent request cannot cache the
+data as it was before the commit. Safety summaries are recomputed right
+away, like the versions.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import autocomplete, product_cache, safety_summary, versions
+from .models import Cosmetic, CosmeticComposition, IngredientINCI
+
+# sent with barcodes=[...] after bulk writes to cosmetics or compositions
+cosmetics_changed = Signal()
+# sent after bulk writes to ingredients, with cosing_ref_nos=[...] of the
+# ingredients whose rating or name changed when known
+ingredients_changed = Signal()
+
+
+@receiver(cosmetics_changed)
+def invalidate_cosmetics(sender, barcodes, **kwargs):
+    barcodes = list(barcodes)
+    # the cosmetic list carries the safety summaries, so it changes as well
+    versions.bump(
+        versions.COSMETICS, *(versions.cosmetic_key(barcode) for barcode in barcodes)
+    )
+    transaction.on_commit(lambda: product_cache.invalidate(barcodes))
+
+
+@receiver(cosmetics_changed)
+def refresh_safety_summaries(sender, barcodes, **kwargs):
+    safety_summary.refresh(barcodes)
+
+
+@receiver(ingredients_changed)
+def invalidate_ingredients(sender, **kwargs):
+    def invalidate():
+        autocomplete.invalidate()
+        product_cache.invalidate_all()
+
+    versions.bump(versions.CATALOG)
+    transaction.on_commit(invalidate)
+
+
+@receiver(ingredients_changed)
+def refresh_ingredient_summaries(sender, cosing_ref_nos=None, **kwargs):
+    if cosing_ref_nos is None:
+        safety_summary.rebuild()
+    else:
+        safety_summary.refresh_for_ingredients(cosing_ref_nos)
+
+
+@receiver(post_save, sender=Cosmetic)
+@receiver(post_delete, sender=Cosmetic)
+def cosmetic_changed(sender, instance, **kwargs):
+    invalidate_cosmetics(sender, barcodes=[instance.barcode])
+    if kwargs.get("created"):
+        safety_summary.refresh([instance.barcode])
+
+
+# a row moved to another cosmetic changes the one it leaves as well, so its
+# stored cosmetic is looked up before the save
+@receiver(pre_save, sender=CosmeticComposition)
+def composition_saving(sender, instance, **kwargs):
+    instance._previous_cosmetic_id = (
+        CosmeticComposition.objects.filter(pk=instance.pk)
+        .values_list("cosmetic_id", flat=True)
+        .first()
+        if instance.pk is not None
+        else None
+    )
+
+
+# Deleting compositions sends cosmetics_changed explicitly: a post_delete
+# receiver would make Django fetch and signal every deleted row
+@receiver(post_save, sender=CosmeticComposition)
+def composition_changed(sender, instance, **kwargs):
+    barcodes = {instance.cosmetic_id}
+    previous = getattr(instance, "_previous_cosmetic_id", None)
+    if previous is not None:
+        barcodes.add(previous)
+    invalidate_cosmetics(sender, barcodes=barcodes)
+    safety_summary.refresh(barcodes)
+
+
+@receiver(post_save, sender=IngredientINCI)
+def ingredient_saved(sender, instance, **kwargs):
+    invalidate_ingredients(sender)
+    refresh_ingredient_summaries(sender, cosing_ref_nos=[instance.pk])
+
+
+# the compositions of a deleted ingredient are gone by post_delete, so the
+# cosmetics it was in are looked up before
+@receiver(pre_delete, sender=IngredientINCI)
+def ingredient_deleting(sender, instance, **kwargs):
+    instance._summary_barcodes = list(
+        CosmeticComposition.objects.filter(ingredient=instance).values_list(
+            "cosmetic_id", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=IngredientINCI)
+def ingredient_deleted(sender, instance, **kwargs):
+    invalidate_ingredients(sender)
+    safety_summary.refresh(getattr(instance, "_summary_barcodes", []))
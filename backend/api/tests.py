@@ -1,3 +1,1507 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, datetime, timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from . import (
+    compatibility,
+    cosing,
+    cosing_copy,
+    composition_index,
+    jobs,
+    metrics,
+    product_cache,
+    profiling,
+    safety_summary,
+)
+from .catalog import import_cosing, import_cosing_file, recalculate_safety_ratings
+from .models import (
+    CarePlan,
+    CarePlanContent,
+    CarePlanRating,
+    CatalogVersion,
+    Cosmetic,
+    CosmeticComposition,
+    CosmeticSafetySummary,
+    FavoriteProduct,
+    ImportJob,
+    IngredientINCI,
+    Person,
+    Review,
+)
+from .similarity import SimilarityIndex
+
+
+class CosingImportTests(APITestCase):
+    HEADER = (
+        "COSING Ref No,INCI name,INN name,Ph. Eur. Name,"
+        "Chem/IUPAC Name / Description,Restriction,Function,Update Date\n"
+    )
+    ROWS = (
+        "1,AQUA,,,Water,,SOLVENT,01/01/2020\n"
+        "2,GLYCERIN,,,,,HUMEKTANT,01/01/2020\n"
+        "3,FORMALDEHYDE,,,,V/5,KONSERWUJĄCA,01/01/2020\n"
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, rows, **kwargs):
+        content = (self.HEADER + rows).encode("utf-8")
+        return import_cosing(content.splitlines(True), **kwargs)
+
+    def test_batches_and_row_errors(self):
+        batches = []
+        stats = self.run_import(
+            self.ROWS
+            + "2,GLYCERIN,,,,,HUMEKTANT; EMOLIENT,01/01/2021\n"
+            + "abc,BROKEN,,,,,,\n"
+            + ",,,,,,,\n",
+            batch_size=2,
+            progress=lambda stats: batches.append(stats.rows_read),
+        )
+        self.assertEqual(batches, [2, 4])
+        self.assertEqual(stats.rows_read, 6)
+        self.assertEqual((stats.inserted, stats.updated), (3, 1))
+        self.assertEqual((stats.duplicates, stats.skipped, stats.rejected), (1, 1, 1))
+        self.assertEqual(
+            stats.error_samples,
+            [{"line": 6, "error": "invalid literal for int() with base 10: 'abc'"}],
+        )
+        # the last occurrence of a ref no wins
+        self.assertEqual(
+            IngredientINCI.objects.get(pk=2).function, "HUMEKTANT; EMOLIENT"
+        )
+        self.assertEqual(IngredientINCI.objects.get(pk=3).safety_rating, "harmful")
+
+    def test_overlong_values(self):
+        stats = self.run_import(
+            self.ROWS
+            + f"4,{'X' * 201},,,,,,\n"
+            + "5,SAL,,,,,,01/01/2020 and more text\n"
+        )
+        self.assertEqual((stats.inserted, stats.rejected), (3, 2))
+        self.assertEqual(
+            stats.error_samples,
+            [
+                {"line": 5, "error": "inci_name longer than 200 characters"},
+                {"line": 6, "error": "update_date longer than 20 characters"},
+            ],
+        )
+
+    def test_reimport_restores_edited_rows(self):
+        self.run_import(self.ROWS)
+        staff = User.objects.create_user("admin", password="x", is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.patch(
+            "/api/ingredients/2/", {"inci_name": "GLICERYNA"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        ingredient = IngredientINCI.objects.get(pk=3)
+        ingredient.function = "EMOLIENT"
+        ingredient.save(update_fields=["function"])
+
+        stats = self.run_import(self.ROWS)
+        self.assertEqual((stats.updated, stats.unchanged), (2, 1))
+        self.assertEqual(sorted(stats.diff.changed), [2, 3])
+        self.assertEqual(IngredientINCI.objects.get(pk=2).inci_name, "GLYCERIN")
+        self.assertEqual(IngredientINCI.objects.get(pk=3).function, "KONSERWUJĄCA")
+        # saving an unchanged row keeps the hash of the file
+        IngredientINCI.objects.get(pk=1).save()
+        self.assertEqual(self.run_import(self.ROWS).unchanged, 3)
+
+    def test_recalculate_dry_run(self):
+        self.run_import(self.ROWS)
+        IngredientINCI.objects.filter(pk=1).update(safety_rating="harmful")
+        self.client.force_authenticate(
+            User.objects.create_user("admin", password="x", is_staff=True)
+        )
+        url = "/api/ingredients/recalculate_safety/"
+
+        response = self.client.post(url, {"dry_run": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data["updated_count"], response.data["total_count"]), (1, 3)
+        )
+        self.assertEqual(
+            response.data["changes"],
+            [
+                {
+                    "cosing_ref_no": 1,
+                    "safety_rating": ["harmful", "neutral"],
+                    "restriction_description": ["", ""],
+                }
+            ],
+        )
+        self.assertEqual(IngredientINCI.objects.get(pk=1).safety_rating, "harmful")
+
+        response = self.client.post(url)
+        self.assertEqual(response.data["updated_count"], 1)
+        self.assertNotIn("changes", response.data)
+        self.assertEqual(IngredientINCI.objects.get(pk=1).safety_rating, "neutral")
+
+
+class SafetyClassifierTests(APITestCase):
+    def test_classify_many(self):
+        classifier = cosing.SafetyClassifier()
+        results = classifier.classify_many(
+            [
+                ("HUMEKTANT, EMOLIENT", ""),
+                ("perfumująca; emolient; maskująca", ""),
+                ("HUMEKTANT, EMOLIENT", ""),
+                ("HUMEKTANT", "III/1, V/5"),
+                ("", " "),
+            ]
+        )
+        self.assertEqual(
+            results,
+            [
+                ("beneficial", ""),
+                ("neutral", ""),
+                ("beneficial", ""),
+                (
+                    "harmful",
+                    "Dozwolona warunkowo z ograniczeniami stężenia; "
+                    "Dozwolony konserwant z limitami stężeń",
+                ),
+                ("neutral", ""),
+            ],
+        )
+        # repeated (function, restrictions) pairs are served from the cache
+        info = classifier.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 4))
+
+
+class ImportJobTests(APITestCase):
+    URL = "/api/import_cosing/"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(COSING_IMPORT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory.name
+        self.client.force_authenticate(
+            User.objects.create_user("admin", password="x", is_staff=True)
+        )
+
+    def upload(self, content=CosingImportTests.HEADER + CosingImportTests.ROWS):
+        file = SimpleUploadedFile("COSING.csv", content.encode("utf-8"))
+        return self.client.post(self.URL, {"file": file}, format="multipart")
+
+    def test_deduplicated_while_active(self):
+        first = self.upload()
+        self.assertEqual(first.status_code, 202)
+        second = self.upload()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data["id"], first.data["id"])
+        self.assertTrue(second.data["deduplicated"])
+        # the duplicate's copy is removed, the queued job keeps its own
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        ImportJob.objects.filter(pk=first.data["id"]).update(status=ImportJob.SUCCEEDED)
+        third = self.upload()
+        self.assertEqual(third.status_code, 202)
+        self.assertNotEqual(third.data["id"], first.data["id"])
+
+    def test_one_active_job_per_file(self):
+        job = ImportJob.objects.create(file_name="a.csv", file_hash="0" * 64)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ImportJob.objects.create(file_name="b.csv", file_hash="0" * 64)
+        job.status = ImportJob.FAILED
+        job.save()
+        ImportJob.objects.create(file_name="b.csv", file_hash="0" * 64)
+
+    def test_progress(self):
+        job_id = self.upload().data["id"]
+        reported = []
+
+        def import_in_batches(path, workers, progress):
+            def record(stats):
+                progress(stats)
+                reported.append(ImportJob.objects.get(pk=job_id).rows_read)
+
+            return import_cosing_file(path, workers=1, batch_size=2, progress=record)
+
+        # the test shares the worker's connection, which must stay open
+        with mock.patch.object(jobs, "connection"), mock.patch.object(
+            jobs, "import_cosing_file", import_in_batches
+        ):
+            jobs.run_import_job(job_id)
+
+        self.assertEqual(reported, [2])
+        response = self.client.get(f"/api/import_jobs/{job_id}/")
+        self.assertEqual(response.data["status"], ImportJob.SUCCEEDED)
+        self.assertEqual(
+            (response.data["rows_read"], response.data["inserted"]), (3, 3)
+        )
+        self.assertEqual(response.data["result"]["inserted"], 3)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_failed_job_removes_its_file(self):
+        job_id = self.upload().data["id"]
+        with mock.patch.object(jobs, "connection"), mock.patch.object(
+            jobs, "import_cosing_file", side_effect=OSError("disk full")
+        ):
+            jobs.run_import_job(job_id)
+
+        job = ImportJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.error), (ImportJob.FAILED, "disk full"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class AutocompleteTests(APITestCase):
+    URL = "/api/ingredients/autocomplete/"
+
+    def setUp(self):
+        cache.clear()
+        IngredientINCI.objects.create(
+            cosing_ref_no=1,
+            inci_name="GLYCERIN",
+            common_name="Gliceryna",
+            function="HUMEKTANT",
+            safety_rating="beneficial",
+        )
+
+    def test_suggestions_carry_the_composition_fields(self):
+        self.assertEqual(
+            self.client.get(self.URL, {"q": "glyc"}).data,
+            [
+                {
+                    "cosing_ref_no": 1,
+                    "inci_name": "GLYCERIN",
+                    "common_name": "Gliceryna",
+                    "function": "HUMEKTANT",
+                    "safety_rating": "beneficial",
+                }
+            ],
+        )
+
+    def test_prefix_and_limit(self):
+        for ref_no, inci_name in [
+            (2, "PEG-40 HYDROGENATED CASTOR OIL"),
+            (3, "RICINUS COMMUNIS SEED OIL"),
+            (4, "PEG-4"),
+            (5, "CASTOR ISOSTEARATE"),
+        ]:
+            IngredientINCI.objects.create(cosing_ref_no=ref_no, inci_name=inci_name)
+
+        def ref_nos(**params):
+            response = self.client.get(self.URL, params)
+            return [row["cosing_ref_no"] for row in response.data]
+
+        self.assertEqual(ref_nos(q="peg 4"), [4, 2])
+        # names starting with the query before those with a later word matching
+        self.assertEqual(ref_nos(q="Castor"), [5, 2])
+        self.assertEqual(ref_nos(q="castor", limit=1), [5])
+        self.assertEqual(ref_nos(q="oil"), [2, 3])
+        self.assertEqual(ref_nos(q="-"), [])
+
+
+class CompositionReplaceTests(APITestCase):
+    URL = "/api/cosmetics/5900000000001/composition/"
+
+    def setUp(self):
+        cache.clear()
+        Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+            is_verified=False,
+        )
+        for n in (1, 2, 3):
+            IngredientINCI.objects.create(cosing_ref_no=n, inci_name=f"INGREDIENT {n}")
+
+    def put(self, data):
+        return self.client.put(self.URL, data, format="json")
+
+    def test_body_that_is_not_a_list_or_object(self):
+        for data in ("abc", 5, None):
+            response = self.put(data)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(
+                response.data["error"], "Expected a list of COSING Ref Nos."
+            )
+
+    def test_invalid_ingredients(self):
+        self.put([1, 2])
+        for data, error, ref_nos in [
+            (
+                {"ingredients": [1, "abc", None]},
+                "Invalid COSING Ref Nos.",
+                ["None", "abc"],
+            ),
+            (
+                [True, 1.9, " 7 ", "٣"],
+                "Invalid COSING Ref Nos.",
+                [" 7 ", "1.9", "True", "٣"],
+            ),
+            ([3, "1", 3, 1], "Duplicate ingredients in composition.", [1, 3]),
+            ([9, 1, 8], "Unknown ingredients.", [8, 9]),
+        ]:
+            response = self.put(data)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(response.data, {"error": error, "cosing_ref_nos": ref_nos})
+        # nothing is written by a rejected request
+        self.assertEqual(
+            list(
+                CosmeticComposition.objects.order_by(
+                    "order_in_composition"
+                ).values_list("ingredient_id", flat=True)
+            ),
+            [1, 2],
+        )
+
+    def test_changes(self):
+        self.put([1, 2])
+        response = self.put({"ingredients": [2, 3, 1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data, {"added": 1, "removed": 0, "reordered": 2, "unchanged": 0}
+        )
+        response = self.put([2, "3"])
+        self.assertEqual(
+            response.data, {"added": 0, "removed": 1, "reordered": 0, "unchanged": 2}
+        )
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_ingredients_by_match_kind(self):
+        for ref_no, inci_name, common_name in [
+            (1, "GLYCERIN", ""),
+            (2, "POLYGLYCERIN-3", ""),
+            (3, "GLYCERINE SOAP", ""),
+            (4, "AQUA", "Woda"),
+            (5, "PROPANETRIOL", "Glycerin"),
+        ]:
+            IngredientINCI.objects.create(
+                cosing_ref_no=ref_no, inci_name=inci_name, common_name=common_name
+            )
+        response = self.client.get("/api/ingredients/", {"search": "glycerin"})
+        self.assertEqual(
+            [row["cosing_ref_no"] for row in response.data["results"]],
+            # exact (INCI or common name), prefix, substring
+            [1, 5, 3, 2],
+        )
+
+    def test_cosmetics_by_match_kind(self):
+        for n, product_name in enumerate(
+            ["Nawilżający krem", "Krem do rąk", "Balsam", "Krem"], 1
+        ):
+            Cosmetic.objects.create(
+                barcode=f"590000000000{n}",
+                product_name=product_name,
+                manufacturer="Producent",
+                category="face",
+            )
+        response = self.client.get("/api/cosmetics/", {"query": "krem"})
+        self.assertEqual(
+            [row["barcode"] for row in response.data["results"]],
+            ["5900000000004", "5900000000002", "5900000000001"],
+        )
+        self.assertEqual(response["X-Total-Count"], "3")
+        self.assertEqual(response["X-Total-Count-Exact"], "true")
+
+    def test_barcode_query(self):
+        for barcode, product_name in [
+            ("5900000000013", "Krem"),
+            ("4000000000001", "Krem 590000000001"),
+            ("590000000001", "Balsam"),
+            ("5900000000012", "Tonik"),
+        ]:
+            Cosmetic.objects.create(
+                barcode=barcode,
+                product_name=product_name,
+                manufacturer="Producent",
+                category="face",
+            )
+        response = self.client.get("/api/cosmetics/", {"query": " 590000000001 "})
+        # the exact barcode, then the longer ones it prefixes; names are not searched
+        self.assertEqual(
+            [row["barcode"] for row in response.data["results"]],
+            ["590000000001", "5900000000012", "5900000000013"],
+        )
+        self.assertEqual(response["X-Total-Count"], "3")
+
+
+class PaginationTests(APITestCase):
+    MAX_ROWS = 5000
+
+    def setUp(self):
+        cache.clear()
+
+    def follow(self, url, link="next"):
+        """Rows of every page from `url` on following the `link` cursors, and
+        the last response."""
+        rows = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            rows += response.data["results"]
+            url = response.data[link]
+            self.assertLess(len(rows), self.MAX_ROWS, "the cursors do not end")
+        return rows, response
+
+    def test_ranked_search_pages_past_ties(self):
+        # more rows share the match rank than CursorPagination.offset_cutoff
+        IngredientINCI.objects.bulk_create(
+            IngredientINCI(cosing_ref_no=n, inci_name=f"AQUA {n}")
+            for n in range(1, 1501)
+        )
+        rows, last = self.follow("/api/ingredients/?search=aqua&page_size=200")
+        ref_nos = [row["cosing_ref_no"] for row in rows]
+        self.assertEqual(len(set(ref_nos)), len(ref_nos))
+        self.assertEqual(len(ref_nos), 1500)
+        # shortest names first, the ref no breaking ties
+        self.assertEqual(ref_nos[:10], list(range(1, 11)))
+
+        rows, first = self.follow(last.data["previous"], "previous")
+        self.assertEqual({row["cosing_ref_no"] for row in rows}, set(ref_nos[:1400]))
+        self.assertEqual(first.data["results"][0]["cosing_ref_no"], 1)
+
+    @skipUnless(connection.vendor == "postgresql", "needs pg_trgm")
+    def test_similarity_pages_past_ties(self):
+        # every row has the same, inexact trigram similarity to the query
+        IngredientINCI.objects.bulk_create(
+            IngredientINCI(cosing_ref_no=n, inci_name="AQUA ROSAE")
+            for n in range(1, 451)
+        )
+        rows, _ = self.follow("/api/ingredients/?search=rosa&page_size=50")
+        self.assertEqual(
+            [row["cosing_ref_no"] for row in rows], list(range(1, 451))
+        )
+
+    def test_cosmetic_search_pages_past_ties(self):
+        Cosmetic.objects.bulk_create(
+            Cosmetic(
+                barcode=f"{n:013d}",
+                product_name="Krem",
+                manufacturer="Producent",
+                category="face",
+            )
+            for n in range(1, 1501)
+        )
+        rows, _ = self.follow("/api/cosmetics/?query=krem&page_size=200")
+        self.assertEqual(len({row["barcode"] for row in rows}), 1500)
+
+    def test_summary_ordering_pages_past_ties(self):
+        # cosmetics without a summary row all score 0
+        Cosmetic.objects.bulk_create(
+            Cosmetic(
+                barcode=f"{n:013d}",
+                product_name=f"Krem {n}",
+                manufacturer="Producent",
+                category="face",
+            )
+            for n in range(1, 1501)
+        )
+        for ordering in ("safety_score", "-harmful_count"):
+            rows, _ = self.follow(f"/api/cosmetics/?ordering={ordering}&page_size=200")
+            barcodes = [row["barcode"] for row in rows]
+            self.assertEqual(barcodes, sorted(set(barcodes)), ordering)
+            self.assertEqual(len(barcodes), 1500, ordering)
+
+    def test_compositions_in_inci_order(self):
+        cosmetic = Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+        )
+        for n, order in ((1, 3), (2, 1), (3, 2)):
+            CosmeticComposition.objects.create(
+                cosmetic=cosmetic,
+                ingredient=IngredientINCI.objects.create(
+                    cosing_ref_no=n, inci_name=f"INGREDIENT {n}"
+                ),
+                order_in_composition=order,
+            )
+        rows, _ = self.follow(
+            f"/api/cosmetic_compositions/?cosmetic={cosmetic.barcode}&page_size=2"
+        )
+        self.assertEqual([row["order_in_composition"] for row in rows], [1, 2, 3])
+
+        # without an order a row comes last, also across cosmetics
+        CosmeticComposition.objects.filter(order_in_composition=2).update(
+            order_in_composition=None
+        )
+        other = Cosmetic.objects.create(
+            barcode="5900000000002",
+            product_name="Tonik",
+            manufacturer="Producent",
+            category="face",
+        )
+        CosmeticComposition.objects.create(
+            cosmetic=other, ingredient_id=1, order_in_composition=1
+        )
+        rows, _ = self.follow("/api/cosmetic_compositions/?page_size=1")
+        self.assertEqual(
+            [(row["cosmetic"], row["order_in_composition"]) for row in rows],
+            [
+                ("5900000000001", 1),
+                ("5900000000001", 3),
+                ("5900000000001", None),
+                ("5900000000002", 1),
+            ],
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/ingredients/?cursor=cD1bMQ==")
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every list endpoint must run a fixed number of queries per page, no matter
+    how many rows it returns. Each test lists the endpoint with one row, then
+    with a full page, and checks both against the endpoint's budget.
+    """
+
+    # one query for the page; nested objects come from select_related
+    LIST_BUDGET = 1
+    # endpoints with ETags look up the catalog versions first
+    CONDITIONAL_LIST_BUDGET = 2
+    # versions, the cosmetic, then its composition rows
+    COMPOSITION_BUDGET = 3
+    ROWS = 30
+
+    def setUp(self):
+        self.user = self.make_user(0)
+        self.client.force_authenticate(self.user)
+
+    def make_user(self, n):
+        user = User.objects.create(username=f"user{n}", email=f"user{n}@example.com")
+        Person.objects.create(user=user, skin_type="dry")
+        return user
+
+    def make_cosmetic(self, n):
+        return Cosmetic.objects.create(
+            barcode=f"{n:013d}",
+            product_name=f"Krem {n}",
+            manufacturer="Producent",
+            category="face",
+        )
+
+    def make_plan(self, n):
+        return CarePlan.objects.create(
+            user=self.make_user(1000 + n),
+            plan_name=f"Plan {n}",
+            description="",
+            start_date=date(2024, 1, 1),
+        )
+
+    def assertListBudget(self, url, make_row, budget=LIST_BUDGET):
+        make_row(1)
+        with CaptureQueriesContext(connection) as single:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for n in range(2, self.ROWS + 1):
+            make_row(n)
+        with CaptureQueriesContext(connection) as page:
+            response = self.client.get(url)
+        self.assertGreaterEqual(len(response.data["results"]), self.ROWS)
+
+        self.assertLessEqual(len(single), budget, url)
+        self.assertEqual(len(page), len(single), url)
+
+    def test_persons(self):
+        self.assertListBudget("/api/persons/", self.make_user)
+
+    def test_users(self):
+        self.assertListBudget("/api/users/", self.make_user)
+
+    def test_cosmetics(self):
+        self.assertListBudget(
+            "/api/cosmetics/", self.make_cosmetic, self.CONDITIONAL_LIST_BUDGET
+        )
+
+    def test_ingredients(self):
+        self.assertListBudget(
+            "/api/ingredients/",
+            lambda n: IngredientINCI.objects.create(
+                cosing_ref_no=n, inci_name=f"INGREDIENT {n}"
+            ),
+            self.CONDITIONAL_LIST_BUDGET,
+        )
+
+    def test_cosmetic_compositions(self):
+        cosmetic = self.make_cosmetic(0)
+        self.assertListBudget(
+            "/api/cosmetic_compositions/",
+            lambda n: CosmeticComposition.objects.create(
+                cosmetic=cosmetic,
+                ingredient=IngredientINCI.objects.create(
+                    cosing_ref_no=n, inci_name=f"INGREDIENT {n}"
+                ),
+                order_in_composition=n,
+            ),
+        )
+
+    def test_cosmetic_compositions_fieldset(self):
+        cosmetic = self.make_cosmetic(0)
+        self.assertListBudget(
+            "/api/cosmetic_compositions/?fields=ingredient.inci_name",
+            lambda n: CosmeticComposition.objects.create(
+                cosmetic=cosmetic,
+                ingredient=IngredientINCI.objects.create(
+                    cosing_ref_no=n, inci_name=f"INGREDIENT {n}"
+                ),
+                order_in_composition=n,
+            ),
+        )
+
+    def test_reviews(self):
+        self.assertListBudget(
+            "/api/reviews/",
+            lambda n: Review.objects.create(
+                cosmetic=self.make_cosmetic(n),
+                user=self.make_user(n),
+                title="Tytuł",
+                content="",
+                rating=5,
+                review_date=date(2024, 1, 1),
+            ),
+        )
+
+    def test_care_plans(self):
+        self.assertListBudget("/api/care_plans/", self.make_plan)
+
+    def test_care_plan_contents(self):
+        self.assertListBudget(
+            "/api/care_plan_contents/",
+            lambda n: CarePlanContent.objects.create(
+                plan=self.make_plan(n),
+                cosmetic=self.make_cosmetic(n),
+                frequency="daily",
+                time_of_day="morning",
+            ),
+        )
+
+    def test_care_plan_ratings(self):
+        self.assertListBudget(
+            "/api/care_plan_ratings/",
+            lambda n: CarePlanRating.objects.create(
+                plan=self.make_plan(n), user=self.make_user(n), rating=True
+            ),
+        )
+
+    def test_favorite_products(self):
+        self.assertListBudget(
+            "/api/favorite_products/",
+            lambda n: FavoriteProduct.objects.create(
+                user=self.make_user(n), cosmetic=self.make_cosmetic(n)
+            ),
+        )
+
+    def test_cosmetic_composition_detail(self):
+        cosmetic = self.make_cosmetic(0)
+        url = f"/api/cosmetics/{cosmetic.barcode}/composition/"
+
+        def make_row(n):
+            CosmeticComposition.objects.create(
+                cosmetic=cosmetic,
+                ingredient=IngredientINCI.objects.create(
+                    cosing_ref_no=n, inci_name=f"INGREDIENT {n}"
+                ),
+                order_in_composition=n,
+            )
+
+        make_row(1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(url)
+        for n in range(2, self.ROWS + 1):
+            make_row(n)
+        cache.clear()
+        with CaptureQueriesContext(connection) as full:
+            response = self.client.get(url)
+
+        self.assertEqual(len(response.data["ingredients"]), self.ROWS)
+        self.assertLessEqual(len(single), self.COMPOSITION_BUDGET)
+        self.assertEqual(len(full), len(single))
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cosmetic = Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+            description="Opis",
+        )
+        CosmeticComposition.objects.create(
+            cosmetic=cosmetic,
+            ingredient=IngredientINCI.objects.create(
+                cosing_ref_no=1, inci_name="AQUA", action_description="Woda"
+            ),
+            order_in_composition=1,
+        )
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/cosmetics/?fields=barcode,product_name")
+        self.assertEqual(
+            response.data["results"],
+            [{"barcode": "5900000000001", "product_name": "Krem"}],
+        )
+        self.assertNotIn("description", queries[0]["sql"])
+
+    def test_omit(self):
+        response = self.client.get("/api/cosmetics/?omit=description")
+        self.assertNotIn("description", response.data["results"][0])
+        self.assertIn("manufacturer", response.data["results"][0])
+
+    def test_nested_paths(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/cosmetic_compositions/"
+                "?expand=ingredients&fields=id,ingredient.inci_name"
+            )
+        self.assertEqual(
+            response.data["results"][0]["ingredient"], {"inci_name": "AQUA"}
+        )
+        self.assertNotIn("action_description", queries[0]["sql"])
+        self.assertNotIn('JOIN "api_cosmetic"', queries[0]["sql"])
+
+
+class FastPathTests(APITestCase):
+    """The .values() read path must render exactly what the serializers do."""
+
+    URLS = [
+        "/api/cosmetics/",
+        "/api/cosmetics/?query=krem",
+        "/api/cosmetics/5900000000001/",
+        "/api/cosmetics/5900000000001/composition/",
+        "/api/cosmetics/5900000000001/composition/?expand=cosmetic,ingredients",
+        "/api/ingredients/?search=aqua",
+        "/api/ingredients/2/?omit=action_description",
+    ]
+
+    def setUp(self):
+        cosmetic = Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+        )
+        for n, name in enumerate(["AQUA", "GLYCERIN", "AQUA MARIS"], start=1):
+            CosmeticComposition.objects.create(
+                cosmetic=cosmetic,
+                ingredient=IngredientINCI.objects.create(
+                    cosing_ref_no=n, inci_name=name, safety_rating="neutral"
+                ),
+                order_in_composition=n,
+            )
+
+    def test_same_output(self):
+        for url in self.URLS:
+            cache.clear()
+            fast = self.client.get(url)
+            cache.clear()
+            with override_settings(API_FAST_SERIALIZATION=False):
+                slow = self.client.get(url)
+            self.assertEqual(fast.status_code, 200, url)
+            self.assertEqual(fast.content, slow.content, url)
+
+    def test_composition_order_and_fieldsets(self):
+        CosmeticComposition.objects.filter(order_in_composition=1).update(
+            order_in_composition=None
+        )
+        url = "/api/cosmetics/5900000000001/composition/"
+        for fast in (True, False):
+            cache.clear()
+            with override_settings(API_FAST_SERIALIZATION=fast):
+                data = self.client.get(url + "?fields=barcode").data
+            # rows without an order come last; the fieldset does not apply
+            self.assertEqual(
+                [row["inci_name"] for row in data["ingredients"]],
+                ["GLYCERIN", "AQUA MARIS", "AQUA"],
+            )
+            self.assertIn("product_name", data["cosmetic"])
+
+    def test_unknown_fields_only(self):
+        response = self.client.get("/api/ingredients/2/?fields=bogus")
+        self.assertEqual(response.data, {})
+        response = self.client.get("/api/ingredients/?fields=bogus")
+        self.assertEqual(response.data["results"], [{}, {}, {}])
+
+
+class ProductCacheTests(APITestCase):
+    URL = "/api/cosmetics/5900000000001/composition/"
+
+    def setUp(self):
+        cache.clear()
+        self.cosmetic = Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+            is_verified=False,
+        )
+        for n in (1, 2):
+            IngredientINCI.objects.create(
+                cosing_ref_no=n, inci_name=f"INGREDIENT {n}", function="EMOLIENT"
+            )
+
+    def get_ingredients(self):
+        return self.client.get(self.URL).data["ingredients"]
+
+    def test_hit_after_miss(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(self.URL)
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(self.URL)
+        self.assertGreater(len(first), 1)
+        # only the catalog version lookup of the ETag check
+        self.assertEqual(len(second), 1)
+        self.assertEqual(product_cache.stats()["hits"], 1)
+        self.assertEqual(product_cache.stats()["misses"], 1)
+
+    def test_composition_write_invalidates(self):
+        self.assertEqual(self.get_ingredients(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.URL, {"ingredients": [2, 1]}, format="json")
+        self.assertEqual([i["cosing_ref_no"] for i in self.get_ingredients()], [2, 1])
+
+    def test_cosmetic_save_invalidates(self):
+        url = "/api/cosmetics/5900000000001/"
+        self.client.get(url)
+        self.cosmetic.is_verified = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cosmetic.save()
+        self.assertTrue(self.client.get(url).data["is_verified"])
+
+    def test_bulk_ingredient_update_invalidates(self):
+        self.client.put(self.URL, {"ingredients": [1]}, format="json")
+        self.assertEqual(self.get_ingredients()[0]["safety_rating"], "neutral")
+        with self.captureOnCommitCallbacks(execute=True):
+            recalculate_safety_ratings()
+        self.assertEqual(self.get_ingredients()[0]["safety_rating"], "beneficial")
+
+
+class SafetySummaryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for barcode, name in (("5900000000001", "Krem"), ("5900000000002", "Tonik")):
+            Cosmetic.objects.create(
+                barcode=barcode,
+                product_name=name,
+                manufacturer="Producent",
+                category="face",
+                is_verified=False,
+            )
+        for n, rating in enumerate(["harmful", "neutral", "beneficial"], start=1):
+            IngredientINCI.objects.create(
+                cosing_ref_no=n, inci_name=f"INGREDIENT {n}", safety_rating=rating
+            )
+        IngredientINCI.objects.create(
+            cosing_ref_no=4, inci_name="INGREDIENT 4", function="EMOLIENT"
+        )
+
+    def put_composition(self, barcode, ref_nos):
+        self.client.put(
+            f"/api/cosmetics/{barcode}/composition/",
+            {"ingredients": ref_nos},
+            format="json",
+        )
+
+    def summary(self, barcode):
+        return CosmeticSafetySummary.objects.get(cosmetic_id=barcode)
+
+    def test_clean_score(self):
+        self.assertEqual(safety_summary.clean_score(0, 0, 0), 0)
+        self.assertEqual(safety_summary.clean_score(1, 0, 2), 25)
+        # half rounds up, like Math.round on the frontend
+        self.assertEqual(safety_summary.clean_score(1, 0, 4), 13)
+
+    def test_created_with_the_cosmetic(self):
+        summary = self.summary("5900000000001")
+        self.assertEqual(summary.ingredient_count, 0)
+        self.assertEqual(summary.harmful_ingredients, [])
+
+    def test_composition_changes(self):
+        self.put_composition("5900000000001", [3, 1, 2])
+        data = self.client.get("/api/cosmetics/5900000000001/").data
+        self.assertEqual(
+            [data[name] for name in safety_summary.ORDERING_FIELDS], [1, 1, 1, 3, 50]
+        )
+        self.assertEqual(
+            data["harmful_ingredients"],
+            [{"cosing_ref_no": 1, "inci_name": "INGREDIENT 1"}],
+        )
+
+        self.put_composition("5900000000001", [3])
+        self.assertEqual(self.summary("5900000000001").safety_score, 100)
+
+        CosmeticComposition.objects.create(cosmetic_id="5900000000001", ingredient_id=1)
+        self.assertEqual(self.summary("5900000000001").harmful_count, 1)
+
+    def test_composition_moved(self):
+        row = CosmeticComposition.objects.create(
+            cosmetic_id="5900000000001", ingredient_id=1
+        )
+        url = "/api/cosmetics/5900000000001/composition/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/cosmetic_compositions/{row.pk}/",
+                {"cosmetic": "5900000000002"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.summary("5900000000001").ingredient_count, 0)
+        self.assertEqual(self.summary("5900000000002").ingredient_count, 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["ingredients"], [])
+
+    def test_rating_changes(self):
+        self.put_composition("5900000000001", [4])
+        self.assertEqual(self.summary("5900000000001").neutral_count, 1)
+        recalculate_safety_ratings()
+        summary = self.summary("5900000000001")
+        self.assertEqual(summary.neutral_count, 0)
+        self.assertEqual(summary.beneficial_count, 1)
+
+        IngredientINCI.objects.get(pk=4).delete()
+        self.assertEqual(self.summary("5900000000001").ingredient_count, 0)
+
+    def test_filter_and_order(self):
+        self.put_composition("5900000000001", [1, 2])
+        self.put_composition("5900000000002", [2, 3])
+
+        def barcodes(query):
+            response = self.client.get(f"/api/cosmetics/?{query}")
+            self.assertEqual(response.status_code, 200, query)
+            return [row["barcode"] for row in response.data["results"]]
+
+        self.assertEqual(barcodes("max_harmful=0"), ["5900000000002"])
+        self.assertEqual(barcodes("min_score=50"), ["5900000000002"])
+        self.assertEqual(
+            barcodes("ordering=-safety_score"), ["5900000000002", "5900000000001"]
+        )
+        self.assertEqual(
+            barcodes("ordering=safety_score&page_size=1"), ["5900000000001"]
+        )
+
+    def test_invalid_params(self):
+        for query in ("min_score=dużo", "ordering=product_name"):
+            response = self.client.get(f"/api/cosmetics/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+
+class CompositionIndexTests(APITestCase):
+    COMPOSITIONS = {
+        "5900000000001": [1, 2],
+        "5900000000002": [2, 3],
+        "5900000000003": [3],
+    }
+
+    def setUp(self):
+        composition_index.invalidate()
+        for n in (1, 2, 3):
+            IngredientINCI.objects.create(cosing_ref_no=n, inci_name=f"INGREDIENT {n}")
+        for barcode, ref_nos in self.COMPOSITIONS.items():
+            Cosmetic.objects.create(
+                barcode=barcode,
+                product_name="Krem",
+                manufacturer="Producent",
+                category="face",
+            )
+            for ref_no in ref_nos:
+                CosmeticComposition.objects.create(
+                    cosmetic_id=barcode, ingredient_id=ref_no
+                )
+
+    def barcodes(self, query):
+        response = self.client.get(f"/api/cosmetics/?{query}")
+        self.assertEqual(response.status_code, 200, query)
+        return [row["barcode"] for row in response.data["results"]]
+
+    def test_match(self):
+        index = composition_index.CompositionIndex(
+            self.COMPOSITIONS,
+            [(b, r) for b, ref_nos in self.COMPOSITIONS.items() for r in ref_nos],
+        )
+        self.assertEqual(index.match(contains=[2]), ({2}, True))
+        self.assertEqual(index.match(contains=[2, 3]), ({1}, False))
+        self.assertEqual(index.match(excludes=[1]), ({0}, True))
+        self.assertEqual(index.match(contains=[4]), (set(), False))
+
+    def test_filters(self):
+        self.assertEqual(
+            self.barcodes("contains=3"), ["5900000000002", "5900000000003"]
+        )
+        self.assertEqual(self.barcodes("contains=2,3"), ["5900000000002"])
+        self.assertEqual(self.barcodes("excludes=1,2"), ["5900000000003"])
+        self.assertEqual(self.barcodes("contains=3&excludes=2"), ["5900000000003"])
+        response = self.client.get("/api/cosmetics/?contains=aqua")
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters_in_sql(self):
+        with mock.patch.object(composition_index, "MAX_BARCODES", 0):
+            self.test_filters()
+
+    def test_follows_composition_changes(self):
+        self.assertEqual(self.barcodes("contains=1"), ["5900000000001"])
+        CosmeticComposition.objects.create(cosmetic_id="5900000000003", ingredient_id=1)
+        Cosmetic.objects.filter(pk="5900000000002").update(is_verified=False)
+        self.client.force_authenticate(User.objects.create(username="user"))
+        self.client.put(
+            "/api/cosmetics/5900000000002/composition/",
+            {"ingredients": [1]},
+            format="json",
+        )
+        self.assertEqual(
+            self.barcodes("contains=1"),
+            ["5900000000001", "5900000000002", "5900000000003"],
+        )
+        self.assertEqual(self.barcodes("contains=2"), ["5900000000001"])
+
+
+class SimilarProductsTests(APITestCase):
+    COMPOSITIONS = {
+        "5900000000001": range(1, 11),
+        "5900000000002": range(1, 10),  # a dupe
+        "5900000000003": range(2, 12),
+        "5900000000004": range(20, 30),
+    }
+
+    def setUp(self):
+        composition_index.invalidate()
+        IngredientINCI.objects.bulk_create(
+            IngredientINCI(cosing_ref_no=n, inci_name=f"INGREDIENT {n}")
+            for n in range(1, 30)
+        )
+        for barcode, ref_nos in self.COMPOSITIONS.items():
+            Cosmetic.objects.create(
+                barcode=barcode,
+                product_name="Krem",
+                manufacturer="Producent",
+                category="face",
+                is_verified=False,
+            )
+            self.put_composition(barcode, list(ref_nos))
+
+    def put_composition(self, barcode, ref_nos):
+        self.client.put(
+            f"/api/cosmetics/{barcode}/composition/",
+            {"ingredients": ref_nos},
+            format="json",
+        )
+
+    def similar(self, barcode):
+        response = self.client.get(f"/api/cosmetics/{barcode}/similar/")
+        self.assertEqual(response.status_code, 200)
+        return [(row["barcode"], row["similarity"]) for row in response.data]
+
+    def test_most_similar_first(self):
+        self.assertEqual(
+            self.similar("5900000000001"),
+            [("5900000000002", 0.9), ("5900000000003", 0.818)],
+        )
+
+    def test_follows_composition_changes(self):
+        self.similar("5900000000001")
+        self.put_composition("5900000000004", list(range(1, 11)))
+        self.assertEqual(self.similar("5900000000001")[0], ("5900000000004", 1.0))
+
+    def test_changes_cleared_once_applied(self):
+        source = composition_index.CompositionIndex(["a", "b"], [("a", 1), ("b", 2)])
+        index = SimilarityIndex(source)
+        source.update("b", [3])
+        source.update("b", [1])
+        self.assertEqual(source.changes, {1})
+        index.catch_up()
+        self.assertEqual(source.changes, set())
+        self.assertEqual(index.similar("a"), [("b", 1.0)])
+
+    def test_unknown_cosmetic(self):
+        response = self.client.get("/api/cosmetics/5900000000009/similar/")
+        self.assertEqual(response.status_code, 404)
+
+
+class CompatibilityTests(APITestCase):
+    URL = "/api/cosmetics/?annotate=compatibility"
+
+    def setUp(self):
+        user = User.objects.create(username="user")
+        Person.objects.create(
+            user=user, skin_type="Sucha - Wrażliwa", skin_problems="Trądzik"
+        )
+        # as loaded by authentication, without the person cached
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+        for n, function in enumerate(["NAWILŻAJĄCA, HUMEKTANT", "PERFUMUJĄCA"], 1):
+            IngredientINCI.objects.create(
+                cosing_ref_no=n, inci_name=f"INGREDIENT {n}", function=function
+            )
+        for n in range(1, 4):
+            Cosmetic.objects.create(
+                barcode=f"590000000000{n}",
+                product_name="Krem",
+                manufacturer="Producent",
+                category="face",
+            )
+        CosmeticComposition.objects.create(cosmetic_id="5900000000001", ingredient_id=1)
+        CosmeticComposition.objects.create(cosmetic_id="5900000000002", ingredient_id=2)
+
+    def test_parse_profile(self):
+        profile = compatibility.parse_profile(
+            "Tłusta - Wrażliwa", "Trądzik, Zaskórniki"
+        )
+        self.assertEqual(profile.skin_types, ("Tłusta", "Wrażliwa"))
+        self.assertEqual(profile.skin_problems, ("Trądzik", "Zaskórniki"))
+        profile = compatibility.parse_profile("normal", "Brak")
+        self.assertEqual(
+            (profile.skin_types, profile.skin_problems), (("Normalna",), ())
+        )
+        self.assertIs(compatibility.parse_profile("normal", "Brak"), profile)
+
+    def test_scores_a_page_in_one_pass(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.URL)
+        scores = {
+            row["barcode"]: row["compatibility"] for row in response.data["results"]
+        }
+        self.assertEqual(
+            scores, {"5900000000001": 100, "5900000000002": 17, "5900000000003": None}
+        )
+        # the page, the user's profile and the page's ingredients
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn("ETag", response)
+
+    def test_fieldset_without_barcode(self):
+        response = self.client.get(self.URL + "&fields=product_name")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"][:2],
+            [
+                {"product_name": "Krem", "compatibility": 100},
+                {"product_name": "Krem", "compatibility": 17},
+            ],
+        )
+        response = self.client.get(self.URL + "&omit=barcode")
+        self.assertNotIn("barcode", response.data["results"][0])
+        self.assertEqual(response.data["results"][0]["compatibility"], 100)
+
+    def test_without_profile(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(self.URL)
+        self.assertEqual(
+            [row["compatibility"] for row in response.data["results"]], [None] * 3
+        )
+
+    def test_unknown_annotation(self):
+        response = self.client.get("/api/cosmetics/?annotate=price")
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.cosmetic = Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+        )
+        IngredientINCI.objects.create(cosing_ref_no=1, inci_name="AQUA")
+
+    def test_not_modified_before_any_query(self):
+        url = "/api/ingredients/?search=aqua"
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        # only the version lookup
+        self.assertEqual(len(queries), 1)
+
+    def test_etag_changes_with_the_data(self):
+        url = f"/api/cosmetics/{self.cosmetic.barcode}/"
+        etag = self.client.get(url)["ETag"]
+        other = self.client.get("/api/cosmetics/5900000000002/")
+        self.assertEqual(other.status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.cosmetic.product_name = "Krem nawilżający"
+        self.cosmetic.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_catalog_version_covers_compositions(self):
+        url = f"/api/cosmetics/{self.cosmetic.barcode}/composition/"
+        etag = self.client.get(url)["ETag"]
+        recalculate_safety_ratings()
+        IngredientINCI.objects.filter(pk=1).update(function="EMOLIENT")
+        recalculate_safety_ratings()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.client.get("/api/cosmetics/")
+        response = self.client.get(
+            "/api/cosmetics/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # modified later within the same second as the header's date
+        modified_at = datetime(2026, 1, 1, 12, 0, 0, 999999, tzinfo=timezone.utc)
+        CatalogVersion.objects.update(modified_at=modified_at)
+        response = self.client.get(
+            "/api/cosmetics/",
+            HTTP_IF_MODIFIED_SINCE="Thu, 01 Jan 2026 12:00:00 GMT",
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Last-Modified"], "Thu, 01 Jan 2026 12:00:00 GMT")
+
+
+class MetricsTests(APITestCase):
+    URL = "/api/metrics/"
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user("admin", password="x", is_staff=True)
+        Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+        )
+
+    def sample(self, line_prefix):
+        for line in metrics.render().splitlines():
+            if line.startswith(line_prefix + " "):
+                return float(line.rsplit(" ", 1)[1])
+        return 0.0
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.URL).status_code, 401)
+        self.client.force_authenticate(User.objects.create_user("user", password="x"))
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            "# TYPE api_request_duration_seconds histogram", response.content.decode()
+        )
+
+    def test_request_recorded(self):
+        labels = '{route="cosmetic-list",method="GET",action="list"'
+        requests = 'api_requests_total%s,status="200"}' % labels
+        count = "api_request_duration_seconds_count%s}" % labels
+        queries = "api_request_db_queries_sum%s}" % labels
+        before = [self.sample(name) for name in (requests, count, queries)]
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/cosmetics/")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.sample(requests), before[0] + 1)
+        self.assertEqual(self.sample(count), before[1] + 1)
+        self.assertEqual(self.sample(queries), before[2] + len(captured))
+        self.assertGreater(self.sample("api_response_size_bytes_sum%s}" % labels), 0)
+
+    def test_serializer_time(self):
+        labels = '{route="user-detail",method="GET",action="retrieve"}'
+        name = "api_request_serializer_seconds_sum" + labels
+        before = self.sample(name)
+        self.client.force_authenticate(self.staff)
+        self.client.get(f"/api/users/{self.staff.pk}/")
+        self.assertGreater(self.sample(name), before)
+
+
+class ProfilerTests(APITestCase):
+    URL = "/api/cosmetics/5900000000001/"
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user("admin", password="x", is_staff=True)
+        Cosmetic.objects.create(
+            barcode="5900000000001",
+            product_name="Krem",
+            manufacturer="Producent",
+            category="face",
+        )
+
+    def test_ignored_for_other_users(self):
+        response = self.client.get(self.URL + "?_profile=1")
+        self.assertEqual(response.data["barcode"], "5900000000001")
+        self.client.force_authenticate(User.objects.create_user("user", password="x"))
+        response = self.client.get(self.URL, HTTP_X_PROFILE="1")
+        self.assertNotIn("profile", response.data)
+
+    def test_report(self):
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.URL + "?_profile=1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["response"]["barcode"], "5900000000001")
+        profile = data["profile"]
+        self.assertEqual(profile["sql"]["count"], len(queries))
+        self.assertEqual(len(profile["sql"]["statements"]), len(queries))
+        self.assertLessEqual(len(profile["functions"]), profiling.PROFILE_TOP)
+        self.assertIsNotNone(profile["render_ms"])
+        self.assertIsNotNone(profile["serializer_ms"])
+
+    def test_not_cached(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(self.URL, HTTP_X_PROFILE="1")
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(response["Cache-Control"], "no-store")
+        self.assertIn("ETag", self.client.get(self.URL))
+
+    def test_header_and_browsable_api(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(
+            self.URL, HTTP_X_PROFILE="1", HTTP_ACCEPT="text/html"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("cumulative_ms", response.content.decode())
+
+    def test_duplicates(self):
+        profile = profiling.RequestProfile()
+        profile.statements = [
+            ("SELECT a WHERE id = %s", (1,), False, 0.001),
+            ("SELECT a WHERE id = %s", (2,), False, 0.001),
+            ("SELECT a WHERE id = %s", (1,), False, 0.001),
+            ("SELECT b", (), False, 0.001),
+        ]
+        sql = profile.sql()
+        self.assertEqual(sql["duplicates"], 1)
+        self.assertEqual(
+            [(row["sql"], row["count"]) for row in sql["repeated"]],
+            [("SELECT a WHERE id = %s", 3)],
+        )
+        self.assertEqual([row["occurrence"] for row in sql["statements"]], [1, 1, 2, 1])
+
+
+class LoadCosingTests(APITestCase):
+    CSV = (
+        "COSING Ref No,INCI name,INN name,Ph. Eur. Name,"
+        "Chem/IUPAC Name / Description,Restriction,Function,Update Date\n"
+        "1,AQUA,,,Water,,SOLVENT,01/01/2020\n"
+        "2,GLYCERIN,,,,,HUMEKTANT,01/01/2020\n"
+        "x,BROKEN,,,,,,\n"
+        "3,FORMALDEHYDE,,,,V/5,KONSERWUJĄCA,01/01/2020\n"
+    )
+
+    def load(self, content, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            out = StringIO()
+            call_command("load_cosing", f.name, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_load(self):
+        output = self.load(self.CSV)
+        self.assertIn("rows/s", output)
+        self.assertIn("3 inserted", output)
+        self.assertIn("1 rejected", output)
+        self.assertEqual(
+            dict(IngredientINCI.objects.values_list("pk", "safety_rating")),
+            {1: "neutral", 2: "beneficial", 3: "harmful"},
+        )
+
+        output = self.load(self.CSV.replace("Water", "Woda"))
+        self.assertIn("0 inserted, 1 updated, 2 unchanged", output)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_matches_batched(self):
+        content = self.CSV + (
+            "\n"
+            '4,"ING\n4",,,,,EMOLIENT\n'
+            "5,ING 5\n"
+            "6,\u00a0ING 6\x0b,INN 6\u2003,,,,EMOLIENT,01/01/2020,extra\n"
+            ",,,,,,,\n"
+            "y,BROKEN,,,,,,\n"
+            "1,AQUA,,,Woda,,SOLVENT,01/01/2020\n"
+        )
+
+        def load(importer):
+            with tempfile.NamedTemporaryFile("w+b", suffix=".csv") as f:
+                f.write(content.encode("utf-8"))
+                f.flush()
+                f.seek(0)
+                stats = importer(f).as_dict()
+            del stats["timings"]
+            rows = list(IngredientINCI.objects.order_by("pk").values())
+            IngredientINCI.objects.all().delete()
+            return stats, rows
+
+        copied = load(cosing_copy.load)
+        batched = load(lambda f: import_cosing_file(f.name, workers=1))
+        self.assertEqual(copied, batched)
+        stats, rows = copied
+        self.assertEqual((stats["rejected"], stats["skipped"]), (2, 1))
+        # counted in lines of the file, past the record spanning two
+        self.assertEqual([sample["line"] for sample in stats["error_samples"]], [4, 12])
+        # trimmed like str.strip(), missing columns read as empty
+        self.assertEqual(
+            [(row["inci_name"], row["common_name"]) for row in rows[3:]],
+            [("ING\n4", ""), ("ING 5", ""), ("ING 6", "INN 6")],
+        )
+        self.assertEqual(rows[0]["action_description"], "Woda")
+
+        # a second load in the same transaction
+        self.load(content)
+        self.assertIn("0 inserted, 0 updated, 6 unchanged", self.load(content))
+
+    def test_split_ranges_respects_quoted_newlines(self):
+        data = b'h\n1,"a\nb"\n2,c\n3,"d\n\ne"\n4,f\n'
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            ranges = list(cosing.split_ranges(f, 2, 4, first_line=2))
+        self.assertEqual(ranges[0][0], 2)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end, _), (start, _, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+        records = [data[start:end] for start, end, _ in ranges]
+        self.assertEqual(b"".join(records), data[2:])
+        for record in records:
+            self.assertEqual(record.count(b'"') % 2, 0)
+        # line numbers count the newlines inside quoted fields
+        self.assertEqual(
+            [line for _, _, line in ranges],
+            [2 + data[2:start].count(b"\n") for start, _, _ in ranges],
+        )
+
+    def test_parallel_import_matches_sequential(self):
+        content = self.CSV + "".join(
+            f'{n},"ING {n}",,,"opis\nw dwóch liniach",,EMOLIENT,01/01/2020\n'
+            for n in range(4, 200)
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            stats = import_cosing_file(f.name, workers=2, chunk_bytes=512)
+            expected = list(IngredientINCI.objects.order_by("pk").values())
+            IngredientINCI.objects.all().delete()
+            sequential = import_cosing_file(f.name, workers=1)
+        self.assertEqual(
+            stats.as_dict(),
+            {**sequential.as_dict(), "timings": stats.as_dict()["timings"]},
+        )
+        self.assertEqual(stats.bytes_read, sequential.bytes_read)
+        self.assertEqual(list(IngredientINCI.objects.order_by("pk").values()), expected)
@@ -11,7 +11,9 @@ from .views import (
     CarePlanContentViewSet,
     CarePlanRatingViewSet,
     FavoriteProductViewSet,
+    ImportJobViewSet,
     import_cosing_view,
+    metrics_view,
 )
 
 router = DefaultRouter()
@@ -25,8 +27,10 @@ router.register(r"care_plans", CarePlanViewSet)
 router.register(r"care_plan_contents", CarePlanContentViewSet)
 router.register(r"care_plan_ratings", CarePlanRatingViewSet)
 router.register(r"favorite_products", FavoriteProductViewSet)
+router.register(r"import_jobs", ImportJobViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
     path("import_cosing/", import_cosing_view, name="import_cosing"),
+    path("metrics/", metrics_view, name="metrics"),
 ]
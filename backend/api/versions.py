@@ -0,0 +1,42 @@
+"""
+Catalog version counters (CatalogVersion rows) behind the API's ETags.
+
+CATALOG is bumped whenever ingredients change (COSING import, safety
+recalculation, single edits), COSMETICS whenever any cosmetic or composition
+changes (the list shows the safety summaries), and
+cosmetic_key(barcode) when that cosmetic or its composition changes.
+Bumps run in the writer's transaction, so a version never gets ahead of or
+behind the data it describes.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion
+
+CATALOG = "catalog"
+COSMETICS = "cosmetics"
+
+
+def cosmetic_key(barcode):
+    return f"cosmetic:{barcode}"
+
+
+def bump(*keys):
+    keys = sorted(set(keys))
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(key=key) for key in keys], ignore_conflicts=True
+    )
+    CatalogVersion.objects.filter(key__in=keys).update(
+        version=F("version") + 1, modified_at=timezone.now()
+    )
+
+
+def get(*keys):
+    """{key: (version, modified_at)}; keys never bumped are left out."""
+    return {
+        key: (version, modified_at)
+        for key, version, modified_at in CatalogVersion.objects.filter(
+            key__in=keys
+        ).values_list("key", "version", "modified_at")
+    }
@@ -1,5 +1,7 @@
+import logging
+
 from rest_framework import viewsets, status
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.decorators import (
     action,
     api_view,
@@ -7,11 +9,28 @@ from rest_framework.decorators import (
     parser_classes,
 )
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
-from django.db.models import Q
-import csv
-import re
+from django.http import HttpResponse
+from . import (
+    autocomplete,
+    compatibility,
+    composition_index,
+    fastpath,
+    metrics,
+    product_cache,
+    safety_summary,
+    similarity,
+    versions,
+)
+from .catalog import recalculate_safety_ratings
+from .conditional import ConditionalGetMixin
+from .fieldsets import FieldsetQuerysetMixin, get_fieldsets, require_field
+from .compositions import InvalidComposition, parse_ref_nos, replace_composition
+from .jobs import submit_cosing_import
+from .signals import cosmetics_changed
+from .search import count_hits, search_cosmetics, search_ingredients
 from .models import (
     Person,
     Cosmetic,
@@ -22,106 +41,116 @@ from .models import (
     CarePlanContent,
     CarePlanRating,
     FavoriteProduct,
+    ImportJob,
+    INCI_ORDER,
 )
 from django.views.decorators.csrf import csrf_exempt
 from .serializers import (
     PersonSerializer,
     UserSerializer,
     CosmeticSerializer,
+    CosmeticSummarySerializer,
     IngredientINCISerializer,
     CosmeticCompositionSerializer,
     CosmeticCompositionReadSerializer,
+    CosmeticCompositionCompactSerializer,
+    COMPOSITION_EXPAND,
+    serialize_composition,
     ReviewSerializer,
     CarePlanSerializer,
     CarePlanContentSerializer,
     CarePlanRatingSerializer,
     FavoriteProductSerializer,
+    ImportJobSerializer,
 )
 
-
-def parse_restriction_description(restriction_text):
-    if not restriction_text or restriction_text.strip() == "":
-        return ""
-
-    annexes = {
-        "II": "Substancja zakazana w kosmetykach UE",
-        "III": "Dozwolona warunkowo z ograniczeniami stężenia",
-        "IV": "Dozwolony barwnik z określonymi warunkami użycia",
-        "V": "Dozwolony konserwant z limitami stężeń",
-        "VI": "Dozwolony filtr UV z ograniczeniami użycia",
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+SIMILAR_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+# ?annotate= values of the cosmetic lists
+COSMETIC_ANNOTATIONS = ["compatibility"]
+
+# ?min_<name>= / ?max_<name>= filters of the cosmetic list
+SUMMARY_FILTERS = {
+    "score": "safety_score",
+    "harmful": "harmful_count",
+    "neutral": "neutral_count",
+    "beneficial": "beneficial_count",
+    "ingredients": "ingredient_count",
+}
+
+
+def get_int_param(request, name):
+    value = request.query_params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Expected an integer."})
+
+
+def get_ref_nos_param(request, name):
+    """Parse ?name=1,2 into a list of COSING Ref Nos."""
+    values = [v.strip() for v in request.query_params.get(name, "").split(",")]
+    try:
+        return [int(value) for value in values if value]
+    except ValueError:
+        raise ValidationError({name: "Expected comma separated COSING Ref Nos."})
+
+
+def get_annotations(request):
+    """Parse ?annotate=a,b into a set, rejecting names not in COSMETIC_ANNOTATIONS."""
+    names = {
+        name.strip()
+        for name in request.query_params.get("annotate", "").split(",")
+        if name.strip()
     }
-
-    roman_numerals = re.findall(r"\b(I{1,3}|IV|V|VI)\b", restriction_text)
-
-    descriptions = []
-    for numeral in set(roman_numerals):
-        if numeral in annexes:
-            descriptions.append(annexes[numeral])
-
-    return "; ".join(descriptions) if descriptions else ""
-
-
-def evaluate_ingredient_safety(function_text, restrictions):
-    if restrictions and restrictions.strip():
-        return "harmful"
-
-    if not function_text:
-        return "neutral"
-
-    beneficial_functions = {
-        "ŚCIERAJĄCA",
-        "ZŁUSZCZAJĄCA",
-        "ANTI-DANDRUFF",
-        "PRZECIWŁOJOTOKOWA",
-        "REGULUJĄCA WYDZIELANIE SEBUM",
-        "PRZECIWDROBNOUSTROJOWA",
-        "PRZECIWUTLENIAJĄCA",
-        "ANTYOKSYDANT",
-        "ŚCIĄGAJĄCA",
-        "WYBIELAJĄCA",
-        "ROZJAŚNIAJĄCA",
-        "ZMIĘKCZAJĄCA",
-        "WYGŁADZAJĄCA",
-        "EMOLIENT",
-        "KONDYCJONUJĄCA WŁOSY",
-        "DO SKRĘCANIA LUB PROSTOWANIA WŁOSÓW",
-        "NAWILŻAJĄCA",
-        "HUMEKTANT",
-        "KERATOLITYCZNA",
-        "ODŻYWIAJĄCA PAZNOKCIE",
-        "DO PIELĘGNACJI JAMY USTNEJ",
-        "UTLENIAJĄCA",
-        "REDUKUJĄCA",
-        "ODŚWIEŻAJĄCA",
-        "KONDYCJONUJĄCA SKÓRĘ",
-        "KONDYCJONUJĄCA SKÓRĘ - ZMIĘKCZAJĄCA",
-        "KONDYCJONUJĄCA SKÓRĘ - NAWILŻAJĄCA",
-        "KONDYCJONUJĄCA SKÓRĘ - HUMEKTANT",
-        "KONDYCJONUJĄCA SKÓRĘ - OGÓLNE",
-        "KONDYCJONUJĄCA SKÓRĘ - OKLUZYJNA",
-        "CHRONIĄCA SKÓRĘ",
-        "ŁAGODZĄCA",
-        "OPALAJĄCA",
-        "TONIZUJĄCA",
-        "ABSORBUJĄCA UV",
-        "FILTR UV",
+    unknown = names - set(COSMETIC_ANNOTATIONS)
+    if unknown:
+        raise ValidationError(
+            {
+                "annotate": f"Unknown values {sorted(unknown)}, use {COSMETIC_ANNOTATIONS}."
+            }
+        )
+    return names
+
+
+def add_compatibility(request, rows, drop_barcode=False):
+    """
+    Set "compatibility" on serialized cosmetic rows for the requesting user's
+    skin profile (None without a profile), scoring the whole page at once.
+    The rows must have their barcode (see fieldsets.require_field), which is
+    removed afterwards with `drop_barcode`.
+    """
+    profile = compatibility.get_profile(request.user)
+    scores = {}
+    if profile is not None:
+        scores = compatibility.score_cosmetics(
+            profile, [row["barcode"] for row in rows]
+        )
+    for row in rows:
+        row["compatibility"] = scores.get(row["barcode"])
+        if drop_barcode:
+            del row["barcode"]
+
+
+def get_expand(request):
+    """Parse ?expand=a,b into a set, rejecting names not in COMPOSITION_EXPAND."""
+    expand = {
+        name.strip()
+        for name in request.query_params.get("expand", "").split(",")
+        if name.strip()
     }
-
-    functions = re.split(r"[,;/\|]", function_text.upper())
-    functions = [f.strip() for f in functions if f.strip()]
-
-    beneficial_count = 0
-    total_count = len(functions)
-
-    for func in functions:
-        if func in beneficial_functions:
-            beneficial_count += 1
-
-    # if >= 50% of functions are beneficial, mark as beneficial
-    if total_count > 0 and beneficial_count / total_count >= 0.5:
-        return "beneficial"
-
-    return "neutral"
+    unknown = expand - set(COMPOSITION_EXPAND)
+    if unknown:
+        raise ValidationError(
+            {"expand": f"Unknown values {sorted(unknown)}, use {COMPOSITION_EXPAND}."}
+        )
+    return expand
 
 
 # importing COSING.csv
@@ -136,52 +165,42 @@ def import_cosing_view(request):
     file = request.FILES.get("file")
     if not file:
         return Response({"error": "No file provided."}, status=400)
-    decoded_file = file.read().decode("utf-8").splitlines()
-    reader = csv.DictReader(decoded_file)
-    count = 0
-    for row in reader:
-        try:
-            cosing_ref_no = int(row["COSING Ref No"].strip())
-            inci_name = row["INCI name"].strip()
-            common_name = (
-                row.get("INN name", "").strip() or row.get("Ph. Eur. Name", "").strip()
-            )
-            action_description = row.get("Chem/IUPAC Name / Description", "").strip()
-            function = row.get("Function", "").strip()
-            restrictions = row.get("Restriction", "").strip()
-            update_date = row.get("Update Date", "").strip()
-
-            # Evaluate safety and parse restrictions
-            safety_rating = evaluate_ingredient_safety(function, restrictions)
-            restriction_description = parse_restriction_description(restrictions)
-
-            IngredientINCI.objects.update_or_create(
-                cosing_ref_no=cosing_ref_no,
-                defaults={
-                    "inci_name": inci_name,
-                    "common_name": common_name,
-                    "action_description": action_description,
-                    "function": function,
-                    "restrictions": restrictions,
-                    "update_date": update_date,
-                    "safety_rating": safety_rating,
-                    "restriction_description": restriction_description,
-                },
-            )
-            count += 1
-        except Exception as e:
-            continue
-    return Response({"success": True, "imported": count})
 
+    # the import itself runs in the background, progress is polled
+    # through /api/import_jobs/<id>/
+    job, created = submit_cosing_import(file, request.user)
+    data = ImportJobSerializer(job).data
+    data["deduplicated"] = not created
+    return Response(
+        data,
+        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+    )
+
+
+# request metrics of this process, for Prometheus
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
-class PersonViewSet(viewsets.ModelViewSet):
+
+class ImportJobViewSet(FieldsetQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    ordering = ("-id",)
+    permission_classes = [IsAdminUser]
+
+
+class PersonViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
+    ordering = ("id",)
 
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = User.objects.select_related("person")
     serializer_class = UserSerializer
+    ordering = ("id",)
     permission_classes = [AllowAny]
 
     @action(detail=False, methods=["post"], permission_classes=[AllowAny])
@@ -288,17 +307,24 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
 
-class CosmeticViewSet(viewsets.ModelViewSet):
+class CosmeticViewSet(
+    ConditionalGetMixin,
+    FieldsetQuerysetMixin,
+    fastpath.ValuesSerializationMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Cosmetic.objects.all()
     serializer_class = CosmeticSerializer
+    ordering = ("barcode",)
     permission_classes = [AllowAny]
+    values_annotations = safety_summary.SUMMARY_FIELDS
 
     def create(self, request, *args, **kwargs):
-        print(f"CosmeticViewSet - received data: {request.data}")
+        logger.debug("Creating cosmetic, received data: %s", request.data)
 
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            print(f"CosmeticViewSet - validation errors: {serializer.errors}")
+            logger.info("Cosmetic rejected, validation errors: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         self.perform_create(serializer)
@@ -310,32 +336,203 @@ class CosmeticViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         search_query = self.request.query_params.get("query", None)
+        category = self.request.query_params.get("category", None)
+
+        if category:
+            queryset = queryset.filter(category=category)
+
         if search_query:
-            queryset = queryset.filter(
-                Q(product_name__icontains=search_query)
-                | Q(barcode__icontains=search_query)
-                | Q(manufacturer__icontains=search_query)
-            )
+            queryset = search_cosmetics(queryset, search_query)
+
+        # ?contains=1,2&excludes=3: all of / none of these ingredients
+        contains = get_ref_nos_param(self.request, "contains")
+        excludes = get_ref_nos_param(self.request, "excludes")
+        if self.action == "list" and (contains or excludes):
+            with composition_index.locked_index() as index:
+                queryset = index.filter_queryset(queryset, contains, excludes)
+
+        if self.action in ("list", "retrieve"):
+            queryset = safety_summary.annotate(queryset)
+            for param, name in SUMMARY_FILTERS.items():
+                minimum = get_int_param(self.request, f"min_{param}")
+                if minimum is not None:
+                    queryset = queryset.filter(**{f"{name}__gte": minimum})
+                maximum = get_int_param(self.request, f"max_{param}")
+                if maximum is not None:
+                    queryset = queryset.filter(**{f"{name}__lte": maximum})
         return queryset
 
-    @action(detail=True, methods=["get", "delete"], permission_classes=[AllowAny])
+    def get_serializer_class(self):
+        if self.action in ("list", "retrieve"):
+            return CosmeticSummarySerializer
+        return CosmeticSerializer
+
+    def get_version_keys(self):
+        barcode = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        # scores for the user's skin profile are not versioned
+        if "compatibility" in get_annotations(self.request):
+            return None
+        # the safety summaries depend on the ingredient ratings
+        if self.action == "list":
+            return [versions.CATALOG, versions.COSMETICS]
+        if self.action == "retrieve":
+            return [versions.CATALOG, versions.cosmetic_key(barcode)]
+        if self.action == "composition":
+            # the composition embeds ingredient fields
+            return [versions.CATALOG, versions.cosmetic_key(barcode)]
+        if self.action == "similar":
+            # any composition change can change the neighbours
+            return [versions.COSMETICS]
+        return None
+
+    def get_ordering(self):
+        # ?ordering=safety_score, -harmful_count, ... (see safety_summary)
+        ordering = self.request.query_params.get("ordering")
+        if ordering:
+            if ordering.lstrip("-") not in safety_summary.ORDERING_FIELDS:
+                raise ValidationError(
+                    {
+                        "ordering": f"Unknown field {ordering!r}, use one of "
+                        f"{safety_summary.ORDERING_FIELDS}."
+                    }
+                )
+            # few distinct values, the barcode makes the cursor position unique
+            return (ordering, "barcode")
+        # search results are paged in relevance order, see search.ranked_search
+        if self.request.query_params.get("query"):
+            return ("-search_rank", "-search_score", "barcode")
+        return self.ordering
+
+    def retrieve(self, request, *args, **kwargs):
+        # sparse fieldsets are not cached, every combination would be an entry
+        if get_fieldsets(request) != (None, None):
+            return super().retrieve(request, *args, **kwargs)
+
+        retrieve = super().retrieve
+        barcode = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return Response(
+            product_cache.get_or_build(
+                barcode, "detail", lambda: retrieve(request, *args, **kwargs).data
+            )
+        )
+
+    @action(detail=True, methods=["get"], permission_classes=[AllowAny])
+    def similar(self, request, pk=None):
+        """
+        Products with the closest INCI lists (Jaccard similarity of the
+        ingredient sets, found through a MinHash/LSH index), most similar
+        first, e.g. to find dupes. ?limit= caps the number of results,
+        ?annotate=compatibility scores them for the user's skin profile.
+        """
+        cosmetic = self.get_object()
+        try:
+            limit = int(request.query_params.get("limit", SIMILAR_LIMIT))
+        except ValueError:
+            limit = SIMILAR_LIMIT
+        limit = max(1, min(limit, SIMILAR_MAX_LIMIT))
+
+        annotations = get_annotations(request)
+        drop_barcode = "compatibility" in annotations and require_field(
+            request, "barcode"
+        )
+        scores = dict(similarity.similar(cosmetic.barcode, limit))
+        cosmetics = Cosmetic.objects.in_bulk(list(scores))
+        results = []
+        for barcode, score in scores.items():
+            # the index may still list a product deleted meanwhile
+            if barcode in cosmetics:
+                data = self.get_serializer(cosmetics[barcode]).data
+                data["similarity"] = round(score, 3)
+                results.append(data)
+        if "compatibility" in annotations:
+            add_compatibility(request, results, drop_barcode)
+        return Response(results)
+
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit/miss counters of the product page cache (admin only)."""
+        return Response(product_cache.stats())
+
+    def list(self, request, *args, **kwargs):
+        annotations = get_annotations(request)
+        # scores are looked up by barcode, whatever the fieldset
+        drop_barcode = "compatibility" in annotations and require_field(
+            request, "barcode"
+        )
+        response = super().list(request, *args, **kwargs)
+        if "compatibility" in annotations:
+            rows = response.data
+            if isinstance(rows, dict):
+                rows = rows["results"]
+            add_compatibility(request, rows, drop_barcode)
+        if request.query_params.get("query"):
+            count, exact = count_hits(self.filter_queryset(self.get_queryset()))
+            response["X-Total-Count"] = count
+            response["X-Total-Count-Exact"] = "true" if exact else "false"
+        return response
+
+    @action(
+        detail=True, methods=["get", "put", "delete"], permission_classes=[AllowAny]
+    )
     def composition(self, request, pk=None):
         """
-        Get or delete composition for a specific cosmetic product.
-        GET: Returns list of ingredients in the cosmetic
+        Get, replace or delete composition for a specific cosmetic product.
+        GET: Returns the cosmetic and its ingredients in INCI order,
+             ?expand=cosmetic,ingredients returns all of their fields;
+             ?fields= and ?omit= do not apply
+        PUT: Replaces the ingredients with {"ingredients": [cosing_ref_no, ...]},
+             given in INCI order (admin, or anyone while the cosmetic is unverified)
         DELETE: Removes all ingredients from the cosmetic (admin)
         """
+        if request.method == "GET":
+            expand = get_expand(request)
+
+            def build():
+                cosmetic = self.get_object()
+                if self.fast_serialization_enabled():
+                    return fastpath.serialize_composition(cosmetic, expand)
+
+                compositions = (
+                    CosmeticComposition.objects.filter(cosmetic=cosmetic)
+                    .select_related("ingredient")
+                    .order_by(INCI_ORDER)
+                )
+                return serialize_composition(cosmetic, compositions, expand)
+
+            kind = "composition:" + ",".join(sorted(expand))
+            return Response(product_cache.get_or_build(pk, kind, build))
+
         cosmetic = self.get_object()
 
-        if request.method == "GET":
-            compositions = (
-                CosmeticComposition.objects.filter(cosmetic=cosmetic)
-                .select_related("ingredient")
-                .order_by("order_in_composition")
-            )
+        if request.method == "PUT":
+            if cosmetic.is_verified and not request.user.is_staff:
+                return Response(
+                    {"error": "Admin privileges required."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
 
-            serializer = CosmeticCompositionReadSerializer(compositions, many=True)
-            return Response(serializer.data)
+            # a bare list, or {"ingredients": [...]}; anything else is
+            # rejected by parse_ref_nos
+            data = request.data
+            if isinstance(data, dict):
+                data = data.get("ingredients")
+            try:
+                change = replace_composition(cosmetic, parse_ref_nos(data))
+            except InvalidComposition as e:
+                return Response(
+                    {"error": str(e), "cosing_ref_nos": e.cosing_ref_nos},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            return Response(
+                {
+                    "added": change.added,
+                    "removed": change.removed,
+                    "reordered": change.reordered,
+                    "unchanged": change.unchanged,
+                },
+                status=status.HTTP_200_OK,
+            )
 
         elif request.method == "DELETE":
             if not request.user.is_authenticated or not request.user.is_staff:
@@ -348,6 +545,10 @@ class CosmeticViewSet(viewsets.ModelViewSet):
             deleted_count = CosmeticComposition.objects.filter(
                 cosmetic=cosmetic
             ).delete()[0]
+            if deleted_count:
+                cosmetics_changed.send(
+                    sender=CosmeticComposition, barcodes=[cosmetic.barcode]
+                )
 
             return Response(
                 {
@@ -377,9 +578,15 @@ class CosmeticViewSet(viewsets.ModelViewSet):
         )
 
 
-class IngredientINCIViewSet(viewsets.ModelViewSet):
+class IngredientINCIViewSet(
+    ConditionalGetMixin,
+    FieldsetQuerysetMixin,
+    fastpath.ValuesSerializationMixin,
+    viewsets.ModelViewSet,
+):
     queryset = IngredientINCI.objects.all()
     serializer_class = IngredientINCISerializer
+    ordering = ("cosing_ref_no",)
     permission_classes = [AllowAny]
 
     def get_queryset(self):
@@ -389,10 +596,7 @@ class IngredientINCIViewSet(viewsets.ModelViewSet):
         safety_filter = self.request.query_params.get("safety", None)
 
         if search_query:
-            queryset = queryset.filter(
-                Q(inci_name__icontains=search_query)
-                | Q(common_name__icontains=search_query)
-            )
+            queryset = search_ingredients(queryset, search_query)
 
         if function_filter:
             queryset = queryset.filter(function__icontains=function_filter)
@@ -402,10 +606,37 @@ class IngredientINCIViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_version_keys(self):
+        if self.action in ("list", "retrieve", "autocomplete"):
+            return [versions.CATALOG]
+        return None
+
+    def get_ordering(self):
+        if self.request.query_params.get("search"):
+            return ("-search_rank", "-search_score", "cosing_ref_no")
+        return self.ordering
+
+    @action(detail=False, methods=["get"], permission_classes=[AllowAny])
+    def autocomplete(self, request):
+        """
+        Ingredient name suggestions for ?q=, served from an in-memory index.
+        Returns only cosing_ref_no, inci_name, common_name, function and
+        safety_rating.
+        """
+        try:
+            limit = int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+        limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+
+        index = autocomplete.get_index()
+        return Response(index.lookup(request.query_params.get("q", ""), limit))
+
     @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
     def recalculate_safety(self, request):
         """
-        Recalculate safety ratings for all existing ingredients (admin only)
+        Recalculate safety ratings for all existing ingredients (admin only).
+        Pass dry_run=true to get the changes without writing them.
         """
         if not request.user.is_authenticated or not request.user.is_staff:
             return Response(
@@ -413,79 +644,85 @@ class IngredientINCIViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        updated_count = 0
-        ingredients = IngredientINCI.objects.all()
-
-        for ingredient in ingredients:
-            old_rating = ingredient.safety_rating
-            new_rating = evaluate_ingredient_safety(
-                ingredient.function, ingredient.restrictions
+        dry_run = str(
+            request.data.get("dry_run", request.query_params.get("dry_run", ""))
+        ).lower() in ("1", "true", "yes")
+        result = recalculate_safety_ratings(dry_run=dry_run)
+
+        response = {
+            "message": f"Updated safety ratings for {result.updated} ingredients.",
+            "updated_count": result.updated,
+            "total_count": result.total,
+            "dry_run": dry_run,
+            "seconds": round(result.seconds, 3),
+        }
+        if dry_run:
+            response["message"] = (
+                f"Safety ratings would change for {result.updated} ingredients."
             )
-            new_restriction_desc = parse_restriction_description(
-                ingredient.restrictions
-            )
-
-            if (
-                old_rating != new_rating
-                or ingredient.restriction_description != new_restriction_desc
-            ):
-                ingredient.safety_rating = new_rating
-                ingredient.restriction_description = new_restriction_desc
-                ingredient.save()
-                updated_count += 1
+            response["changes"] = result.changes
+        return Response(response, status=status.HTTP_200_OK)
 
-        return Response(
-            {
-                "message": f"Updated safety ratings for {updated_count} ingredients.",
-                "updated_count": updated_count,
-                "total_count": ingredients.count(),
-            },
-            status=status.HTTP_200_OK,
-        )
 
-
-class CosmeticCompositionViewSet(viewsets.ModelViewSet):
+class CosmeticCompositionViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
     queryset = CosmeticComposition.objects.select_related(
         "cosmetic", "ingredient"
     ).all()
     serializer_class = CosmeticCompositionSerializer
+    # INCI order within each cosmetic, see INCI_ORDER and its index
+    ordering = ("cosmetic_id", "inci_order", "id")
     permission_classes = [AllowAny]
 
     def get_serializer_class(self):
         # different serializers for read and write operations
         if self.action in ["list", "retrieve"]:
-            return CosmeticCompositionReadSerializer
+            if get_expand(self.request):
+                return CosmeticCompositionReadSerializer
+            return CosmeticCompositionCompactSerializer
         return CosmeticCompositionSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().annotate(inci_order=INCI_ORDER)
         barcode = self.request.query_params.get("cosmetic", None)
         if barcode:
             queryset = queryset.filter(cosmetic__barcode=barcode)
 
-        return queryset.order_by("order_in_composition", "ingredient__inci_name")
+        return queryset
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        cosmetics_changed.send(
+            sender=CosmeticComposition, barcodes=[instance.cosmetic_id]
+        )
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+class ReviewViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.select_related("cosmetic", "user__person")
     serializer_class = ReviewSerializer
+    ordering = ("id",)
 
 
-class CarePlanViewSet(viewsets.ModelViewSet):
-    queryset = CarePlan.objects.all()
+class CarePlanViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = CarePlan.objects.select_related("user__person")
     serializer_class = CarePlanSerializer
+    ordering = ("id",)
 
 
-class CarePlanContentViewSet(viewsets.ModelViewSet):
-    queryset = CarePlanContent.objects.all()
+class CarePlanContentViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = CarePlanContent.objects.select_related("plan__user__person", "cosmetic")
     serializer_class = CarePlanContentSerializer
+    ordering = ("id",)
 
 
-class CarePlanRatingViewSet(viewsets.ModelViewSet):
-    queryset = CarePlanRating.objects.all()
+class CarePlanRatingViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = CarePlanRating.objects.select_related(
+        "plan__user__person", "user__person"
+    )
     serializer_class = CarePlanRatingSerializer
+    ordering = ("id",)
 
 
-class FavoriteProductViewSet(viewsets.ModelViewSet):
-    queryset = FavoriteProduct.objects.all()
+class FavoriteProductViewSet(FieldsetQuerysetMixin, viewsets.ModelViewSet):
+    queryset = FavoriteProduct.objects.select_related("user__person", "cosmetic")
     serializer_class = FavoriteProductSerializer
+    ordering = ("id",)
@@ -39,6 +39,8 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
 }
 
 SIMPLE_JWT = {
@@ -55,12 +57,15 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "api",
     "rest_framework",
     "corsheaders",
 ]
 
 MIDDLEWARE = [
+    # first, so that the time of the other middleware is measured as well
+    "api.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -69,6 +74,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # staff-only ?_profile=1, after authentication for the session user
+    "api.profiling.ProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "backend.urls"
@@ -153,3 +160,43 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5174",
 ]
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ["X-Total-Count", "X-Total-Count-Exact"]
+
+# Product page cache, autocomplete generations. With several server
+# processes point this at a shared backend (e.g. a FileBasedCache directory)
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Serve read-only list/retrieve of flat serializers from .values() rows
+API_FAST_SERIALIZATION = True
+
+# Uploaded COSING files waiting for (or being processed by) an import job
+COSING_IMPORT_DIR = BASE_DIR / "cosing_imports"
+# Processes parsing an import in parallel; empty means one per CPU
+COSING_IMPORT_WORKERS = int(os.getenv("COSING_IMPORT_WORKERS") or 0) or None
+
+# Logs of the api app go to stderr; API_LOG_LEVEL=DEBUG adds request data
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        },
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "default"},
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["console"],
+            "level": os.getenv("API_LOG_LEVEL", "INFO"),
+        },
+    },
+}
@@ -14,6 +14,7 @@ sudo service postgresql start &
 # Migracje bazy danych
 python manage.py makemigrations
 python manage.py migrate
+python manage.py rebuild_safety_summaries
 
 # Uruchomienie serwera backendowego Django
 python manage.py runserver 0.0.0.0:8000 &
@@ -1,27 +1,67 @@
 import { Button } from "@/components/ui/button";
 import { Upload } from "lucide-react";
-import { useRef } from "react";
+import { useRef, useState } from "react";
 import api from "@/api/api";
 import { useIsAdmin } from "@/hooks/useIsAdmin";
 
+interface ImportJob {
+  id: number;
+  status: "queued" | "running" | "succeeded" | "failed";
+  progress: number;
+  rows_read: number;
+  inserted: number;
+  updated: number;
+  rejected: number;
+  error?: string;
+}
+
+const POLL_INTERVAL_MS = 2000;
+
 export default function ImportCosingButton() {
   const fileInputRef = useRef<HTMLInputElement>(null);
   const { isAdmin, isLoading } = useIsAdmin();
+  const [progress, setProgress] = useState<number | null>(null);
 
   if (isLoading || !isAdmin) {
     return null;
   }
 
+  const waitForJob = async (jobId: number): Promise<ImportJob> => {
+    while (true) {
+      const response = await api.get<ImportJob>(`/api/import_jobs/${jobId}/`);
+      const job = response.data;
+      if (job.status === "succeeded" || job.status === "failed") {
+        return job;
+      }
+      setProgress(Math.round(job.progress * 100));
+      await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+  };
+
   const handleFileChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (!file) return;
     const formData = new FormData();
     formData.append("file", file);
     try {
-      await api.post("/api/import_cosing/", formData, {
-        headers: { "Content-Type": "multipart/form-data" },
-      });
-      alert("Plik COSING został zaimportowany do bazy danych.");
+      setProgress(0);
+      const response = await api.post<ImportJob>(
+        "/api/import_cosing/",
+        formData,
+        {
+          headers: { "Content-Type": "multipart/form-data" },
+        }
+      );
+      const job = await waitForJob(response.data.id);
+      if (job.status === "succeeded") {
+        alert(
+          `Plik COSING został zaimportowany do bazy danych.\n` +
+            `Nowe: ${job.inserted}, zaktualizowane: ${job.updated}, ` +
+            `odrzucone: ${job.rejected}.`
+        );
+      } else {
+        alert(`Błąd podczas importu pliku COSING: ${job.error ?? ""}`);
+      }
     } catch (error: any) {
       if (error.response?.status === 403) {
         alert("Brak uprawnień administratora do importu pliku COSING.");
@@ -29,6 +69,7 @@ export default function ImportCosingButton() {
         alert("Błąd podczas importu pliku COSING.");
       }
     } finally {
+      setProgress(null);
       e.target.value = "";
     }
   };
@@ -45,9 +86,11 @@ export default function ImportCosingButton() {
       <Button
         variant="outline"
         className="ml-2"
+        disabled={progress !== null}
         onClick={() => fileInputRef.current?.click()}
       >
-        <Upload className="mr-2 h-4 w-4" /> Importuj COSING
+        <Upload className="mr-2 h-4 w-4" />
+        {progress !== null ? `Importowanie... ${progress}%` : "Importuj COSING"}
       </Button>
     </>
   );
@@ -12,6 +12,7 @@ interface IngredientINCI {
   common_name?: string;
   function?: string;
   restrictions?: string;
+  safety_rating?: string;
 }
 
 interface SelectedIngredient {
@@ -58,11 +59,12 @@ export function IngredientSearchForm({
   const searchIngredients = async (query: string) => {
     try {
       setLoading(true);
-      const response = await api.get(`/api/ingredients/?search=${query}`);
-
       const selectedIds = (selectedIngredients || []).map(
         (ing) => ing.cosing_ref_no
       );
+      const response = await api.get("/api/ingredients/autocomplete/", {
+        params: { q: query, limit: Math.min(10 + selectedIds.length, 50) },
+      });
       const filteredResults = response.data.filter(
         (ingredient: IngredientINCI) =>
           !selectedIds.includes(ingredient.cosing_ref_no)
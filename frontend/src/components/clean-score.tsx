@@ -11,10 +11,12 @@ interface CleanScoreData {
   score: number;
 }
 
-interface CompositionItem {
-  ingredient: {
-    safety_rating?: string;
-  };
+interface SafetySummary {
+  harmful_count: number;
+  neutral_count: number;
+  beneficial_count: number;
+  ingredient_count: number;
+  safety_score: number;
 }
 
 export function CleanScore({ productId }: { productId: string }) {
@@ -22,57 +24,29 @@ export function CleanScore({ productId }: { productId: string }) {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchComposition = async () => {
+    const fetchSummary = async () => {
       try {
         setLoading(true);
-        const response = await api.get(
-          `/api/cosmetics/${productId}/composition/`
-        );
-
-        const composition: CompositionItem[] = response.data;
-
-        let harmful = 0;
-        let neutral = 0;
-        let beneficial = 0;
-
-        composition.forEach((item) => {
-          const rating = item.ingredient.safety_rating || "neutral";
-          switch (rating) {
-            case "harmful":
-              harmful++;
-              break;
-            case "beneficial":
-              beneficial++;
-              break;
-            case "neutral":
-            default:
-              neutral++;
-              break;
-          }
-        });
-
-        const total = harmful + neutral + beneficial;
-        const totalPoints = neutral * 1 + beneficial * 2;
-        const maxPossiblePoints = total * 2;
-        const score =
-          total > 0 ? Math.round((totalPoints / maxPossiblePoints) * 100) : 0;
+        // counts and score are computed by the backend (safety summary)
+        const response = await api.get(`/api/cosmetics/${productId}/`);
+        const summary: SafetySummary = response.data;
 
         setCleanData({
-          harmful,
-          neutral,
-          beneficial,
-          total,
-          score,
+          harmful: summary.harmful_count,
+          neutral: summary.neutral_count,
+          beneficial: summary.beneficial_count,
+          total: summary.ingredient_count,
+          score: summary.safety_score,
         });
       } catch (error) {
-        console.error("Error fetching composition for clean score:", error);
+        console.error("Error fetching safety summary for clean score:", error);
         setCleanData(null);
       } finally {
         setLoading(false);
       }
     };
 
-    fetchComposition();
+    fetchSummary();
   }, [productId]);
 
   if (loading) {
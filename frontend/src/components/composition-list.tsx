@@ -10,19 +10,13 @@ import { IngredientDetails } from "./ingredient-details";
 import api from "@/api/api";
 
 interface CompositionItem {
-  id: number;
-  order_in_composition: number;
-  cosmetic: string; // barcode
-  ingredient: {
-    cosing_ref_no: number;
-    inci_name: string;
-    common_name?: string;
-    action_description?: string;
-    function?: string;
-    restrictions?: string;
-    safety_rating?: string;
-    restriction_description?: string;
-  };
+  order: number;
+  cosing_ref_no: number;
+  inci_name: string;
+  common_name?: string;
+  function?: string;
+  safety_rating?: string;
+  restriction_description?: string;
 }
 
 export function CompositionList({ productId }: { productId: string }) {
@@ -34,17 +28,12 @@ export function CompositionList({ productId }: { productId: string }) {
       try {
         setLoading(true);
         const response = await api.get(
-          `/api/cosmetic_compositions/?cosmetic=${productId}`
+          `/api/cosmetics/${productId}/composition/`
         );
         console.log("Composition data:", response.data);
-        console.log("First item:", response.data[0]);
 
-        const sortedComposition = response.data.sort(
-          (a: CompositionItem, b: CompositionItem) =>
-            a.order_in_composition - b.order_in_composition
-        );
-
-        setComposition(sortedComposition);
+        // ingredients come in INCI order
+        setComposition(response.data.ingredients);
       } catch (error) {
         console.error("Error fetching composition:", error);
         setComposition([]);
@@ -84,29 +73,22 @@ export function CompositionList({ productId }: { productId: string }) {
         <TableBody>
           {composition
             .map((item) => {
-              if (!item || !item.ingredient) {
+              if (!item) {
                 console.warn("Invalid composition item:", item);
                 return null;
               }
 
               return (
                 <IngredientDetails
-                  key={item.id}
+                  key={item.cosing_ref_no}
                   ingredient={{
-                    id:
-                      item.ingredient.cosing_ref_no?.toString() ||
-                      item.id?.toString() ||
-                      "unknown",
-                    inci_name: item.ingredient.inci_name || "Nieznany składnik",
-                    common_name: item.ingredient.common_name || "",
-                    function: item.ingredient.function || "",
-                    restrictions: item.ingredient.restrictions || "",
-                    action_description:
-                      item.ingredient.action_description || "",
-                    order: item.order_in_composition || 0,
-                    safety_rating: item.ingredient.safety_rating || "neutral",
-                    restriction_description:
-                      item.ingredient.restriction_description || "",
+                    id: item.cosing_ref_no?.toString() || "unknown",
+                    inci_name: item.inci_name || "Nieznany składnik",
+                    common_name: item.common_name || "",
+                    function: item.function || "",
+                    order: item.order || 0,
+                    safety_rating: item.safety_rating || "neutral",
+                    restriction_description: item.restriction_description || "",
                   }}
                 />
               );
@@ -2,14 +2,14 @@ import { useState } from "react";
 import { ChevronDown, ChevronUp } from "lucide-react";
 import { Badge } from "@/components/ui/badge";
 import { TableCell, TableRow } from "@/components/ui/table";
+import api from "@/api/api";
 
 interface Ingredient {
   id: string;
   inci_name: string;
   common_name: string;
   function: string;
-  restrictions: string;
-  action_description: string;
+  action_description?: string;
   order: number;
   safety_rating?: string;
   restriction_description?: string;
@@ -17,6 +17,24 @@ interface Ingredient {
 
 export function IngredientDetails({ ingredient }: { ingredient: Ingredient }) {
   const [isExpanded, setIsExpanded] = useState(false);
+  const [actionDescription, setActionDescription] = useState<
+    string | undefined
+  >(ingredient.action_description);
+
+  // the composition only carries short fields, the description is
+  // fetched the first time the row is expanded
+  const toggleExpanded = async () => {
+    setIsExpanded(!isExpanded);
+    if (!isExpanded && actionDescription === undefined) {
+      try {
+        const response = await api.get(`/api/ingredients/${ingredient.id}/`);
+        setActionDescription(response.data.action_description || "");
+      } catch (error) {
+        console.error("Error fetching ingredient details:", error);
+        setActionDescription("");
+      }
+    }
+  };
 
   const parseRestrictions = (restrictionDescription?: string): string[] => {
     if (!restrictionDescription || restrictionDescription.trim() === "")
@@ -69,7 +87,7 @@ export function IngredientDetails({ ingredient }: { ingredient: Ingredient }) {
       <TableRow>
         <TableCell>
           <button
-            onClick={() => setIsExpanded(!isExpanded)}
+            onClick={toggleExpanded}
             className={`font-medium text-left flex items-center hover:text-primary transition-colors ${getSafetyColorClasses(
               ingredient.safety_rating
             )}`}
@@ -140,8 +158,10 @@ export function IngredientDetails({ ingredient }: { ingredient: Ingredient }) {
                 <strong>Opis działania:</strong>
               </div>
               <p className="mt-2 text-muted-foreground">
-                {ingredient.action_description ||
-                  "Brak szczegółowego opisu działania dla tego składnika."}
+                {actionDescription === undefined
+                  ? "Ładowanie..."
+                  : actionDescription ||
+                    "Brak szczegółowego opisu działania dla tego składnika."}
               </p>
             </div>
           </TableCell>
@@ -109,15 +109,13 @@ export function AddCosmeticPage() {
       await api.post("/api/cosmetics/", cosmeticData);
 
       // add ingredients
-      const compositionData = selectedIngredients.map((ingredient) => ({
-        cosmetic: cosmeticData.barcode,
-        ingredient: ingredient.cosing_ref_no,
-        order_in_composition: ingredient.order,
-      }));
+      const ingredients = [...selectedIngredients]
+        .sort((a, b) => a.order - b.order)
+        .map((ingredient) => ingredient.cosing_ref_no);
 
-      for (const composition of compositionData) {
-        await api.post("/api/cosmetic_compositions/", composition);
-      }
+      await api.put(`/api/cosmetics/${cosmeticData.barcode}/composition/`, {
+        ingredients,
+      });
 
       // navigate to the new cosmetic page
       navigate(`/cosmetics/${cosmeticData.barcode}`);
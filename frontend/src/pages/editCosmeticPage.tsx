@@ -89,13 +89,13 @@ export function EditCosmeticPage() {
           `/api/cosmetics/${productId}/composition/`
         );
 
-        const ingredients = compositionResponse.data.map(
+        const ingredients = compositionResponse.data.ingredients.map(
           (item: any, index: number) => ({
-            cosing_ref_no: item.ingredient.cosing_ref_no,
-            inci_name: item.ingredient.inci_name,
-            common_name: item.ingredient.common_name,
-            function: item.ingredient.function,
-            order: item.order_in_composition || index + 1,
+            cosing_ref_no: item.cosing_ref_no,
+            inci_name: item.inci_name,
+            common_name: item.common_name,
+            function: item.function,
+            order: item.order || index + 1,
           })
         );
 
@@ -155,19 +155,14 @@ export function EditCosmeticPage() {
       // update cosmetic data
       await api.put(`/api/cosmetics/${productId}/`, cosmeticData);
 
-      // delete old ingredients
-      await api.delete(`/api/cosmetics/${productId}/composition/`);
+      // replace ingredients, only the changes are written
+      const ingredients = [...selectedIngredients]
+        .sort((a, b) => a.order - b.order)
+        .map((ingredient) => ingredient.cosing_ref_no);
 
-      // add new ingredients
-      const compositionData = selectedIngredients.map((ingredient) => ({
-        cosmetic: cosmeticData.barcode,
-        ingredient: ingredient.cosing_ref_no,
-        order_in_composition: ingredient.order,
-      }));
-
-      for (const composition of compositionData) {
-        await api.post("/api/cosmetic_compositions/", composition);
-      }
+      await api.put(`/api/cosmetics/${cosmeticData.barcode}/composition/`, {
+        ingredients,
+      });
 
       // navigate to the updated cosmetic page
       navigate(`/cosmetics/${cosmeticData.barcode}`);
@@ -159,11 +159,14 @@ export function Homepage() {
   const handleSearch = async (e: React.FormEvent) => {
     e.preventDefault();
     try {
-      const response = await api.get<Cosmetic[]>("/api/cosmetics/", {
-        params: { query: searchQuery },
-      });
-      setSearchResults(response.data);
-      console.log("Search results:", response.data);
+      const response = await api.get<{ results: Cosmetic[] }>(
+        "/api/cosmetics/",
+        {
+          params: { query: searchQuery },
+        }
+      );
+      setSearchResults(response.data.results);
+      console.log("Search results:", response.data.results);
     } catch (error) {
       console.error("Error fetching cosmetics:", error);
       alert("Wystąpił błąd podczas wyszukiwania kosmetyków.");